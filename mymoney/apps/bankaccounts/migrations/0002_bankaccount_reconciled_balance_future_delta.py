@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.8 on 2026-10-18 01:49
+from __future__ import unicode_literals
+
+import datetime
+
+from django.db import migrations, models
+
+
+def forwards_balances(apps, schema_editor):
+    BankAccount = apps.get_model('bankaccounts', 'BankAccount')
+    BankTransaction = apps.get_model('banktransactions', 'BankTransaction')
+
+    today = datetime.date.today()
+    for bankaccount in BankAccount.objects.iterator():
+        qs = (
+            BankTransaction.objects
+            .filter(bankaccount=bankaccount)
+            .exclude(status='inactive')
+        )
+        reconciled = qs.filter(reconciled=True).aggregate(models.Sum('amount'))
+        future = qs.filter(date__gt=today).aggregate(models.Sum('amount'))
+
+        BankAccount.objects.filter(pk=bankaccount.pk).update(
+            reconciled_balance=(
+                bankaccount.balance_initial + (reconciled['amount__sum'] or 0)
+            ),
+            future_delta=future['amount__sum'] or 0,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bankaccounts', '0001_initial'),
+        ('banktransactions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bankaccount',
+            name='future_delta',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, help_text='Sum of bank transactions in the future.', max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='bankaccount',
+            name='reconciled_balance',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10, verbose_name='Reconciled balance'),
+        ),
+        migrations.RunPython(forwards_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.8 on 2026-10-18 02:47
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import mymoney.apps.bankaccounts.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bankaccounts', '0002_bankaccount_reconciled_balance_future_delta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bankaccount',
+            name='data_version',
+            field=models.BigIntegerField(default=mymoney.apps.bankaccounts.models.get_initial_data_version, editable=False),
+        ),
+    ]
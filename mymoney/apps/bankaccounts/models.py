@@ -1,9 +1,12 @@
+import random
+
 from django.conf import settings
 from django.db import models
 from django.urls import reverse
 from django.utils.translation import ugettext_lazy as _
 
 from mymoney.core.utils.currencies import get_currencies
+from mymoney.core.utils.db import LoadedValuesMixin
 
 
 class BankAccountManager(models.Manager):
@@ -21,8 +24,21 @@ class BankAccountManager(models.Manager):
         """
         self.filter(owners__isnull=True).delete()
 
+    def bump_data_version(self, *pks):
+        """
+        Invalidate analytics cached for the bank accounts given.
+        """
+        self.filter(pk__in=pks).update(data_version=models.F('data_version') + 1)
+
+
+def get_initial_data_version():
+    # Random, so that a bank account recreated with a recycled primary key
+    # (i.e after a rollback) never matches analytics cached for a previous
+    # one.
+    return random.getrandbits(48)
+
 
-class BankAccount(models.Model):
+class BankAccount(LoadedValuesMixin, models.Model):
 
     label = models.CharField(max_length=255, verbose_name=_('Label'))
     balance = models.DecimalField(
@@ -38,6 +54,27 @@ class BankAccount(models.Model):
         verbose_name=_('Initial balance'),
         help_text=_('Initial balance will automatically update the balance.'),
     )
+    # Maintained by bank transactions to prevent aggregating them.
+    reconciled_balance = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+        editable=False,
+        verbose_name=_('Reconciled balance'),
+    )
+    future_delta = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+        editable=False,
+        help_text=_('Sum of bank transactions in the future.'),
+    )
+    # Bumped by any change of bank transactions, analytics are cached per
+    # version.
+    data_version = models.BigIntegerField(
+        default=get_initial_data_version,
+        editable=False,
+    )
     currency = models.CharField(
         max_length=3,
         choices=get_currencies(),
@@ -61,16 +98,54 @@ class BankAccount(models.Model):
         return self.label
 
     def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
 
         # Init balance. Merge both just in case.
         if self.pk is None:
             self.balance += self.balance_initial
-        # Otherwise update it with the new delta.
-        else:
-            original = BankAccount.objects.get(pk=self.pk)
-            self.balance += self.balance_initial - original.balance_initial
+            self.reconciled_balance += self.balance_initial
+        # Otherwise fields maintained by bank transactions could have been
+        # shifted meanwhile, so only the changes are applied.
+        elif update_fields is None:
+            self._save_changes(*args, **kwargs)
+            return
+        elif 'balance_initial' in update_fields:
+            delta = self.balance_initial - self._get_loaded('balance_initial')[0]
+            self.balance += delta
+            self.reconciled_balance += delta
+
+        super(BankAccount, self).save(*args, **kwargs)
+        self.set_loaded_values('balance_initial')
+
+    def _get_loaded(self, *fields):
+        loaded = self.get_loaded_values(*fields)
+        if loaded is None:
+            loaded = BankAccount.objects.filter(pk=self.pk).values_list(*fields).get()
+        return loaded
+
+    def _save_changes(self, *args, **kwargs):
+        """
+        Save every field but the ones maintained by bank transactions, which
+        are shifted by the changes of the balances instead, then fetched
+        again.
+        """
+        balance, balance_initial = self._get_loaded('balance', 'balance_initial')
+        delta_initial = self.balance_initial - balance_initial
+        delta = self.balance - balance + delta_initial
+
+        self.balance = models.F('balance') + delta
+        self.reconciled_balance = models.F('reconciled_balance') + delta_initial
+        self.data_version = models.F('data_version') + 1
+        kwargs['update_fields'] = [
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key and field.name not in ('future_delta',)
+        ]
 
         super(BankAccount, self).save(*args, **kwargs)
+        self.refresh_from_db(fields=[
+            'balance', 'balance_initial', 'reconciled_balance', 'future_delta',
+            'data_version',
+        ])
 
     def get_absolute_url(self):
         return reverse('banktransactions:list', kwargs={
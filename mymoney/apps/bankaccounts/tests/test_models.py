@@ -1,7 +1,11 @@
 import unittest
 from decimal import Decimal
 
+from django.db import connection, models
+from django.test.utils import CaptureQueriesContext
+
 from ..factories import BankAccountFactory
+from ..models import BankAccount
 
 
 class BankAccountSaveTestCase(unittest.TestCase):
@@ -47,3 +51,54 @@ class BankAccountSaveTestCase(unittest.TestCase):
         bankaccount.balance_initial = Decimal('-20')
         bankaccount.save()
         self.assertEqual(bankaccount.balance, Decimal('-10'))
+
+    def test_balance_initial_update_loaded(self):
+
+        bankaccount = BankAccountFactory(
+            balance=Decimal('0'), balance_initial=Decimal('10'),
+        )
+        bankaccount = BankAccount.objects.get(pk=bankaccount.pk)
+
+        bankaccount.balance_initial = Decimal('15')
+        with CaptureQueriesContext(connection) as context:
+            bankaccount.save()
+        # Maintained fields are only fetched again once updated.
+        queries = [query['sql'].split()[0] for query in context.captured_queries]
+        self.assertNotIn('SELECT', queries[:queries.index('UPDATE')])
+        self.assertEqual(bankaccount.balance, Decimal('15'))
+        self.assertEqual(bankaccount.reconciled_balance, Decimal('15'))
+
+        # Unknown initial balance is fetched again.
+        bankaccount = BankAccount.objects.only('pk', 'balance').get(pk=bankaccount.pk)
+        bankaccount.balance_initial = Decimal('5')
+        bankaccount.save()
+        bankaccount.refresh_from_db()
+        self.assertEqual(bankaccount.balance, Decimal('5'))
+
+    def test_maintained_fields(self):
+
+        bankaccount = BankAccountFactory(balance=Decimal('0'))
+        bankaccount = BankAccount.objects.get(pk=bankaccount.pk)
+        data_version = bankaccount.data_version
+
+        # Shifted by bank transactions meanwhile.
+        BankAccount.objects.filter(pk=bankaccount.pk).update(
+            balance=models.F('balance') + 10,
+            reconciled_balance=models.F('reconciled_balance') + 5,
+            future_delta=models.F('future_delta') + 3,
+            data_version=models.F('data_version') + 1,
+        )
+
+        bankaccount.label = 'foo'
+        bankaccount.balance += Decimal('100')
+        bankaccount.save()
+        self.assertEqual(bankaccount.label, 'foo')
+        self.assertEqual(bankaccount.balance, Decimal('110'))
+        self.assertEqual(bankaccount.reconciled_balance, Decimal('5'))
+        self.assertEqual(bankaccount.future_delta, Decimal('3'))
+        self.assertEqual(bankaccount.data_version, data_version + 2)
+
+        bankaccount.refresh_from_db()
+        self.assertEqual(bankaccount.label, 'foo')
+        self.assertEqual(bankaccount.balance, Decimal('110'))
+        self.assertEqual(bankaccount.data_version, data_version + 2)
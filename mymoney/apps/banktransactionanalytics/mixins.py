@@ -1,6 +1,12 @@
+import datetime
+from decimal import Decimal
+from itertools import compress
+
 from django.utils.functional import cached_property
 
 from mymoney.apps.banktransactions.models import BankTransaction
+from mymoney.core.paginators import DatePaginator
+from mymoney.core.utils.dates import get_date_ranges
 
 from .forms import RatioForm
 
@@ -77,3 +83,89 @@ class TrendTimeViewMixin(SessionViewMixin):
             qs = qs.filter(reconciled=filters['reconciled'])
 
         return qs
+
+    @cached_property
+    def series(self):
+        filters = self.session_data.get('filters', {})
+        return BankTransaction.objects.get_daily_series(
+            self.bankaccount, reconciled=filters.get('reconciled'),
+        )
+
+    def get_base_date(self):
+        """
+        Returns the date requested by the pager, or the one filtered.
+        """
+        filters = self.session_data.get('filters', {})
+        base_date = datetime.date(**filters['date_kwargs'])
+
+        if self.request.GET.get('date'):
+            try:
+                base_date = datetime.datetime.strptime(
+                    self.request.GET.get('date'),
+                    '%Y-%m-%d',
+                ).date()
+
+            except ValueError:
+                pass
+
+        return base_date
+
+    def get_series_page(self, base_date, granularity):
+        """
+        Returns the opening balance, the rows and the page object of the page
+        including the date given, or None if there is no data for this page.
+        Rows are sliced from the daily series, so flipping pages doesn't
+        query it again.
+        """
+        # First and last bank transactions prevent infinite pager. If there is
+        # none, it just mean that there is no data at all.
+        first, last = self.series.first, self.series.last
+        if first is None:
+            return None
+
+        # Requested date is not out of range?
+        first_range = get_date_ranges(first, granularity)[0]
+        last_range = get_date_ranges(last, granularity)[1]
+        if not first_range <= base_date <= last_range:
+            return None
+
+        date_start, date_end = get_date_ranges(base_date, granularity)
+
+        # Start and end at first/last bank transaction, not the range
+        # calculated.
+        days = self.series.get_range(
+            first if first > date_start else date_start,
+            last if last < date_end else date_end,
+            opening=self.series.to_cents(self.bankaccount.balance_initial),
+        )
+        to_decimal = self.series.to_decimal
+
+        # Amounts are converted from the arrays at once, and only days having
+        # bank transactions have a delta and a percentage to compute.
+        size = len(days.dates)
+        balances = list(map(to_decimal, days.balances))
+        deltas, percentages = [0] * size, [0] * size
+        for i in compress(range(size), days.deltas):
+            deltas[i] = to_decimal(days.deltas[i])
+            previous = days.balances[i - 1] if i else days.opening
+            if previous:
+                percentages[i] = round(Decimal(days.deltas[i] * 100) / previous, 2)
+
+        rows = [
+            {
+                'date': date_step,
+                'count': count,
+                'balance': balance,
+                'delta': delta,
+                'percentage': percentage,
+            }
+            for date_step, count, balance, delta, percentage in zip(
+                days.dates, days.counts, balances, deltas, percentages)
+        ]
+
+        paginator = DatePaginator(first_range, last_range, granularity)
+        return {
+            'balance_initial': to_decimal(days.opening),
+            'rows': rows,
+            'page_obj': paginator.page(base_date),
+        }
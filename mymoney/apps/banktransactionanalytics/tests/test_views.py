@@ -2,18 +2,23 @@ import datetime
 import json
 from decimal import Decimal
 
+from django.conf import settings
 from django.test import TestCase, modify_settings, override_settings
 from django.urls import reverse
 
 from django_webtest import WebTest
 
 from mymoney.apps.bankaccounts.factories import BankAccountFactory
+from mymoney.apps.bankaccounts.models import BankAccount
 from mymoney.apps.banktransactions.factories import BankTransactionFactory
-from mymoney.apps.banktransactions.models import BankTransaction
+from mymoney.apps.banktransactions.models import (
+    BankTransaction, BankTransactionRollup,
+)
 from mymoney.apps.banktransactiontags.factories import (
     BankTransactionTagFactory,
 )
 from mymoney.core.factories import UserFactory
+from mymoney.core.querybudgets import QueryBudgetTestMixin
 from mymoney.core.utils.dates import GRANULARITY_MONTH, GRANULARITY_WEEK
 
 from ..forms import RatioForm, TrendtimeForm
@@ -944,6 +949,125 @@ class RatioQuerysetTestCase(WebTest):
         )
 
 
+class RatioRollupTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = UserFactory(username='owner')
+        cls.bankaccount = BankAccountFactory(owners=[cls.owner])
+        cls.banktransactiontags = [
+            BankTransactionTagFactory(owner=cls.owner),
+            BankTransactionTagFactory(owner=cls.owner),
+        ]
+
+        for date, amount, tag in (
+                ('2015-04-30', '-1000', 0),   # Out of range.
+                ('2015-05-19', '-1000', 0),   # Out of range.
+                ('2015-05-20', '-10', 0),     # Edge.
+                ('2015-05-31', '-5', 1),      # Edge.
+                ('2015-06-01', '-20', 0),     # Whole month.
+                ('2015-06-15', '30', 0),      # Whole month.
+                ('2015-07-31', '-40', None),  # Whole month.
+                ('2015-08-10', '-7', 1),      # Edge.
+                ('2015-08-11', '-1000', 1)):  # Out of range.
+            BankTransactionFactory(
+                bankaccount=cls.bankaccount,
+                date=date,
+                amount=Decimal(amount),
+                tag=cls.banktransactiontags[tag] if tag is not None else None,
+            )
+
+        cls.url = reverse('banktransactionanalytics:ratio', kwargs={
+            'bankaccount_pk': cls.bankaccount.pk
+        })
+
+    def setUp(self):
+        self.client.force_login(self.owner)
+
+    def get_rows(self, type):
+        session = self.client.session
+        session['banktransactionanalyticratioform'] = {
+            'filters': {
+                'date_start': '2015-05-20',
+                'date_end': '2015-08-10',
+                'type': type,
+                'chart': RatioForm.CHART_DOUGHNUT,
+            },
+        }
+        session.save()
+
+        response = self.client.get(self.url)
+        if 'total' not in response.context:
+            return None, []
+        return response.context['total'], [
+            (row['tag_id'], row['sum'], row['count'])
+            for row in response.context['rows']
+        ]
+
+    def test_single(self):
+        total, rows = self.get_rows(RatioForm.SINGLE_DEBIT)
+        self.assertEqual(total, Decimal('-82'))
+        self.assertListEqual(rows, [
+            (None, Decimal('-40'), 1),
+            (self.banktransactiontags[0].pk, Decimal('-30'), 2),
+            (self.banktransactiontags[1].pk, Decimal('-12'), 2),
+        ])
+
+        total, rows = self.get_rows(RatioForm.SINGLE_CREDIT)
+        self.assertEqual(total, Decimal('30'))
+        self.assertListEqual(rows, [
+            (self.banktransactiontags[0].pk, Decimal('30'), 1),
+        ])
+
+    def test_sum(self):
+        total, rows = self.get_rows(RatioForm.SUM_DEBIT)
+        self.assertEqual(total, Decimal('-52'))
+        self.assertListEqual(rows, [
+            (None, Decimal('-40'), 1),
+            (self.banktransactiontags[1].pk, Decimal('-12'), 2),
+        ])
+
+        # Credits and debits of the first tag compensate each other.
+        total, rows = self.get_rows(RatioForm.SUM_CREDIT)
+        self.assertIsNone(total)
+
+    def test_whole_months_from_rollups(self):
+        BankTransactionRollup.objects.filter(
+            bankaccount=self.bankaccount,
+            month='2015-07-01',
+        ).update(sum=Decimal('-400'))
+        # Results cached by previous tests would be served otherwise.
+        BankAccount.objects.bump_data_version(self.bankaccount.pk)
+
+        total, rows = self.get_rows(RatioForm.SINGLE_DEBIT)
+        self.assertEqual(total, Decimal('-442'))
+
+    def test_cache(self):
+        total, rows = self.get_rows(RatioForm.SINGLE_DEBIT)
+        self.assertEqual(total, Decimal('-82'))
+
+        # Served from the cache while bank transactions don't change.
+        BankTransactionRollup.objects.filter(
+            bankaccount=self.bankaccount,
+            month='2015-07-01',
+        ).update(sum=Decimal('-400'))
+        total, rows = self.get_rows(RatioForm.SINGLE_DEBIT)
+        self.assertEqual(total, Decimal('-82'))
+
+        # Other filters are cached apart.
+        total, rows = self.get_rows(RatioForm.SINGLE_CREDIT)
+        self.assertEqual(total, Decimal('30'))
+
+        BankTransaction.objects.update_reconciled(
+            BankTransaction.objects.filter(
+                bankaccount=self.bankaccount, date='2015-05-20',
+            ).values_list('pk', flat=True),
+            True,
+        )
+        total, rows = self.get_rows(RatioForm.SINGLE_DEBIT)
+        self.assertEqual(total, Decimal('-442'))
+
+
 class RatioListViewTestCase(WebTest):
 
     @classmethod
@@ -2011,6 +2135,57 @@ class TrendtimeViewTestCase(WebTest):
             datetime.date(2015, 7, 13),
         )
 
+    def test_series_ajax(self):
+
+        bankaccount = BankAccountFactory(
+            balance=0, balance_initial=Decimal('100'), owners=[self.owner],
+        )
+        url = reverse('banktransactionanalytics:trendtime', kwargs={
+            'bankaccount_pk': bankaccount.pk
+        })
+        url_series = reverse('banktransactionanalytics:trendtimeseries', kwargs={
+            'bankaccount_pk': bankaccount.pk
+        })
+
+        self.app.get(url_series, user='owner', status=400)
+
+        BankTransactionFactory(
+            bankaccount=bankaccount, date='2015-06-29', amount=Decimal('-10'),
+        )
+        BankTransactionFactory(
+            bankaccount=bankaccount, date='2015-07-02', amount=Decimal('20'),
+        )
+
+        response = self.app.get(url, user='owner')
+        form = response.form
+        form['date'] = '2015-06-02'
+        form['granularity'] = GRANULARITY_MONTH
+        response = form.submit('filter').maybe_follow()
+        self.assertEqual(response.context[0]['series_ajax_url'], url_series)
+
+        # Next pages are sliced from the same series.
+        with self.assertNumQueries(4):
+            response = self.app.get(
+                url_series + '?date=2015-07-01', user='owner', xhr=True,
+            )
+        self.assertEqual(response.json['previous_date'], '2015-06-01')
+        self.assertIsNone(response.json['next_date'])
+        self.assertListEqual(
+            [
+                (row['date'], row['count'], row['balance'], row['delta'])
+                for row in response.json['result']
+            ],
+            [
+                ('2015-07-01', 0, '90.00', 0),
+                ('2015-07-02', 1, '110.00', '20.00'),
+            ],
+        )
+
+        response = self.app.get(
+            url_series + '?date=2015-09-01', user='owner', xhr=True,
+        )
+        self.assertListEqual(response.json['result'], [])
+
 
 class TrendtimeSummaryViewTestCase(WebTest):
 
@@ -2187,3 +2362,102 @@ class TrendtimeSummaryViewTestCase(WebTest):
             response,
             "{bankaccount}'s trendtime statistics summary".format(bankaccount=bankaccount),
         )
+
+
+@modify_settings(MIDDLEWARE={
+    'remove': ['mymoney.core.middleware.AnonymousRedirectMiddleware'],
+})
+# Analytics are never cached, so that queries computing them are measured
+# instead of cache hits.
+@override_settings(
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'analytics': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    },
+    MYMONEY=dict(settings.MYMONEY, ANALYTICS_CACHE_ALIAS='analytics'),
+)
+class QueryBudgetTestCase(QueryBudgetTestMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = UserFactory(username='owner')
+        cls.bankaccount = BankAccountFactory(owners=[cls.owner])
+        cls.banktransactiontags = [
+            BankTransactionTagFactory(owner=cls.owner),
+            BankTransactionTagFactory(owner=cls.owner),
+            BankTransactionTagFactory(owner=cls.owner),
+        ]
+        cls.today = datetime.date.today()
+
+    def setUp(self):
+        self.client.force_login(self.owner)
+        self.grow(size=3)()
+
+        today = self.today
+        session = self.client.session
+        session['banktransactionanalyticratioform'] = {
+            'filters': {
+                'type': RatioForm.SUM_DEBIT,
+                'chart': RatioForm.CHART_DOUGHNUT,
+                'date_start': str(today - datetime.timedelta(days=60)),
+                'date_end': str(today),
+            },
+        }
+        session['banktransactionanalytictrendtimeform'] = {
+            'filters': {
+                'chart': TrendtimeForm.CHART_LINE,
+                'granularity': GRANULARITY_MONTH,
+                'date': str(today),
+                'date_kwargs': {
+                    'year': today.year,
+                    'month': today.month,
+                    'day': today.day,
+                },
+            },
+        }
+        session.save()
+
+    def grow(self, size=60):
+        def grow():
+            for i in range(size):
+                BankTransactionFactory(
+                    bankaccount=self.bankaccount,
+                    amount=-10 - i,
+                    date=self.today - datetime.timedelta(days=i % 25),
+                    tag=self.banktransactiontags[i % 3],
+                )
+        return grow
+
+    def test_ratio(self):
+        url = reverse('banktransactionanalytics:ratio', kwargs={
+            'bankaccount_pk': self.bankaccount.pk,
+        })
+        self.assertConstantQueries(lambda: self.client.get(url), self.grow())
+
+    def test_ratio_summary(self):
+        url = reverse('banktransactionanalytics:ratiosummary', kwargs={
+            'bankaccount_pk': self.bankaccount.pk,
+            'tag_id': self.banktransactiontags[0].pk,
+        })
+        self.assertConstantQueries(lambda: self.client.get(url), self.grow())
+
+    def test_trendtime(self):
+        url = reverse('banktransactionanalytics:trendtime', kwargs={
+            'bankaccount_pk': self.bankaccount.pk,
+        })
+        self.assertConstantQueries(lambda: self.client.get(url), self.grow())
+
+    def test_trendtime_series(self):
+        url = reverse('banktransactionanalytics:trendtimeseries', kwargs={
+            'bankaccount_pk': self.bankaccount.pk,
+        })
+        self.assertConstantQueries(lambda: self.client.get(url), self.grow())
+
+    def test_trendtime_summary(self):
+        url = reverse('banktransactionanalytics:trendtimesummary', kwargs={
+            'bankaccount_pk': self.bankaccount.pk,
+            'year': self.today.year,
+            'month': self.today.month,
+            'day': self.today.day,
+        })
+        self.assertConstantQueries(lambda: self.client.get(url), self.grow())
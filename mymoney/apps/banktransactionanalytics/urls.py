@@ -19,6 +19,11 @@ urlpatterns = [
         views.TrendTimeView.as_view(),
         name='trendtime',
     ),
+    url(
+        r'^(?P<bankaccount_pk>\d+)/trendtime/series/$',
+        views.TrendTimeSeriesAjax.as_view(),
+        name='trendtimeseries',
+    ),
     url(
         r'^(?P<bankaccount_pk>\d+)/trendtime/summary/(?P<year>[0-9]{4})/(?P<month>[0-9]{1,2})/(?P<day>[0-9]{1,2})/$',
         views.TrendTimeSummaryView.as_view(),
@@ -1,25 +1,29 @@
 import datetime
 import json
 import random
+from decimal import Decimal
 
 from django.core.exceptions import PermissionDenied
-from django.db.models import Count, Max, Min, QuerySet, Sum
+from django.db.models import QuerySet, Sum
+from django.http import HttpResponseBadRequest, JsonResponse
 from django.urls import reverse
-from django.utils import formats
+from django.utils.dateparse import parse_date
 from django.utils.functional import cached_property
 from django.utils.translation import ugettext as _
 from django.views import generic
 
 from mymoney.apps.banktransactions.mixins import BankTransactionAccessMixin
-from mymoney.apps.banktransactions.models import BankTransaction
+from mymoney.apps.banktransactions.models import BankTransactionRollup
 from mymoney.apps.banktransactiontags.models import BankTransactionTag
-from mymoney.core.iterators import DateIterator
-from mymoney.core.paginators import DatePaginator
-from mymoney.core.utils.dates import get_date_ranges
+from mymoney.core.cache import get_or_compute
+from mymoney.core.utils.l10n import get_date_formatter
 
 from .forms import RatioForm, TrendtimeForm
 from .mixins import RatioViewMixin, TrendTimeViewMixin
 
+# Bank transaction fields displayed by summaries, others are not fetched.
+SUMMARY_FIELDS = ('label', 'date', 'reconciled', 'amount')
+
 
 class RatioView(BankTransactionAccessMixin, RatioViewMixin, generic.FormView):
 
@@ -94,12 +98,12 @@ class RatioView(BankTransactionAccessMixin, RatioViewMixin, generic.FormView):
         context['has_filters'] = bool(filters)
         if context['has_filters']:
 
-            total = self.total_queryset
+            total = self.total
             if total is not None:
                 colors = self.colors.copy()
 
                 rows, sub_total = [], 0
-                for data in self.tag_queryset:
+                for data in self.tag_rows:
                     tag_id = str(data['tag']) if data['tag'] else '0'
 
                     if tag_id in session_data['colors']:
@@ -151,66 +155,77 @@ class RatioView(BankTransactionAccessMixin, RatioViewMixin, generic.FormView):
         return context
 
     @cached_property
-    def base_queryset(self):
-
-        qs = super(RatioView, self).base_queryset
-
+    def tag_sums(self):
+        """
+        Returns sums and counts of bank transactions grouped by tags, in the
+        dates ranges of the filters, and their grand total. They are computed
+        with a single query, then cached until the data of the bank account
+        changes.
+        """
         filters = self.session_data.get('filters', {})
-        if filters['type'] in (RatioForm.SUM_CREDIT, RatioForm.SUM_DEBIT):
-
-            qs = qs.values('tag', 'tag__name')
-            qs = qs.annotate(sum=Sum('amount'))
+        return get_or_compute(
+            'ratiotagsums',
+            self.bankaccount,
+            {
+                key: filters.get(key)
+                for key in ('date_start', 'date_end', 'type', 'reconciled')
+            },
+            self.compute_tag_sums,
+        )
 
-            if filters['type'] == RatioForm.SUM_CREDIT:
-                qs = qs.filter(sum__gt=0)
-            else:
-                qs = qs.filter(sum__lt=0)
+    def compute_tag_sums(self):
+        filters = self.session_data.get('filters', {})
 
-        return qs
+        sign = sum_sign = None
+        if filters['type'] == RatioForm.SINGLE_DEBIT:
+            sign = -1
+        elif filters['type'] == RatioForm.SINGLE_CREDIT:
+            sign = 1
+        elif filters['type'] == RatioForm.SUM_DEBIT:
+            sum_sign = -1
+        elif filters['type'] == RatioForm.SUM_CREDIT:
+            sum_sign = 1
+
+        return BankTransactionRollup.objects.get_tag_sums(
+            self.bankaccount,
+            parse_date(filters['date_start']),
+            parse_date(filters['date_end']),
+            sign=sign,
+            reconciled=filters.get('reconciled'),
+            sum_sign=sum_sign,
+        )
 
     @property
-    def total_queryset(self):
-
-        filters = self.session_data.get('filters', {})
-        if filters['type'] in (RatioForm.SINGLE_CREDIT, RatioForm.SINGLE_DEBIT):
-            field = 'amount'
-        else:
-            field = 'sum'
-
-        return self.base_queryset.aggregate(total=Sum(field))['total']
+    def total(self):
+        return self.tag_sums[1]
 
     @property
-    def tag_queryset(self):
-        qs = self.base_queryset
+    def tag_rows(self):
+        rows = self.tag_sums[0]
 
         filters = self.session_data.get('filters', {})
 
         if 'tags' in filters:
-            qs = qs.filter(tag__in=filters['tags'])
-
-        # Always group result by tags.
-        if filters['type'] in (RatioForm.SINGLE_CREDIT, RatioForm.SINGLE_DEBIT):
-            qs = qs.values('tag', 'tag__name')
-            qs = qs.annotate(sum=Sum('amount'))
-
-        qs = qs.annotate(count=Count('id'))
-
-        if 'sum_min' in filters and 'sum_max' in filters:
-            qs = qs.filter(sum__range=(
-                filters['sum_min'],
-                filters['sum_max'],
-            ))
-        elif 'sum_min' in filters:
-            qs = qs.filter(sum__gte=filters['sum_min'])
-        elif 'sum_max' in filters:
-            qs = qs.filter(sum__lte=filters['sum_max'])
-
-        if filters['type'] in (RatioForm.SINGLE_DEBIT, RatioForm.SUM_DEBIT):
-            qs = qs.order_by('sum')
-        else:
-            qs = qs.order_by('-sum')
-
-        return qs
+            rows = [data for data in rows if data['tag'] in filters['tags']]
+
+        if 'sum_min' in filters:
+            rows = [
+                data for data in rows
+                if data['sum'] >= Decimal(filters['sum_min'])
+            ]
+        if 'sum_max' in filters:
+            rows = [
+                data for data in rows
+                if data['sum'] <= Decimal(filters['sum_max'])
+            ]
+
+        return sorted(
+            rows,
+            key=lambda data: data['sum'],
+            reverse=filters['type'] in (
+                RatioForm.SINGLE_CREDIT, RatioForm.SUM_CREDIT,
+            ),
+        )
 
     @cached_property
     def colors(self):
@@ -271,20 +286,34 @@ class RatioSummaryView(BankTransactionAccessMixin, RatioViewMixin,
         context = super(RatioSummaryView, self).get_context_data(**kwargs)
         context['bankaccount'] = self.bankaccount
 
-        qs = self.base_queryset
         tag_id = int(kwargs['tag_id'])
-        if tag_id > 0:
-            qs = qs.filter(tag__pk=tag_id)
-        else:
-            qs = qs.filter(tag__isnull=True)
-        banktransactions = qs.order_by('date')
-
-        total = 0
-        for banktransaction in banktransactions:
-            total += banktransaction.amount
+        filters = self.session_data.get('filters', {})
 
-        context['banktransactions'] = banktransactions
-        context['total'] = total
+        def compute():
+            qs = self.base_queryset
+            if tag_id > 0:
+                qs = qs.filter(tag__pk=tag_id)
+            else:
+                qs = qs.filter(tag__isnull=True)
+            banktransactions = list(
+                qs.order_by('date').only(*SUMMARY_FIELDS)
+            )
+            total = qs.aggregate(total=Sum('amount'))['total'] or 0
+
+            return banktransactions, total
+
+        context['banktransactions'], context['total'] = get_or_compute(
+            'ratiosummary',
+            self.bankaccount,
+            {
+                'tag_id': tag_id,
+                'date_start': filters['date_start'],
+                'date_end': filters['date_end'],
+                'type': filters['type'],
+                'reconciled': filters.get('reconciled'),
+            },
+            compute,
+        )
 
         return context
 
@@ -355,128 +384,75 @@ class TrendTimeView(BankTransactionAccessMixin, TrendTimeViewMixin,
         context['has_filters'] = bool(filters)
 
         if filters:
-
-            # Get first and last bank transaction to prevent infinite pager. If
-            # one is missing, it just mean that there is no data at all.
-            first, last = self.get_queryset_dates_delimiters()
-            if first and last:
-                base_date = datetime.date(**filters['date_kwargs'])
-                granularity = filters['granularity']
-
-                if self.request.GET.get('date'):
-                    try:
-                        base_date = datetime.datetime.strptime(
-                            self.request.GET.get('date'),
-                            '%Y-%m-%d',
-                        ).date()
-
-                    except ValueError:
-                        pass
-
-                # Requested date is not out of range?
-                first_range = get_date_ranges(first, granularity)[0]
-                last_range = get_date_ranges(last, granularity)[1]
-                if first_range <= base_date <= last_range:
-
-                    date_start, date_end = get_date_ranges(
-                        base_date,
-                        granularity,
-                    )
-
-                    balance = self.get_queryset_balance(date_start)['sum'] or 0
-                    balance += self.bankaccount.balance_initial
-                    context['balance_initial'] = balance
-
-                    items_qs = self.get_queryset_items(date_start, date_end)
-                    items = {item['date']: item for item in items_qs}
-
-                    # Start and end iterator at first/last bank transaction,
-                    # not the range calculated.
-                    iterator = DateIterator(
-                        first if first > date_start else date_start,
-                        last if last < date_end else date_end,
-                    )
-                    rows = []
-                    for date_step in iterator:
-                        delta = percentage = count = 0
-
-                        # If no new bank transaction, same as previous.
-                        if date_step in items:
-                            delta = items[date_step]['sum']
-                            percentage = (delta * 100 / balance) if balance else 0
-                            balance += items[date_step]['sum']
-                            count = items[date_step]['count']
-
-                        rows.append({
-                            'date': date_step,
-                            'count': count,
-                            'balance': balance,
-                            'delta': delta,
-                            'percentage': round(percentage, 2),
-                        })
-
-                    context['rows'] = rows
-                    context['chart_data'] = json.dumps({
-                        'data': {
-                            'labels': [
-                                formats.date_format(
-                                    row['date'], 'SHORT_DATE_FORMAT',
-                                )
-                                for row in rows
-                            ],
-                            'datasets': [
-                                {
-                                    'fillColor': "rgba(66, 139, 202, 0.5)",
-                                    'strokeColor': "rgba(66, 139, 202, 0.8)",
-                                    'pointColor': "rgba(66, 139, 202, 0.75)",
-                                    'pointHighlightFill': "#fff",
-                                    'pointHighlightStroke': "rgba(66, 139, 202, 1)",
-                                    'data': [
-                                        float(row['balance']) for row in rows
-                                    ],
-                                }
-                            ],
-                        },
-                        'type': filters['chart'],
-                    })
-                    paginator = DatePaginator(
-                        first_range, last_range, granularity
-                    )
-                    context['page_obj'] = paginator.page(base_date)
+            page = self.get_series_page(
+                self.get_base_date(), filters['granularity'],
+            )
+            if page is not None:
+                context.update(page)
+                rows = page['rows']
+                date_format = get_date_formatter('SHORT_DATE_FORMAT')
+                context['chart_data'] = json.dumps({
+                    'data': {
+                        'labels': [date_format(row['date']) for row in rows],
+                        'datasets': [
+                            {
+                                'fillColor': "rgba(66, 139, 202, 0.5)",
+                                'strokeColor': "rgba(66, 139, 202, 0.8)",
+                                'pointColor': "rgba(66, 139, 202, 0.75)",
+                                'pointHighlightFill': "#fff",
+                                'pointHighlightStroke': "rgba(66, 139, 202, 1)",
+                                'data': [float(row['balance']) for row in rows],
+                            }
+                        ],
+                    },
+                    'type': filters['chart'],
+                })
+                context['series_ajax_url'] = reverse(
+                    'banktransactionanalytics:trendtimeseries',
+                    kwargs={'bankaccount_pk': self.bankaccount.pk},
+                )
 
         return context
 
-    def get_queryset_dates_delimiters(self):
-
-        dates = self.base_queryset.aggregate(
-            first=Min('date'),
-            last=Max('date'),
-        )
-        return dates['first'], dates['last']
-
-    def get_queryset_balance(self, date_start):
-
-        qs = self.base_queryset.filter(
-            date__lt=date_start,
-        ).aggregate(
-            sum=Sum('amount')
-        )
-
-        return qs
-
-    def get_queryset_items(self, date_start, date_end):
 
-        qs = self.base_queryset.filter(
-            bankaccount=self.bankaccount,
-            status=BankTransaction.STATUS_ACTIVE,
-            date__range=(date_start, date_end),
-        )
+class TrendTimeSeriesAjax(BankTransactionAccessMixin, TrendTimeViewMixin,
+                          generic.View):
+    """
+    Rows of a trendtime page, sliced from the daily series already computed,
+    so that pages could be scrolled without reloading the whole view.
+    """
 
-        qs = qs.values('date')
-        qs = qs.annotate(sum=Sum('amount'), count=Count('id'))
-        qs = qs.order_by('date')
+    def get(self, request, *args, **kwargs):
 
-        return qs
+        filters = self.session_data.get('filters', {})
+        if not filters:
+            return HttpResponseBadRequest("Trendtime filters are missing.")
+
+        page = self.get_series_page(self.get_base_date(), filters['granularity'])
+        if page is None:
+            return JsonResponse({
+                "success": 1,
+                "result": [],
+            })
+
+        rows, page_obj = page['rows'], page['page_obj']
+        date_format = get_date_formatter('SHORT_DATE_FORMAT')
+        return JsonResponse({
+            "success": 1,
+            "result": [
+                {
+                    "date": str(row['date']),
+                    "label": date_format(row['date']),
+                    "count": row['count'],
+                    "balance": row['balance'],
+                    "delta": row['delta'],
+                    "percentage": row['percentage'],
+                }
+                for row in rows
+            ],
+            "previous_date": str(page_obj.previous_date()) if page_obj.has_previous() else None,
+            "next_date": str(page_obj.next_date()) if page_obj.has_next() else None,
+        })
 
 
 class TrendTimeSummaryView(BankTransactionAccessMixin, TrendTimeViewMixin,
@@ -495,7 +471,7 @@ class TrendTimeSummaryView(BankTransactionAccessMixin, TrendTimeViewMixin,
         context = super(TrendTimeSummaryView, self).get_context_data(**kwargs)
         context['bankaccount'] = self.bankaccount
 
-        banktransactions = []
+        banktransactions, total = [], 0
         try:
             base_date = datetime.date(
                 int(kwargs['year']), int(kwargs['month']), int(kwargs['day']),
@@ -503,15 +479,30 @@ class TrendTimeSummaryView(BankTransactionAccessMixin, TrendTimeViewMixin,
         except ValueError:
             pass
         else:
-            banktransactions = (
-                self.base_queryset.filter(date=base_date).order_by('pk')
+            banktransactions, total = get_or_compute(
+                'trendtimesummary',
+                self.bankaccount,
+                {
+                    'date': base_date,
+                    'reconciled': self.session_data.get('filters', {}).get('reconciled'),
+                },
+                lambda: self.compute_summary(base_date),
             )
 
-        total = 0
-        for banktransaction in banktransactions:
-            total += banktransaction.amount
-
         context['banktransactions'] = banktransactions
         context['total'] = total
 
         return context
+
+    def compute_summary(self, base_date):
+        qs = self.base_queryset.filter(date=base_date)
+
+        banktransactions = list(
+            qs
+            .select_related('tag')
+            .order_by('pk')
+            .only(*SUMMARY_FIELDS + ('tag', 'tag__name'))
+        )
+        total = qs.aggregate(total=Sum('amount'))['total'] or 0
+
+        return banktransactions, total
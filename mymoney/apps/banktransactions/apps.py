@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class BankTransactionConfig(AppConfig):
     name = 'mymoney.apps.banktransactions'
     verbose_name = "Bank transactions"
+
+    def ready(self):
+        import mymoney.apps.banktransactions.signals.handlers  # noqa
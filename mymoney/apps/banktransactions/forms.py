@@ -6,6 +6,7 @@ from mymoney.apps.banktransactiontags.models import BankTransactionTag
 from mymoney.core.widgets import Datepicker
 
 from .models import BankTransaction
+from .statements import FORMAT_CSV, FORMAT_OFX
 
 
 class BankTransactionListForm(forms.Form):
@@ -153,3 +154,29 @@ class BankTransactionUpdateForm(forms.ModelForm):
 class BankTransactionCreateForm(BankTransactionUpdateForm):
 
     redirect = forms.BooleanField(label=_('Stay on page?'), required=False)
+
+
+class BankTransactionImportForm(forms.Form):
+
+    statement = forms.FileField(label=ugettext_lazy('Statement'))
+    format = forms.ChoiceField(
+        choices=(
+            (FORMAT_CSV, 'CSV'),
+            (FORMAT_OFX, 'OFX'),
+        ),
+        label=ugettext_lazy('Format'),
+        help_text=ugettext_lazy(
+            'CSV statements must start with a header naming the columns date '
+            '(YYYY-MM-DD), label and amount, and optionally status, '
+            'reconciled, payment_method and memo.'
+        ),
+    )
+    skip_duplicates = forms.BooleanField(
+        label=ugettext_lazy('Skip duplicates?'),
+        help_text=ugettext_lazy(
+            'Bank transactions with the same date, amount and label as '
+            'existing ones are not imported.'
+        ),
+        initial=True,
+        required=False,
+    )
@@ -0,0 +1,91 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mymoney.apps.bankaccounts.models import BankAccount
+
+from ...statements import (
+    FORMAT_CSV, FORMAT_OFX, UnknownFormat, import_statement, parse_statement,
+)
+
+
+class Command(BaseCommand):
+    """
+    Import bank transactions from a bank statement file.
+    """
+    help = 'Import a CSV or OFX bank statement into a bank account'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('bankaccount', type=int,
+                            help='Primary key of the bank account.')
+        parser.add_argument('path', help='Path of the statement file.')
+        parser.add_argument('--format', choices=(FORMAT_CSV, FORMAT_OFX),
+                            dest='format',
+                            help='Format of the statement. Default: guessed '
+                                 'from the file extension.')
+        parser.add_argument('--encoding', default='utf-8-sig',
+                            help='Default: utf-8-sig (UTF-8 with an optional '
+                                 'BOM)')
+        parser.add_argument('--delimiter', default=',',
+                            help='Delimiter of CSV columns. Default: ,')
+        parser.add_argument('--skip-duplicates', action='store_true',
+                            default=False, dest='skip_duplicates',
+                            help='Skip bank transactions which already '
+                                 'exist.')
+        parser.add_argument('--dry-run', action='store_true', default=False,
+                            dest='dry_run',
+                            help='Preview the import (i.e: duplicates, '
+                                 'rejected rows) without inserting anything.')
+        parser.add_argument('--chunk-size', action='store', type=int,
+                            default=500, dest='chunk_size',
+                            help='Number of rows validated then inserted at '
+                                 'once.')
+
+    def handle(self, *args, **options):
+
+        try:
+            bankaccount = BankAccount.objects.get(pk=options['bankaccount'])
+        except BankAccount.DoesNotExist:
+            raise CommandError(
+                'Bank account %s does not exist.' % options['bankaccount']
+            )
+
+        statement_format = options['format']
+        if statement_format is None:
+            statement_format = os.path.splitext(options['path'])[1][1:].lower()
+
+        kwargs = {}
+        if statement_format == FORMAT_CSV:
+            kwargs['delimiter'] = options['delimiter']
+
+        try:
+            with open(options['path'], encoding=options['encoding'],
+                      newline='') as f:
+                result = import_statement(
+                    bankaccount,
+                    parse_statement(f, statement_format, **kwargs),
+                    chunk_size=options['chunk_size'],
+                    skip_duplicates=options['skip_duplicates'],
+                    dry_run=options['dry_run'],
+                )
+        except (OSError, UnknownFormat) as e:
+            raise CommandError(str(e))
+
+        for number, errors in result.rejections:
+            for field, messages in sorted(errors.items()):
+                self.stderr.write('Row %d rejected, %s: %s' % (
+                    number, field, ' '.join(messages),
+                ))
+
+        self.stdout.write(
+            '%d bank transactions %s in %.2fs (%d rows/s), %d rejected, '
+            '%d duplicates.' % (
+                result.imported,
+                'to import' if options['dry_run'] else 'imported',
+                result.duration,
+                (result.imported + result.rejected) / (result.duration or 1),
+                result.rejected,
+                result.duplicates,
+            )
+        )
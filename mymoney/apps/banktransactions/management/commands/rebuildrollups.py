@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from mymoney.apps.bankaccounts.models import BankAccount
+
+from ...models import BankTransactionRollup
+
+
+class Command(BaseCommand):
+    """
+    Repair or backfill rollups from bank transactions.
+    """
+    help = 'Rebuild monthly rollups per tag of bank accounts'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('bankaccounts', nargs='*', type=int,
+                            help='Primary keys of the bank accounts to '
+                                 'rebuild. Default: all.')
+        parser.add_argument('--batch-size', action='store', type=int,
+                            default=500, dest='batch_size',
+                            help='Number of rollups inserted per query.')
+
+    def handle(self, *args, **options):
+
+        qs = BankAccount.objects.order_by('pk')
+        if options['bankaccounts']:
+            qs = qs.filter(pk__in=options['bankaccounts'])
+
+        for bankaccount in qs.iterator():
+            BankTransactionRollup.objects.rebuild(
+                bankaccount, batch_size=options['batch_size'],
+            )
+
+        self.stdout.write('Rollups have been rebuilt.')
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from mymoney.apps.bankaccounts.models import BankAccount
+
+from ...models import BankTransaction
+
+
+class Command(BaseCommand):
+    """
+    Apply tag rules on the whole history of bank accounts.
+    """
+    help = 'Tag bank transactions of bank accounts with tag rules'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('bankaccounts', nargs='*', type=int,
+                            help='Primary keys of the bank accounts to '
+                                 'retag. Default: all.')
+        parser.add_argument('--overwrite', action='store_true', default=False,
+                            help='Retag bank transactions already tagged.')
+
+    def handle(self, *args, **options):
+
+        qs = BankAccount.objects.order_by('pk')
+        if options['bankaccounts']:
+            qs = qs.filter(pk__in=options['bankaccounts'])
+
+        count = 0
+        for bankaccount in qs.iterator():
+            count += BankTransaction.objects.retag(
+                bankaccount, overwrite=options['overwrite'],
+            )
+
+        self.stdout.write('%d bank transactions have been tagged.' % count)
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from ...models import BankTransaction
+
+
+class Command(BaseCommand):
+    """
+    Bank transactions which were in the future are now past, thus current
+    balances need to be refreshed every days.
+    """
+    help = 'Roll forward future deltas of bank accounts'
+
+    def handle(self, *args, **options):
+
+        BankTransaction.objects.roll_forward_future_deltas()
+        self.stdout.write('Future deltas have been rolled forward.')
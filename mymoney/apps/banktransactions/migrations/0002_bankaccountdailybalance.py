@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.8 on 2026-10-18 01:41
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+FIELDS = (
+    'balance',
+    'reconciled_balance',
+    'active_balance',
+    'active_reconciled_balance',
+)
+
+
+def forwards_daily_balances(apps, schema_editor):
+    BankAccount = apps.get_model('bankaccounts', 'BankAccount')
+    BankAccountDailyBalance = apps.get_model('banktransactions', 'BankAccountDailyBalance')
+    BankTransaction = apps.get_model('banktransactions', 'BankTransaction')
+
+    def conditional_sum(**conditions):
+        return models.Sum(models.Case(
+            models.When(then='amount', **conditions),
+            default=0,
+            output_field=models.DecimalField(),
+        ))
+
+    for bankaccount in BankAccount.objects.iterator():
+        days = (
+            BankTransaction.objects
+            .filter(bankaccount=bankaccount)
+            .exclude(status='inactive')
+            .order_by('date')
+            .values_list('date')
+            .annotate(
+                balance=models.Sum('amount'),
+                reconciled_balance=conditional_sum(reconciled=True),
+                active_balance=conditional_sum(status='active'),
+                active_reconciled_balance=conditional_sum(status='active', reconciled=True),
+            )
+        )
+
+        objs, running = [], dict.fromkeys(FIELDS, 0)
+        for day in days:
+            for field, value in zip(FIELDS, day[1:]):
+                running[field] += value
+            objs.append(BankAccountDailyBalance(bankaccount=bankaccount, date=day[0], **running))
+
+        BankAccountDailyBalance.objects.bulk_create(objs, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bankaccounts', '0001_initial'),
+        ('banktransactions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BankAccountDailyBalance',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('reconciled_balance', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('active_balance', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('active_reconciled_balance', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('bankaccount', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_balances', to='bankaccounts.BankAccount')),
+            ],
+            options={
+                'db_table': 'bankaccounts_dailybalances',
+                'default_permissions': (),
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='bankaccountdailybalance',
+            unique_together=set([('bankaccount', 'date')]),
+        ),
+        migrations.RunPython(forwards_daily_balances, migrations.RunPython.noop),
+    ]
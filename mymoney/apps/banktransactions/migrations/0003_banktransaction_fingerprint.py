@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.8 on 2026-10-18 02:07
+from __future__ import unicode_literals
+
+import hashlib
+import itertools
+import re
+import unicodedata
+from decimal import Decimal
+
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+# Frozen copies of the model helpers, so that later changes to them don't
+# change this migration.
+def normalize_label(label):
+    label = unicodedata.normalize('NFKD', label)
+    label = ''.join(char for char in label if not unicodedata.combining(char))
+    return ' '.join(re.findall(r'\w+', label.casefold()))
+
+
+def get_fingerprint(bankaccount_id, date_value, amount, label):
+    data = '{}|{}|{}|{}'.format(
+        bankaccount_id,
+        date_value.isoformat(),
+        Decimal(amount).quantize(Decimal('0.01')),
+        normalize_label(label),
+    )
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+def forwards_fingerprints(apps, schema_editor):
+    BankTransaction = apps.get_model('banktransactions', 'BankTransaction')
+
+    rows = BankTransaction.objects.order_by('pk').values_list(
+        'pk', 'bankaccount_id', 'date', 'amount', 'label',
+    ).iterator()
+
+    # Each batch of bank transactions is updated by a single query.
+    while True:
+        fingerprints = {
+            pk: get_fingerprint(bankaccount_id, date_value, amount, label)
+            for pk, bankaccount_id, date_value, amount, label
+            in itertools.islice(rows, BATCH_SIZE)
+        }
+        if not fingerprints:
+            break
+
+        BankTransaction.objects.filter(pk__in=fingerprints).update(
+            fingerprint=models.Case(
+                *[
+                    models.When(pk=pk, then=models.Value(fingerprint))
+                    for pk, fingerprint in fingerprints.items()
+                ],
+                output_field=models.CharField()
+            ),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bankaccounts', '0002_bankaccount_reconciled_balance_future_delta'),
+        ('banktransactions', '0002_bankaccountdailybalance'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='banktransaction',
+            name='fingerprint',
+            field=models.CharField(default='', editable=False, max_length=40),
+        ),
+        migrations.AlterIndexTogether(
+            name='banktransaction',
+            index_together=set([('bankaccount', 'fingerprint'), ('bankaccount', 'amount'), ('bankaccount', 'reconciled'), ('bankaccount', 'date')]),
+        ),
+        migrations.RunPython(forwards_fingerprints, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.8 on 2026-10-18 02:26
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models.functions import TruncMonth
+import django.db.models.deletion
+
+
+def forwards_rollups(apps, schema_editor):
+    BankTransaction = apps.get_model('banktransactions', 'BankTransaction')
+    BankTransactionRollup = apps.get_model('banktransactions', 'BankTransactionRollup')
+
+    rows = (
+        BankTransaction.objects
+        .filter(status='active')
+        .annotate(
+            month=TruncMonth('date'),
+            sign=models.Case(
+                models.When(amount__lt=0, then=models.Value(-1)),
+                models.When(amount__gt=0, then=models.Value(1)),
+                default=models.Value(0),
+                output_field=models.SmallIntegerField(),
+            ),
+        )
+        .order_by()
+        .values_list('bankaccount', 'month', 'tag', 'sign', 'reconciled')
+        .annotate(total=models.Sum('amount'), count=models.Count('id'))
+    )
+
+    BankTransactionRollup.objects.bulk_create(
+        (
+            BankTransactionRollup(
+                bankaccount_id=bankaccount_id, month=month, tag_id=tag_id,
+                sign=sign, reconciled=reconciled, sum=total, count=count,
+            )
+            for bankaccount_id, month, tag_id, sign, reconciled, total, count in rows
+        ),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bankaccounts', '0002_bankaccount_reconciled_balance_future_delta'),
+        ('banktransactiontags', '0002_banktransactiontagrule'),
+        ('banktransactions', '0003_banktransaction_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BankTransactionRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('sign', models.SmallIntegerField()),
+                ('reconciled', models.BooleanField()),
+                ('sum', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('count', models.IntegerField(default=0)),
+                ('bankaccount', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='bankaccounts.BankAccount')),
+                ('tag', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='banktransactiontags.BankTransactionTag')),
+            ],
+            options={
+                'db_table': 'banktransactions_rollups',
+                'default_permissions': (),
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='banktransactionrollup',
+            unique_together=set([('bankaccount', 'month', 'tag', 'sign', 'reconciled')]),
+        ),
+        migrations.RunPython(forwards_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    NULL tags are distinct for the unique constraint of rollups, so untagged
+    rollups need their own one.
+    """
+
+    dependencies = [
+        ('banktransactions', '0004_banktransactionrollup'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                'CREATE UNIQUE INDEX banktransactions_rollups_untagged_uniq '
+                'ON banktransactions_rollups (bankaccount_id, month, sign, reconciled) '
+                'WHERE tag_id IS NULL',
+            ],
+            reverse_sql=['DROP INDEX banktransactions_rollups_untagged_uniq'],
+        ),
+    ]
@@ -1,47 +1,167 @@
+import hashlib
+import re
+import unicodedata
 from datetime import date
 from decimal import Decimal
 
-from django.db import models, transaction
+from django.db import connection, models, transaction
+from django.db.models.functions import TruncMonth
+from django.db.models.query import ModelIterable
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
 from mymoney.apps.bankaccounts.models import BankAccount
-from mymoney.apps.banktransactiontags.models import BankTransactionTag
-from mymoney.core.utils.dates import GRANULARITY_MONTH, get_date_ranges
+from mymoney.apps.banktransactiontags.models import (
+    BankTransactionTag, BankTransactionTagRule,
+)
+from mymoney.core.cache import get_or_compute
+from mymoney.core.utils.dates import (
+    GRANULARITY_MONTH, get_date_ranges, split_whole_months,
+)
+from mymoney.core.utils.db import LoadedValuesMixin, supports_window_functions
+
+from .series import DailySeries
+
+# Running balances could be summed up from the oldest bank transaction
+# (prefix) or deduced backward from the current balance (suffix).
+BALANCE_PREFIX = 'prefix'
+BALANCE_SUFFIX = 'suffix'
+
+# Balances of bank accounts maintained by bank transactions.
+BANKACCOUNT_BALANCE_FIELDS = ('balance', 'reconciled_balance', 'future_delta')
+
+
+def normalize_label(label):
+    """
+    Returns the label lowercased, without accents nor punctuation, so that
+    labels of the same bank transaction compare equal between statements.
+    """
+    label = unicodedata.normalize('NFKD', label)
+    label = ''.join(char for char in label if not unicodedata.combining(char))
+    return ' '.join(re.findall(r'\w+', label.casefold()))
+
+
+def get_fingerprint(bankaccount_id, date_value, amount, label):
+    """
+    Returns a hash identifying a bank transaction by its bank account, date,
+    amount and normalized label.
+    """
+    if isinstance(date_value, str):
+        date_value = models.DateField().to_python(date_value)
+
+    data = '{}|{}|{}|{}'.format(
+        bankaccount_id,
+        date_value.isoformat(),
+        Decimal(amount).quantize(Decimal('0.01')),
+        normalize_label(label),
+    )
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+class BalanceModelIterable(ModelIterable):
+    """
+    Iterable which attach running balances to each bank transaction fetched.
+    """
+
+    def __iter__(self):
+        # Balances are computed once for the whole chunk fetched, so we need
+        # to buffer it first.
+        banktransactions = list(super(BalanceModelIterable, self).__iter__())
+
+        if banktransactions:
+            balances = self.queryset.model.objects.get_running_balances(
+                self.queryset._balance_bankaccount,
+                banktransactions,
+                direction=self.queryset._balance_direction,
+            )
+            for banktransaction in banktransactions:
+                (banktransaction.total_balance,
+                 banktransaction.reconciled_balance) = balances[banktransaction.pk]
+
+        return iter(banktransactions)
+
+
+class BankTransactionQuerySet(models.QuerySet):
+
+    _balance_bankaccount = None
+    _balance_direction = BALANCE_PREFIX
+
+    def _clone(self, **kwargs):
+        clone = super(BankTransactionQuerySet, self)._clone(**kwargs)
+        clone._balance_bankaccount = self._balance_bankaccount
+        clone._balance_direction = self._balance_direction
+        return clone
+
+    def with_balances(self, bankaccount, direction=BALANCE_PREFIX):
+        """
+        Attach extra attributes total_balance and reconciled_balance to each
+        bank transaction fetched, no matter which filters/orders are applied.
+        """
+        clone = self._clone()
+        clone._balance_bankaccount = bankaccount
+        clone._balance_direction = direction
+        clone._iterable_class = BalanceModelIterable
+        return clone
 
 
 class BankTransactionManager(models.Manager):
 
-    def get_current_balance(self, bankaccount):
+    def get_queryset(self):
+        return BankTransactionQuerySet(self.model, using=self._db)
 
-        # Get futur balance instead for performance.
-        futur_balance = (
-            self
-            .filter(bankaccount=bankaccount)
-            .exclude(status=BankTransaction.STATUS_INACTIVE)
-            .filter(date__gt=date.today())
-            .aggregate(models.Sum('amount'))
-        )['amount__sum'] or 0
+    def get_current_balance(self, bankaccount):
 
         # Returns difference between total balance and future balance which is
-        # finally the current balance.
-        return Decimal(bankaccount.balance - futur_balance)
+        # finally the current balance. Both are maintained by bank
+        # transactions, so no aggregation is needed.
+        return Decimal(bankaccount.balance - bankaccount.future_delta)
 
     def get_reconciled_balance(self, bankaccount):
+        return Decimal(bankaccount.reconciled_balance)
 
-        # Get non reconciled sum instead of sum of reconciled bank
-        # transactions. By assuming that most of the bank transactions are
-        # reconciled, it should be better for performance.
-        total_not_reconciled = (
-            self
-            .filter(bankaccount=bankaccount)
-            .filter(reconciled=False)
-            .exclude(status=BankTransaction.STATUS_INACTIVE)
-            .aggregate(models.Sum('amount'))
-        )['amount__sum'] or 0
+    def get_balance_deltas(self, date_value, amount, status, reconciled):
+        """
+        Returns how much a bank transaction weighs on each balance maintained
+        by its bank account.
+        """
+        deltas = dict.fromkeys(BANKACCOUNT_BALANCE_FIELDS, 0)
+
+        if status != BankTransaction.STATUS_INACTIVE:
+            amount = Decimal(amount)
+            deltas['balance'] = amount
 
-        return Decimal(bankaccount.balance - total_not_reconciled)
+            if reconciled:
+                deltas['reconciled_balance'] = amount
+
+            date_value = self.model._meta.get_field('date').to_python(date_value)
+            if date_value > date.today():
+                deltas['future_delta'] = amount
+
+        return deltas
+
+    def roll_forward_future_deltas(self):
+        """
+        Recompute the future delta of every bank accounts, to be executed at
+        least once a day: yesterday future bank transactions are now past.
+        """
+        query = """
+            UPDATE {table_bankaccount}
+            SET future_delta = COALESCE((
+                SELECT SUM(bt.amount)
+                FROM {table} AS bt
+                WHERE
+                    bt.bankaccount_id = {table_bankaccount}.id
+                    AND bt.status <> %s
+                    AND bt.date > %s
+            ), 0)
+            """.format(
+            table_bankaccount=BankAccount._meta.db_table,
+            table=self.model._meta.db_table,
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute(query, [self.model.STATUS_INACTIVE, date.today()])
 
     def get_total_unscheduled_period(self, bankaccount,
                                      granularity=GRANULARITY_MONTH):
@@ -60,6 +180,625 @@ class BankTransactionManager(models.Manager):
             .aggregate(total=models.Sum('amount'))
         )['total']
 
+    def get_running_balances(self, bankaccount, banktransactions,
+                             direction=BALANCE_PREFIX):
+        """
+        Returns a dict of total and reconciled balances at each bank
+        transaction given, keyed by their primary key. Balances are running
+        sums over the whole bank account history ordered by date and id.
+        Reconciled balance is None while no bank transaction is reconciled.
+
+        With the prefix direction, balances are summed up from the daily
+        balance opening the dates range. With the suffix direction, they are
+        deduced from the current balance minus the newer bank transactions,
+        which is cheaper for the latest ones.
+        """
+        pks = set(bt.pk for bt in banktransactions)
+        date_min = min(bt.date for bt in banktransactions)
+        date_max = max(bt.date for bt in banktransactions)
+
+        if direction == BALANCE_SUFFIX:
+            balances = self._get_suffix_balances(bankaccount, pks, date_min)
+        else:
+            balances = self._get_prefix_balances(
+                bankaccount, pks, date_min, date_max,
+            )
+
+        places = Decimal(10) ** -self.model._meta.get_field('amount').decimal_places
+        return {
+            pk: tuple(
+                Decimal(value).quantize(places) if value is not None else None
+                for value in values
+            )
+            for pk, values in balances.items()
+        }
+
+    def _get_prefix_balances(self, bankaccount, pks, date_min, date_max):
+
+        # Older bank transactions are summed up by the daily balances, whereas
+        # later ones couldn't alter the running sums.
+        opening = BankAccountDailyBalance.objects.get_balances_before(
+            bankaccount, date_min,
+        ) or {}
+        opening_total = opening.get('balance', 0) + bankaccount.balance_initial
+
+        # Running sums are zero rather than None while nothing is reconciled,
+        # like the suffix direction assumes.
+        opening_reconciled = None
+        if opening and (
+                opening['reconciled_balance'] or
+                self
+                .filter(bankaccount=bankaccount, date__lt=date_min, reconciled=True)
+                .exclude(status=self.model.STATUS_INACTIVE)
+                .exists()):
+            opening_reconciled = opening['reconciled_balance']
+
+        if supports_window_functions(connection):
+            rows = self._get_prefix_balances_window(
+                bankaccount, pks, date_min, date_max,
+            )
+        else:
+            rows = self._get_prefix_balances_iterator(
+                bankaccount, pks, date_min, date_max,
+            )
+
+        balances = {}
+        for pk, total, reconciled in rows:
+            if reconciled is not None or opening_reconciled is not None:
+                reconciled = (
+                    (reconciled or 0) + (opening_reconciled or 0) +
+                    bankaccount.balance_initial
+                )
+
+            balances[pk] = (total + opening_total, reconciled)
+
+        return balances
+
+    def _get_prefix_balances_window(self, bankaccount, pks, date_min, date_max):
+
+        # Filters are applied on the outer query only, otherwise rows
+        # filtered would be missing from the running sums.
+        query = """
+            SELECT id, total_balance, reconciled_balance
+            FROM (
+                SELECT
+                    id,
+                    SUM(CASE WHEN status <> %s THEN amount ELSE 0 END) OVER (
+                        PARTITION BY bankaccount_id ORDER BY date, id
+                    ) AS total_balance,
+                    SUM(CASE WHEN status <> %s AND reconciled THEN amount END) OVER (
+                        PARTITION BY bankaccount_id ORDER BY date, id
+                    ) AS reconciled_balance
+                FROM {table}
+                WHERE bankaccount_id = %s AND date BETWEEN %s AND %s
+            ) AS balances
+            WHERE id IN ({pks})
+            """.format(
+            table=self.model._meta.db_table,
+            pks=', '.join(['%s'] * len(pks)),
+        )
+        params = [
+            self.model.STATUS_INACTIVE,
+            self.model.STATUS_INACTIVE,
+            bankaccount.pk,
+            date_min,
+            date_max,
+        ] + list(pks)
+
+        with connection.cursor() as cursor:
+            cursor.execute(query, params)
+            for pk, total, reconciled in cursor.fetchall():
+                yield (
+                    pk,
+                    Decimal(total),
+                    Decimal(reconciled) if reconciled is not None else None,
+                )
+
+    def _get_prefix_balances_iterator(self, bankaccount, pks, date_min, date_max):
+
+        # Fallback for backends without window functions: one streamed pass
+        # over the dates range instead of one subquery per row.
+        qs = (
+            self
+            .filter(bankaccount=bankaccount, date__range=(date_min, date_max))
+            .order_by('date', 'id')
+            .values_list('pk', 'amount', 'status', 'reconciled')
+        )
+
+        total, reconciled = 0, None
+        for pk, amount, status, is_reconciled in qs.iterator():
+
+            if status != self.model.STATUS_INACTIVE:
+                total += amount
+                if is_reconciled:
+                    reconciled = (reconciled or 0) + amount
+
+            if pk in pks:
+                yield pk, total, reconciled
+
+    def _get_suffix_balances(self, bankaccount, pks, date_min):
+
+        # Current balances minus the sums of newer bank transactions. Newer
+        # sums are NULL for the latest bank transaction, so coalesce them.
+        if supports_window_functions(connection):
+            rows = self._get_suffix_balances_window(bankaccount, pks, date_min)
+        else:
+            rows = self._get_suffix_balances_iterator(bankaccount, pks, date_min)
+
+        reconciled_total = self.get_reconciled_balance(bankaccount)
+        reconciled_before = None
+
+        balances = {}
+        for pk, newer_total, newer_reconciled, reconciled_count in rows:
+
+            # Still None if nothing is reconciled yet at this row.
+            if not reconciled_count and reconciled_before is None:
+                reconciled_before = (
+                    self
+                    .filter(bankaccount=bankaccount, date__lt=date_min, reconciled=True)
+                    .exclude(status=self.model.STATUS_INACTIVE)
+                    .exists()
+                )
+
+            balances[pk] = (
+                bankaccount.balance - newer_total,
+                reconciled_total - newer_reconciled
+                if reconciled_count or reconciled_before else None,
+            )
+
+        return balances
+
+    def _get_suffix_balances_window(self, bankaccount, pks, date_min):
+
+        newer = """
+            OVER (
+                PARTITION BY bankaccount_id ORDER BY date DESC, id DESC
+                ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+            )
+            """
+        query = """
+            SELECT id, newer_total, newer_reconciled, reconciled_count
+            FROM (
+                SELECT
+                    id,
+                    COALESCE(
+                        SUM(CASE WHEN status <> %s THEN amount ELSE 0 END) {newer},
+                        0
+                    ) AS newer_total,
+                    COALESCE(
+                        SUM(CASE WHEN status <> %s AND reconciled THEN amount ELSE 0 END) {newer},
+                        0
+                    ) AS newer_reconciled,
+                    COUNT(CASE WHEN status <> %s AND reconciled THEN 1 END) OVER (
+                        PARTITION BY bankaccount_id ORDER BY date, id
+                    ) AS reconciled_count
+                FROM {table}
+                WHERE bankaccount_id = %s AND date >= %s
+            ) AS balances
+            WHERE id IN ({pks})
+            """.format(
+            newer=newer,
+            table=self.model._meta.db_table,
+            pks=', '.join(['%s'] * len(pks)),
+        )
+        params = [
+            self.model.STATUS_INACTIVE,
+            self.model.STATUS_INACTIVE,
+            self.model.STATUS_INACTIVE,
+            bankaccount.pk,
+            date_min,
+        ] + list(pks)
+
+        with connection.cursor() as cursor:
+            cursor.execute(query, params)
+            for pk, newer_total, newer_reconciled, reconciled_count in cursor.fetchall():
+                yield pk, Decimal(newer_total), Decimal(newer_reconciled), reconciled_count
+
+    def _get_suffix_balances_iterator(self, bankaccount, pks, date_min):
+
+        qs = (
+            self
+            .filter(bankaccount=bankaccount, date__gte=date_min)
+            .order_by('-date', '-id')
+            .values_list('pk', 'amount', 'status', 'reconciled')
+        )
+
+        rows, newer_total, newer_reconciled, newer_count = [], 0, 0, 0
+        for pk, amount, status, is_reconciled in qs.iterator():
+
+            if pk in pks:
+                rows.append([pk, newer_total, newer_reconciled, newer_count])
+
+            if status != self.model.STATUS_INACTIVE:
+                newer_total += amount
+                if is_reconciled:
+                    newer_reconciled += amount
+                    newer_count += 1
+
+        # Reconciled rows up to each one are the ones which are not newer.
+        for row in rows:
+            row[3] = newer_count - row[3]
+            yield row
+
+    def iter_running_balances(self, bankaccount, fields, filters=None,
+                              date_start=None, date_end=None):
+        """
+        Yield values of the fields given for the bank transactions matching
+        the filters (a Q object) in chronological order, followed by their
+        total and reconciled balances.
+
+        Balances are summed up incrementally while scanning every bank
+        transactions of the period, from the daily balances before it if
+        any. Thus no model instances are built and no subqueries are needed.
+        """
+        qs = self.filter(bankaccount=bankaccount)
+        if date_start is not None:
+            qs = qs.filter(date__gte=date_start)
+        if date_end is not None:
+            qs = qs.filter(date__lte=date_end)
+
+        if filters:
+            qs = qs.annotate(matched=models.Case(
+                models.When(filters, then=models.Value(True)),
+                default=models.Value(False),
+                output_field=models.BooleanField(),
+            ))
+        else:
+            qs = qs.annotate(matched=models.Value(
+                True, output_field=models.BooleanField(),
+            ))
+
+        total = reconciled = bankaccount.balance_initial
+        if date_start is not None:
+            opening = BankAccountDailyBalance.objects.get_balances_before(
+                bankaccount, date_start,
+            )
+            if opening is not None:
+                total += opening['balance']
+                reconciled += opening['reconciled_balance']
+
+        qs = (
+            qs
+            .order_by('date', 'id')
+            .values_list('amount', 'status', 'reconciled', 'matched', *fields)
+        )
+        for amount, status, is_reconciled, matched, *values in qs.iterator():
+            if status != self.model.STATUS_INACTIVE:
+                total += amount
+                if is_reconciled:
+                    reconciled += amount
+
+            if matched:
+                yield values + [total, reconciled]
+
+    def get_daily_series(self, bankaccount, reconciled=None):
+        """
+        Returns the daily series of the active bank transactions of the bank
+        account given, optionally filtered by the reconciled flag. It is
+        computed with a single query, then cached until the data of the bank
+        account changes.
+        """
+        def compute():
+            if supports_window_functions(connection):
+                rows = self._get_daily_series_window(bankaccount, reconciled)
+            else:
+                rows = self._get_daily_series_iterator(bankaccount, reconciled)
+
+            return DailySeries(
+                rows,
+                decimal_places=self.model._meta.get_field('amount').decimal_places,
+            )
+
+        return get_or_compute(
+            'dailyseries', bankaccount, {'reconciled': reconciled}, compute,
+        )
+
+    def _get_daily_series_window(self, bankaccount, reconciled):
+
+        query = """
+            SELECT
+                date,
+                SUM(amount),
+                COUNT(id),
+                SUM(SUM(amount)) OVER (ORDER BY date)
+            FROM {table}
+            WHERE bankaccount_id = %s AND status = %s {reconciled}
+            GROUP BY date
+            ORDER BY date
+            """.format(
+            table=self.model._meta.db_table,
+            reconciled='AND reconciled = %s' if reconciled is not None else '',
+        )
+        params = [bankaccount.pk, self.model.STATUS_ACTIVE]
+        if reconciled is not None:
+            params.append(reconciled)
+
+        places = Decimal(10) ** -self.model._meta.get_field('amount').decimal_places
+        date_field = self.model._meta.get_field('date')
+
+        with connection.cursor() as cursor:
+            cursor.execute(query, params)
+            for date_value, total, count, balance in cursor.fetchall():
+                yield (
+                    date_field.to_python(date_value),
+                    Decimal(total).quantize(places),
+                    count,
+                    Decimal(balance).quantize(places),
+                )
+
+    def _get_daily_series_iterator(self, bankaccount, reconciled):
+
+        qs = self.filter(bankaccount=bankaccount, status=self.model.STATUS_ACTIVE)
+        if reconciled is not None:
+            qs = qs.filter(reconciled=reconciled)
+
+        qs = (
+            qs
+            .order_by('date')
+            .values_list('date')
+            .annotate(total=models.Sum('amount'), count=models.Count('id'))
+        )
+
+        balance = 0
+        for date_value, total, count in qs.iterator():
+            balance += total
+            yield date_value, total, count, balance
+
+    def find_duplicates(self, candidates):
+        """
+        Returns the candidates (unsaved bank transactions) which already
+        exist, resolved by their fingerprints at once per bank account instead
+        of comparing each of them with the bank account history.
+        """
+        candidates = list(candidates)
+        fingerprints = {}
+        for candidate in candidates:
+            candidate.set_fingerprint()
+            fingerprints.setdefault(candidate.bankaccount_id, set()).add(
+                candidate.fingerprint,
+            )
+
+        existing = set()
+        for bankaccount_id, account_fingerprints in fingerprints.items():
+            # Some backends limit the number of query parameters.
+            batch_size = max(
+                connection.ops.bulk_batch_size(['fingerprint'], account_fingerprints), 1,
+            )
+            account_fingerprints = list(account_fingerprints)
+            for i in range(0, len(account_fingerprints), batch_size):
+                existing.update(
+                    self
+                    .filter(
+                        bankaccount_id=bankaccount_id,
+                        fingerprint__in=account_fingerprints[i:i + batch_size],
+                    )
+                    .values_list('bankaccount_id', 'fingerprint')
+                )
+
+        return [
+            candidate for candidate in candidates
+            if (candidate.bankaccount_id, candidate.fingerprint) in existing
+        ]
+
+    def retag(self, bankaccount, overwrite=False):
+        """
+        Tag bank transactions of the bank account given with the rules of
+        its owners, in a single pass over its history. Updates are grouped
+        by tag. Already tagged bank transactions are only retagged if
+        required. Returns the number of bank transactions tagged.
+        """
+        matcher = BankTransactionTagRule.objects.get_matcher(
+            bankaccount.owners.all(),
+        )
+        if not matcher:
+            return 0
+
+        qs = self.filter(bankaccount=bankaccount)
+        if not overwrite:
+            qs = qs.filter(tag__isnull=True)
+
+        changes, rollup_deltas = {}, {}
+        qs = qs.values_list(
+            'pk', 'label', 'amount', 'payment_method', 'tag', 'date', 'status',
+            'reconciled',
+        )
+        for pk, label, amount, payment_method, tag_id, *state in qs.iterator():
+            new_tag_id = matcher.match(label, amount, payment_method)
+            if new_tag_id is not None and new_tag_id != tag_id:
+                changes.setdefault(new_tag_id, []).append(pk)
+
+                date_value, status, reconciled = state
+                for state_tag_id, sign in ((tag_id, -1), (new_tag_id, 1)):
+                    BankTransactionRollup.objects.add_deltas(
+                        rollup_deltas,
+                        (date_value, amount, status, reconciled, state_tag_id),
+                        sign,
+                    )
+
+        with transaction.atomic():
+            for tag_id, pks in changes.items():
+                # Some backends limit the number of query parameters.
+                batch_size = max(connection.ops.bulk_batch_size(['pk'], pks), 1)
+                for i in range(0, len(pks), batch_size):
+                    self.filter(pk__in=pks[i:i + batch_size]).update(tag=tag_id)
+
+            BankTransactionRollup.objects.apply_deltas(
+                bankaccount.pk, rollup_deltas,
+            )
+
+            if changes:
+                BankAccount.objects.bump_data_version(bankaccount.pk)
+
+        return sum(len(pks) for pks in changes.values())
+
+    def update_reconciled(self, pks, reconciled):
+        """
+        Bulk update the reconciled flag of the bank transactions given and
+        shift the daily balances accordingly, with a constant number of
+        queries per bank account.
+        """
+        qs = self.filter(pk__in=pks).exclude(reconciled=reconciled)
+
+        with transaction.atomic():
+            changes = list(
+                qs
+                .order_by()
+                .values_list('bankaccount', 'date', 'status')
+                .annotate(total=models.Sum('amount'))
+            )
+            rollup_deltas = BankTransactionRollup.objects.get_queryset_deltas(qs)
+            qs.update(reconciled=reconciled)
+
+            # Rollups are moved from the previous flag to the new one.
+            for bankaccount_id, key_deltas in rollup_deltas.items():
+                moves = {}
+                for (month, tag_id, sign, previous), (total, count) in key_deltas.items():
+                    moves[(month, tag_id, sign, previous)] = (-total, -count)
+                    moves[(month, tag_id, sign, reconciled)] = (total, count)
+                BankTransactionRollup.objects.apply_deltas(bankaccount_id, moves)
+
+            deltas, days_deltas = {}, {}
+            for bankaccount_id, date_value, status, total in changes:
+                account_days_deltas = days_deltas.setdefault(bankaccount_id, {})
+                BankAccountDailyBalance.objects.add_deltas(
+                    account_days_deltas, (date_value, total, status, not reconciled), -1,
+                )
+                BankAccountDailyBalance.objects.add_deltas(
+                    account_days_deltas, (date_value, total, status, reconciled),
+                )
+
+                if status != self.model.STATUS_INACTIVE:
+                    deltas.setdefault(bankaccount_id, 0)
+                    deltas[bankaccount_id] += total if reconciled else -total
+
+            for bankaccount_id, delta in deltas.items():
+                BankAccount.objects.filter(pk=bankaccount_id).update(
+                    reconciled_balance=models.F('reconciled_balance') + delta,
+                )
+            for bankaccount_id, account_days_deltas in days_deltas.items():
+                BankAccountDailyBalance.objects.apply_days_deltas(
+                    bankaccount_id, account_days_deltas,
+                )
+
+            BankAccount.objects.bump_data_version(
+                *set(change[0] for change in changes)
+            )
+
+    def bulk_delete_with_balance(self, pks):
+        """
+        Delete the bank transactions given at once and shift the balances of
+        their bank accounts with a single update per bank account, and their
+        daily balances with a constant number of queries per bank account,
+        instead of deleting them one by one.
+        """
+        qs = self.filter(pk__in=pks)
+
+        with transaction.atomic():
+            changes = list(
+                qs
+                .order_by()
+                .values_list('bankaccount', 'date', 'status', 'reconciled')
+                .annotate(total=models.Sum('amount'))
+            )
+            rollup_deltas = BankTransactionRollup.objects.get_queryset_deltas(
+                qs, sign=-1,
+            )
+            count = qs.delete()[0]
+
+            for bankaccount_id, key_deltas in rollup_deltas.items():
+                BankTransactionRollup.objects.apply_deltas(
+                    bankaccount_id, key_deltas,
+                )
+
+            deltas, days_deltas = {}, {}
+            for bankaccount_id, date_value, status, reconciled, total in changes:
+                BankAccountDailyBalance.objects.add_deltas(
+                    days_deltas.setdefault(bankaccount_id, {}),
+                    (date_value, total, status, reconciled),
+                    -1,
+                )
+
+                account_deltas = deltas.setdefault(bankaccount_id, {})
+                for field, value in self.get_balance_deltas(
+                        date_value, total, status, reconciled).items():
+                    account_deltas[field] = account_deltas.get(field, 0) + value
+
+            for bankaccount_id, account_deltas in deltas.items():
+                BankAccount.objects.filter(pk=bankaccount_id).update(
+                    data_version=models.F('data_version') + 1,
+                    **{
+                        field: models.F(field) - value
+                        for field, value in account_deltas.items()
+                    }
+                )
+                BankAccountDailyBalance.objects.apply_days_deltas(
+                    bankaccount_id, days_deltas[bankaccount_id],
+                )
+
+        return count
+
+    def bulk_create_with_balance(self, objs, batch_size=None,
+                                 update_aggregates=True):
+        """
+        Insert the bank transactions given by batches and shift the balances
+        of their bank accounts with a single update per bank account, as
+        save() does for one bank transaction. Inactive bank transactions
+        don't change balances.
+
+        Daily balances are shifted with a constant number of queries per bank
+        account and rollups once per month and tag. Successive bulk inserts
+        may skip updating them, then rebuild them only once at the end.
+        """
+        objs = list(objs)
+        bankaccounts, deltas, days_deltas, rollup_deltas = {}, {}, {}, {}
+
+        for obj in objs:
+            obj.currency = obj.bankaccount.currency
+            obj.set_fingerprint()
+            bankaccounts[obj.bankaccount_id] = obj.bankaccount
+
+            if update_aggregates:
+                BankAccountDailyBalance.objects.add_deltas(
+                    days_deltas.setdefault(obj.bankaccount_id, {}),
+                    (obj.date, obj.amount, obj.status, obj.reconciled),
+                )
+                BankTransactionRollup.objects.add_deltas(
+                    rollup_deltas.setdefault(obj.bankaccount_id, {}),
+                    obj.get_state(),
+                )
+
+            account_deltas = deltas.setdefault(obj.bankaccount_id, {})
+            for field, value in self.get_balance_deltas(
+                    obj.date, obj.amount, obj.status, obj.reconciled).items():
+                account_deltas[field] = account_deltas.get(field, 0) + value
+
+        with transaction.atomic():
+            objs = self.bulk_create(objs, batch_size=batch_size)
+
+            for bankaccount_id, account_deltas in deltas.items():
+                BankAccount.objects.filter(pk=bankaccount_id).update(
+                    data_version=models.F('data_version') + 1,
+                    **{
+                        field: models.F(field) + value
+                        for field, value in account_deltas.items()
+                    }
+                )
+                if update_aggregates:
+                    BankAccountDailyBalance.objects.apply_days_deltas(
+                        bankaccount_id, days_deltas[bankaccount_id],
+                        batch_size=batch_size,
+                    )
+                    BankTransactionRollup.objects.apply_deltas(
+                        bankaccount_id, rollup_deltas[bankaccount_id],
+                    )
+
+        for bankaccount_id, bankaccount in bankaccounts.items():
+            bankaccount.refresh_from_db(
+                fields=list(deltas[bankaccount_id]) + ['data_version'],
+            )
+
+        return objs
+
 
 class AbstractBankTransaction(models.Model):
     """
@@ -145,9 +884,10 @@ class AbstractBankTransaction(models.Model):
         return self.label
 
 
-class BankTransaction(AbstractBankTransaction):
+class BankTransaction(LoadedValuesMixin, AbstractBankTransaction):
 
     scheduled = models.BooleanField(default=False, editable=False)
+    fingerprint = models.CharField(max_length=40, default='', editable=False)
 
     objects = BankTransactionManager()
 
@@ -157,31 +897,43 @@ class BankTransaction(AbstractBankTransaction):
             ["bankaccount", "amount"],
             ["bankaccount", "date"],
             ["bankaccount", "reconciled"],
+            ["bankaccount", "fingerprint"],
         ]
         get_latest_by = "date"
 
-    def save(self, *args, **kwargs):
-
-        if self.status == self.STATUS_INACTIVE:
-            super(BankTransaction, self).save(*args, **kwargs)
-            return
+    # Fields which make the balances of the bank account.
+    BALANCE_STATE_FIELDS = ('date', 'amount', 'status', 'reconciled')
+    # Fields which make the rollups in addition.
+    STATE_FIELDS = BALANCE_STATE_FIELDS + ('tag',)
 
+    def save(self, *args, **kwargs):
+        """
+        Shift the balances of the bank account by the difference between the
+        previous state of the bank transaction and the new one. The previous
+        state is the one loaded, unless strict consistency is required with
+        `select_for_update`, which locks the row to fetch it again.
+        """
+        select_for_update = kwargs.pop('select_for_update', False)
         self.currency = self.bankaccount.currency
-        amount = Decimal(self.amount)
-        if self.pk is not None:
-            # Deduce previous value if updated.
-            amount -= Decimal(BankTransaction.objects.get(pk=self.pk).amount)
+        self.set_fingerprint()
 
-        # Update bank account balance.
         try:
             with transaction.atomic():
-                super(BankTransaction, self).save(*args, **kwargs)
+                previous = None
+                if self.pk is not None:
+                    previous = self._get_previous_state(select_for_update)
 
-                self.bankaccount.balance = models.F('balance') + amount
-                self.bankaccount.save(update_fields=['balance'])
-        finally:
+                super(BankTransaction, self).save(*args, **kwargs)
+                fields = self._shift_balances(previous, self.get_state())
+        except Exception:
             # Reload it to replace F expression of instance attribute.
-            self.bankaccount.refresh_from_db(fields=['balance'])
+            self.bankaccount.refresh_from_db(
+                fields=BANKACCOUNT_BALANCE_FIELDS + ('data_version',),
+            )
+            raise
+
+        self.bankaccount.refresh_from_db(fields=fields)
+        self.set_loaded_values(*self.STATE_FIELDS)
 
     def get_absolute_url(self):
         return reverse('banktransactions:list', kwargs={
@@ -189,20 +941,605 @@ class BankTransaction(AbstractBankTransaction):
         })
 
     def delete(self, *args, **kwargs):
+        select_for_update = kwargs.pop('select_for_update', False)
 
-        if self.status == self.STATUS_INACTIVE:
-            super(BankTransaction, self).delete(*args, **kwargs)
-            return
-
-        # Update bank account balance.
         try:
             with transaction.atomic():
+                previous = self._get_previous_state(select_for_update)
                 super(BankTransaction, self).delete(*args, **kwargs)
+                fields = self._shift_balances(previous, None)
+        except Exception:
+            self.bankaccount.refresh_from_db(
+                fields=BANKACCOUNT_BALANCE_FIELDS + ('data_version',),
+            )
+            raise
+
+        self.bankaccount.refresh_from_db(fields=fields)
 
-                self.bankaccount.balance = (
-                    models.F('balance') - Decimal(self.amount)
+    def set_fingerprint(self):
+        self.fingerprint = get_fingerprint(
+            self.bankaccount_id, self.date, self.amount, self.label,
+        )
+
+    def get_state(self):
+        return tuple(
+            getattr(self, self._meta.get_field(field).attname)
+            for field in self.STATE_FIELDS
+        )
+
+    def _get_previous_state(self, select_for_update=False):
+        """
+        Returns the state stored of the bank transaction, fetched again only
+        if unknown or for strict consistency.
+        """
+        previous = None
+        if not select_for_update:
+            previous = self.get_loaded_values(*self.STATE_FIELDS)
+
+        if previous is None:
+            qs = BankTransaction.objects.filter(pk=self.pk)
+            if select_for_update:
+                qs = qs.select_for_update()
+            previous = qs.values_list(*self.STATE_FIELDS).first()
+
+        return previous
+
+    def _shift_balances(self, previous, current):
+        """
+        Apply the difference between both states (None if it doesn't exist)
+        on the bank account balances, its daily balances and its rollups, then
+        bump its data version. Returns the bank account fields shifted.
+        """
+        BankTransactionRollup.objects.update_banktransaction(
+            self.bankaccount_id, previous=previous, current=current,
+        )
+
+        # Balances don't depend on the tag.
+        previous = previous[:len(self.BALANCE_STATE_FIELDS)] if previous else None
+        current = current[:len(self.BALANCE_STATE_FIELDS)] if current else None
+
+        deltas = dict.fromkeys(BANKACCOUNT_BALANCE_FIELDS, 0)
+        for state, sign in ((previous, -1), (current, 1)):
+            if state is not None:
+                state_deltas = BankTransaction.objects.get_balance_deltas(*state)
+                for field, value in state_deltas.items():
+                    deltas[field] += sign * value
+
+        fields = [field for field, value in deltas.items() if value]
+        for field in fields:
+            setattr(self.bankaccount, field, models.F(field) + deltas[field])
+        self.bankaccount.data_version = models.F('data_version') + 1
+        fields.append('data_version')
+        self.bankaccount.save(update_fields=fields)
+
+        BankAccountDailyBalance.objects.update_banktransaction(
+            self.bankaccount_id, previous=previous, current=current,
+        )
+        return fields
+
+
+class BankAccountDailyBalanceManager(models.Manager):
+
+    def get_balances_before(self, bankaccount, date_value):
+        """
+        Returns the running sums at the end of the last day before the date
+        given, or None if there is no bank transaction before.
+        """
+        return (
+            self
+            .filter(bankaccount=bankaccount, date__lt=date_value)
+            .order_by('-date')
+            .values(*BankAccountDailyBalance.BALANCE_FIELDS)
+            .first()
+        )
+
+    def get_deltas(self, amount, status, reconciled):
+        """
+        Returns how much a bank transaction weighs on each running sums.
+        """
+        amount = Decimal(amount)
+        deltas = dict.fromkeys(BankAccountDailyBalance.BALANCE_FIELDS, 0)
+
+        if status != BankTransaction.STATUS_INACTIVE:
+            deltas['balance'] = amount
+            if reconciled:
+                deltas['reconciled_balance'] = amount
+
+        if status == BankTransaction.STATUS_ACTIVE:
+            deltas['active_balance'] = amount
+            if reconciled:
+                deltas['active_reconciled_balance'] = amount
+
+        return deltas
+
+    def update_banktransaction(self, bankaccount_id, previous=None, current=None):
+        """
+        Shift the daily balances by the differences between the previous and
+        the current state of a bank transaction. States are tuples of (date,
+        amount, status, reconciled), None if it doesn't exist.
+        """
+        deltas = {}
+
+        for state, sign in ((previous, -1), (current, 1)):
+            if state is None:
+                continue
+
+            day_deltas = deltas.setdefault(
+                state[0], dict.fromkeys(BankAccountDailyBalance.BALANCE_FIELDS, 0),
+            )
+            for field, value in self.get_deltas(*state[1:]).items():
+                day_deltas[field] += sign * value
+
+        for date_value, day_deltas in deltas.items():
+            self.apply_deltas(bankaccount_id, date_value, day_deltas)
+
+    def add_deltas(self, deltas, state, sign=1):
+        """
+        Add to the deltas given, keyed by day, how much a bank transaction
+        weighs on the running sums. State is a tuple of (date, amount, status,
+        reconciled).
+        """
+        day_deltas = deltas.setdefault(
+            state[0], dict.fromkeys(BankAccountDailyBalance.BALANCE_FIELDS, 0),
+        )
+        for field, value in self.get_deltas(*state[1:]).items():
+            day_deltas[field] += sign * value
+        return deltas
+
+    def apply_days_deltas(self, bankaccount_id, deltas, batch_size=None):
+        """
+        Shift the running sums by the deltas given, keyed by day, with a
+        constant number of queries however many days changed: days missing
+        are inserted at once carrying the running sums of their previous day,
+        then every following day is shifted by a single update.
+        """
+        deltas = {
+            date_value: day_deltas for date_value, day_deltas in deltas.items()
+            if any(day_deltas.values())
+        }
+        if not deltas:
+            return
+
+        dates = sorted(deltas)
+        fields = BankAccountDailyBalance.BALANCE_FIELDS
+
+        # Running sums of the days missing are the ones of their previous day,
+        # before being shifted as any other day.
+        opening = self.get_balances_before(bankaccount_id, dates[0])
+        running = tuple(opening[field] for field in fields) if opening else (0,) * len(fields)
+        existing = dict(
+            (row[0], row[1:]) for row in
+            self
+            .filter(bankaccount=bankaccount_id, date__range=(dates[0], dates[-1]))
+            .order_by('date')
+            .values_list('date', *fields)
+        )
+
+        missing, existing_dates, i = [], sorted(existing), 0
+        for date_value in dates:
+            while i < len(existing_dates) and existing_dates[i] <= date_value:
+                running = existing[existing_dates[i]]
+                i += 1
+            if date_value not in existing:
+                missing.append(BankAccountDailyBalance(
+                    bankaccount_id=bankaccount_id,
+                    date=date_value,
+                    **dict(zip(fields, running))
+                ))
+        self.bulk_create(missing, batch_size=batch_size)
+
+        # Each day is shifted by the deltas cumulated up to it.
+        cumulated, totals = [], dict.fromkeys(fields, 0)
+        for date_value in dates:
+            for field in fields:
+                totals[field] += deltas[date_value][field]
+            cumulated.append((date_value, dict(totals)))
+
+        updates = {}
+        for field in fields:
+            if not any(day_totals[field] for date_value, day_totals in cumulated):
+                continue
+            updates[field] = models.F(field) + models.Case(
+                *[
+                    models.When(date__gte=date_value, then=models.Value(day_totals[field]))
+                    for date_value, day_totals in reversed(cumulated[1:])
+                ],
+                default=models.Value(cumulated[0][1][field]),
+                output_field=models.DecimalField()
+            )
+
+        self.filter(bankaccount=bankaccount_id, date__gte=dates[0]).update(**updates)
+
+    def apply_deltas(self, bankaccount_id, date_value, deltas):
+        """
+        Shift the running sums of the given day and all the following ones.
+        """
+        deltas = {field: value for field, value in deltas.items() if value}
+        if not deltas:
+            return
+
+        # Opening a new day means carrying running sums of the previous one.
+        if not self.filter(bankaccount=bankaccount_id, date=date_value).exists():
+            self.get_or_create(
+                bankaccount_id=bankaccount_id,
+                date=date_value,
+                defaults=self.get_balances_before(bankaccount_id, date_value),
+            )
+
+        self.filter(bankaccount=bankaccount_id, date__gte=date_value).update(**{
+            field: models.F(field) + value for field, value in deltas.items()
+        })
+
+    def rebuild(self, bankaccount, batch_size=None):
+        """
+        Delete then recompute from scratch the daily balances of the bank
+        account given.
+        """
+        def conditional_sum(**conditions):
+            return models.Sum(models.Case(
+                models.When(then='amount', **conditions),
+                default=0,
+                output_field=models.DecimalField(),
+            ))
+
+        days = (
+            BankTransaction.objects
+            .filter(bankaccount=bankaccount)
+            .exclude(status=BankTransaction.STATUS_INACTIVE)
+            .order_by('date')
+            .values_list('date')
+            .annotate(
+                balance=models.Sum('amount'),
+                reconciled_balance=conditional_sum(reconciled=True),
+                active_balance=conditional_sum(
+                    status=BankTransaction.STATUS_ACTIVE,
+                ),
+                active_reconciled_balance=conditional_sum(
+                    status=BankTransaction.STATUS_ACTIVE,
+                    reconciled=True,
+                ),
+            )
+        )
+
+        def iter_daily_balances():
+            running = dict.fromkeys(BankAccountDailyBalance.BALANCE_FIELDS, 0)
+            for day in days.iterator():
+                for field, value in zip(BankAccountDailyBalance.BALANCE_FIELDS, day[1:]):
+                    running[field] += value
+                yield BankAccountDailyBalance(
+                    bankaccount=bankaccount, date=day[0], **running
                 )
 
-                self.bankaccount.save()
-        finally:
-            self.bankaccount.refresh_from_db(fields=['balance'])
+        with transaction.atomic():
+            self.filter(bankaccount=bankaccount).delete()
+            self.bulk_create(iter_daily_balances(), batch_size=batch_size)
+            BankAccount.objects.bump_data_version(bankaccount.pk)
+
+
+class BankAccountDailyBalance(models.Model):
+    """
+    Running sums of a bank account at the end of each day having bank
+    transactions. Initial balance of the bank account is not included.
+    """
+
+    BALANCE_FIELDS = (
+        'balance',
+        'reconciled_balance',
+        'active_balance',
+        'active_reconciled_balance',
+    )
+
+    bankaccount = models.ForeignKey(
+        BankAccount,
+        related_name='daily_balances',
+        on_delete=models.CASCADE,
+    )
+    date = models.DateField()
+    # Sum of bank transactions which are not inactive, like the bank account
+    # balance.
+    balance = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    reconciled_balance = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+    )
+    # Sum of active bank transactions only, like statistics.
+    active_balance = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+    )
+    active_reconciled_balance = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+    )
+
+    objects = BankAccountDailyBalanceManager()
+
+    class Meta:
+        db_table = 'bankaccounts_dailybalances'
+        unique_together = (('bankaccount', 'date'),)
+        # Internal data only maintained by bank transactions.
+        default_permissions = ()
+
+
+class BankTransactionRollupManager(models.Manager):
+
+    def get_key(self, date_value, amount, status, reconciled, tag_id):
+        """
+        Returns the key of the rollup summing up a bank transaction, or None
+        if it is not summed up.
+        """
+        if status != BankTransaction.STATUS_ACTIVE:
+            return None
+
+        date_value = BankTransaction._meta.get_field('date').to_python(date_value)
+        amount = Decimal(amount)
+        sign = (amount > 0) - (amount < 0)
+        return date_value.replace(day=1), tag_id, sign, reconciled
+
+    def add_deltas(self, deltas, state, sign=1):
+        """
+        Add to the deltas given how much a bank transaction weighs on its
+        rollup. State is a tuple of (date, amount, status, reconciled,
+        tag_id).
+        """
+        key = self.get_key(*state)
+        if key is not None:
+            key_deltas = deltas.setdefault(key, [0, 0])
+            key_deltas[0] += sign * Decimal(state[1])
+            key_deltas[1] += sign
+        return deltas
+
+    def get_queryset_deltas(self, qs, sign=1):
+        """
+        Returns the deltas of the bank transactions of the queryset given,
+        grouped by bank account with a single aggregation.
+        """
+        rows = (
+            qs
+            .filter(status=BankTransaction.STATUS_ACTIVE)
+            .annotate(
+                month=TruncMonth('date'),
+                sign=models.Case(
+                    models.When(amount__lt=0, then=models.Value(-1)),
+                    models.When(amount__gt=0, then=models.Value(1)),
+                    default=models.Value(0),
+                    output_field=models.SmallIntegerField(),
+                ),
+            )
+            .order_by()
+            .values_list('bankaccount', 'month', 'tag', 'sign', 'reconciled')
+            .annotate(total=models.Sum('amount'), count=models.Count('id'))
+        )
+
+        deltas = {}
+        for bankaccount_id, month, tag_id, amount_sign, reconciled, total, count in rows:
+            key = (month, tag_id, amount_sign, reconciled)
+            deltas.setdefault(bankaccount_id, {})[key] = [sign * total, sign * count]
+        return deltas
+
+    def update_banktransaction(self, bankaccount_id, previous=None, current=None):
+        """
+        Shift the rollups by the differences between the previous and the
+        current state of a bank transaction. States are tuples of (date,
+        amount, status, reconciled, tag_id), None if it doesn't exist.
+        """
+        deltas = {}
+        for state, sign in ((previous, -1), (current, 1)):
+            if state is not None:
+                self.add_deltas(deltas, state, sign)
+
+        self.apply_deltas(bankaccount_id, deltas)
+
+    def apply_deltas(self, bankaccount_id, deltas):
+        """
+        Shift the sums and counts of the rollups given, keyed by (month, tag_id,
+        sign, reconciled).
+        """
+        for (month, tag_id, sign, reconciled), (total, count) in deltas.items():
+            if not total and not count:
+                continue
+
+            lookups = {
+                'bankaccount_id': bankaccount_id,
+                'month': month,
+                'tag_id': tag_id,
+                'sign': sign,
+                'reconciled': reconciled,
+            }
+            updated = self.filter(**lookups).update(
+                sum=models.F('sum') + total,
+                count=models.F('count') + count,
+            )
+            if not updated:
+                obj, created = self.get_or_create(
+                    defaults={'sum': total, 'count': count}, **lookups
+                )
+                if not created:
+                    self.filter(pk=obj.pk).update(
+                        sum=models.F('sum') + total,
+                        count=models.F('count') + count,
+                    )
+
+    def rebuild(self, bankaccount, batch_size=None):
+        """
+        Delete then recompute from scratch the rollups of the bank account
+        given.
+        """
+        deltas = self.get_queryset_deltas(
+            BankTransaction.objects.filter(bankaccount=bankaccount),
+        ).get(bankaccount.pk, {})
+
+        with transaction.atomic():
+            self.filter(bankaccount=bankaccount).delete()
+            self.bulk_create(
+                (
+                    BankTransactionRollup(
+                        bankaccount=bankaccount,
+                        month=month,
+                        tag_id=tag_id,
+                        sign=sign,
+                        reconciled=reconciled,
+                        sum=total,
+                        count=count,
+                    )
+                    for (month, tag_id, sign, reconciled), (total, count)
+                    in deltas.items()
+                ),
+                batch_size=batch_size,
+            )
+            BankAccount.objects.bump_data_version(bankaccount.pk)
+
+    def get_tag_sums(self, bankaccount, date_start, date_end, sign=None,
+                     reconciled=None, sum_sign=None):
+        """
+        Returns a tuple of the sums and counts of active bank transactions of
+        the bank account given grouped by tag, and their grand total (None
+        without any row), with a single query. Whole months of the dates range
+        are read from the rollups, only edge days are summed up from bank
+        transactions.
+
+        Bank transactions could be filtered by the sign of their amount, while
+        tags could be filtered by the sign of their sum.
+        """
+        months, edges = split_whole_months(date_start, date_end)
+        qn = connection.ops.quote_name
+
+        parts, params = [], []
+        if months is not None:
+            where = ['bankaccount_id = %s', 'month BETWEEN %s AND %s', '{} > 0'.format(qn('count'))]
+            params += [bankaccount.pk, months[0], months[1]]
+            if sign is not None:
+                where.append('sign = %s')
+                params.append(sign)
+            if reconciled is not None:
+                where.append('reconciled = %s')
+                params.append(reconciled)
+
+            parts.append('SELECT tag_id, {sum} AS total, {count} AS cnt FROM {table} WHERE {where}'.format(
+                sum=qn('sum'),
+                count=qn('count'),
+                table=qn(self.model._meta.db_table),
+                where=' AND '.join(where),
+            ))
+
+        if edges:
+            where = [
+                'bankaccount_id = %s',
+                'status = %s',
+                '({})'.format(' OR '.join(['date BETWEEN %s AND %s'] * len(edges))),
+            ]
+            params += [bankaccount.pk, BankTransaction.STATUS_ACTIVE]
+            for date_range in edges:
+                params += list(date_range)
+            if sign is not None:
+                where.append('amount < 0' if sign < 0 else 'amount > 0')
+            if reconciled is not None:
+                where.append('reconciled = %s')
+                params.append(reconciled)
+
+            parts.append('SELECT tag_id, amount AS total, 1 AS cnt FROM {table} WHERE {where}'.format(
+                table=qn(BankTransaction._meta.db_table),
+                where=' AND '.join(where),
+            ))
+
+        if not parts:
+            return [], None
+
+        window = supports_window_functions(connection)
+        having = ''
+        if sum_sign is not None:
+            having = 'HAVING SUM(amounts.total) {} 0'.format('<' if sum_sign < 0 else '>')
+
+        query = """
+            SELECT
+                amounts.tag_id,
+                tags.name,
+                SUM(amounts.total),
+                SUM(amounts.cnt)
+                {window}
+            FROM ({parts}) AS amounts
+            LEFT OUTER JOIN {tags} AS tags ON tags.id = amounts.tag_id
+            GROUP BY amounts.tag_id, tags.name
+            {having}
+            """.format(
+            window=', SUM(SUM(amounts.total)) OVER ()' if window else '',
+            parts=' UNION ALL '.join(parts),
+            tags=qn(BankTransactionTag._meta.db_table),
+            having=having,
+        )
+
+        places = Decimal(10) ** -self.model._meta.get_field('sum').decimal_places
+        rows, total = [], None
+
+        with connection.cursor() as cursor:
+            cursor.execute(query, params)
+            for row in cursor.fetchall():
+                rows.append({
+                    'tag': row[0],
+                    'tag__name': row[1],
+                    'sum': Decimal(row[2]).quantize(places),
+                    'count': int(row[3]),
+                })
+                if window:
+                    total = Decimal(row[4]).quantize(places)
+
+        if rows and not window:
+            total = sum(data['sum'] for data in rows)
+
+        return rows, total
+
+    def move_to_untagged(self, tag):
+        """
+        Merge the rollups of the tag given into the untagged ones, as its
+        bank transactions are going to be untagged.
+        """
+        rows = self.filter(tag=tag).values_list(
+            'bankaccount', 'month', 'sign', 'reconciled', 'sum', 'count',
+        )
+        for bankaccount_id, month, sign, reconciled, total, count in rows:
+            self.apply_deltas(bankaccount_id, {
+                (month, None, sign, reconciled): (total, count),
+            })
+        self.filter(tag=tag).delete()
+
+
+class BankTransactionRollup(models.Model):
+    """
+    Sum and count of active bank transactions per bank account, month, tag,
+    sign of amount and reconciled flag, so that statistics over whole months
+    don't need to scan bank transactions.
+    """
+
+    bankaccount = models.ForeignKey(
+        BankAccount,
+        related_name='rollups',
+        on_delete=models.CASCADE,
+    )
+    # First day of the month.
+    month = models.DateField()
+    tag = models.ForeignKey(
+        BankTransactionTag,
+        null=True,
+        on_delete=models.CASCADE,
+        related_name='rollups',
+    )
+    # -1 for debits, 1 for credits and 0 for null amounts.
+    sign = models.SmallIntegerField()
+    reconciled = models.BooleanField()
+    sum = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    objects = BankTransactionRollupManager()
+
+    class Meta:
+        db_table = 'banktransactions_rollups'
+        # Untagged rollups are unique too thanks to a partial index (see
+        # migrations), since NULL tags are distinct for this constraint.
+        unique_together = (
+            ('bankaccount', 'month', 'tag', 'sign', 'reconciled'),
+        )
+        # Internal data only maintained by bank transactions.
+        default_permissions = ()
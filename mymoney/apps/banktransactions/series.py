@@ -0,0 +1,107 @@
+import datetime
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from decimal import Decimal
+from itertools import accumulate, chain
+
+# Every day of a dates range, amounts are integers in cents.
+SeriesRange = namedtuple(
+    'SeriesRange', ['dates', 'deltas', 'counts', 'balances', 'opening'],
+)
+
+
+class DailySeries(object):
+    """
+    Whole history of a bank account summed up by day: the sum, the count and
+    the running balance (excluding the initial balance) of the days having at
+    least one bank transaction, sorted by date. Any range could then be
+    sliced without querying the database again.
+
+    Values are stored into arrays of integers (days as ordinals, amounts in
+    cents), so that ranges are filled and summed up without Python loops
+    over every day.
+    """
+
+    def __init__(self, rows, decimal_places=2):
+        """
+        Rows are tuples of (date, sum, count, running balance), sorted by
+        date.
+        """
+        self.decimal_places = decimal_places
+        self.ordinals, self.cents, self.counts, self.balance_cents = (
+            array('q'), array('q'), array('q'), array('q'),
+        )
+
+        for date_value, total, count, balance in rows:
+            self.ordinals.append(date_value.toordinal())
+            self.cents.append(self.to_cents(total))
+            self.counts.append(count)
+            self.balance_cents.append(self.to_cents(balance))
+
+    def __len__(self):
+        return len(self.ordinals)
+
+    def to_cents(self, value):
+        return int(Decimal(value).scaleb(self.decimal_places))
+
+    def to_decimal(self, cents):
+        return Decimal(cents).scaleb(-self.decimal_places)
+
+    @property
+    def dates(self):
+        return [datetime.date.fromordinal(ordinal) for ordinal in self.ordinals]
+
+    @property
+    def sums(self):
+        return [self.to_decimal(cents) for cents in self.cents]
+
+    @property
+    def balances(self):
+        return [self.to_decimal(cents) for cents in self.balance_cents]
+
+    @property
+    def first(self):
+        return datetime.date.fromordinal(self.ordinals[0]) if self else None
+
+    @property
+    def last(self):
+        return datetime.date.fromordinal(self.ordinals[-1]) if self else None
+
+    def get_balance_before(self, date_value):
+        """
+        Returns the running balance at the end of the last day before the
+        date given.
+        """
+        index = bisect_left(self.ordinals, date_value.toordinal())
+        return self.to_decimal(self.balance_cents[index - 1] if index else 0)
+
+    def get_range(self, date_start, date_end, opening=0):
+        """
+        Returns every day of the range given with its sum, its count and its
+        running balance, starting from the opening balance given (in cents)
+        plus the running balance before the range.
+        """
+        start, end = date_start.toordinal(), date_end.toordinal()
+        size = max(end - start + 1, 0)
+
+        deltas = array('q', [0]) * size
+        counts = array('q', [0]) * size
+
+        # Only days having bank transactions are set, others are still zero.
+        lower = bisect_left(self.ordinals, start)
+        upper = bisect_right(self.ordinals, end)
+        for i in range(lower, upper):
+            deltas[self.ordinals[i] - start] = self.cents[i]
+            counts[self.ordinals[i] - start] = self.counts[i]
+
+        if lower:
+            opening += self.balance_cents[lower - 1]
+
+        return SeriesRange(
+            dates=list(map(datetime.date.fromordinal, range(start, start + size))),
+            deltas=deltas,
+            counts=counts,
+            balances=array('q', accumulate(chain((opening,), deltas)))[1:],
+            opening=opening,
+        )
@@ -0,0 +1,28 @@
+from django.db import models
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+
+from mymoney.apps.bankaccounts.models import BankAccount
+from mymoney.apps.banktransactiontags.models import BankTransactionTag
+
+from ..models import BankTransactionRollup
+
+
+@receiver(pre_delete, sender=BankTransactionTag)
+def untag_rollups(sender, instance, **kwargs):
+    """
+    Bank transactions of a tag deleted are untagged, so do their rollups.
+    """
+    BankTransactionRollup.objects.move_to_untagged(instance)
+
+
+@receiver(pre_delete, sender=BankTransactionTag)
+@receiver(post_save, sender=BankTransactionTag)
+def bump_data_versions(sender, instance, created=False, **kwargs):
+    """
+    Analytics cached for bank accounts using the tag display its name.
+    """
+    if not created:
+        BankAccount.objects.filter(banktransactions__tag=instance).update(
+            data_version=models.F('data_version') + 1,
+        )
@@ -0,0 +1,219 @@
+import csv
+import re
+import time
+from collections import namedtuple
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from mymoney.apps.banktransactiontags.models import BankTransactionTagRule
+
+from .models import (
+    BankAccountDailyBalance, BankTransaction, BankTransactionRollup,
+)
+
+FORMAT_CSV = 'csv'
+FORMAT_OFX = 'ofx'
+
+# Fields which could be imported, the first ones are required.
+REQUIRED_FIELDS = ('date', 'label', 'amount')
+OPTIONAL_FIELDS = ('status', 'reconciled', 'payment_method', 'memo')
+
+OFX_TAG_RE = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+OFX_PAYMENT_METHODS = {
+    'ATM': BankTransaction.PAYMENT_METHOD_CASH,
+    'CASH': BankTransaction.PAYMENT_METHOD_CASH,
+    'CHECK': BankTransaction.PAYMENT_METHOD_CHECK,
+    'POS': BankTransaction.PAYMENT_METHOD_CREDIT_CARD,
+    'XFER': BankTransaction.PAYMENT_METHOD_TRANSFER,
+}
+
+StatementImportResult = namedtuple(
+    'StatementImportResult',
+    'imported rejected rejections duplicates duration',
+)
+
+
+class UnknownFormat(Exception):
+    pass
+
+
+def parse_csv(lines, delimiter=','):
+    """
+    Yield the line number and raw values of each row of a CSV statement,
+    which must start with a header naming its columns (i.e: date, label,
+    amount). Dates are expected in ISO 8601 format.
+    """
+    reader = csv.DictReader(lines, delimiter=delimiter)
+    for row in reader:
+        yield reader.line_num, {
+            key.strip().lower(): value.strip()
+            for key, value in row.items() if key and value is not None
+        }
+
+
+def parse_ofx(lines):
+    """
+    Yield the number and raw values of each bank transaction (STMTTRN) of an
+    OFX statement, either SGML (1.x) or XML (2.x).
+    """
+    number, row = 0, None
+
+    for closing, tag, value in iter_ofx_tags(lines):
+        if tag == 'STMTTRN':
+            if not closing:
+                number, row = number + 1, {}
+            elif row is not None:
+                yield number, get_ofx_values(row)
+                row = None
+        elif row is not None and not closing:
+            row[tag] = value
+
+
+def iter_ofx_tags(lines):
+    buffer = ''
+    for line in lines:
+        buffer += line
+
+        # The last tag may be continued on the next line.
+        last = buffer.rfind('<')
+        if last <= 0:
+            continue
+
+        for match in OFX_TAG_RE.finditer(buffer, 0, last):
+            yield match.group(1) == '/', match.group(2).upper(), match.group(3).strip()
+        buffer = buffer[last:]
+
+    for match in OFX_TAG_RE.finditer(buffer):
+        yield match.group(1) == '/', match.group(2).upper(), match.group(3).strip()
+
+
+def get_ofx_values(row):
+    values = {
+        'label': row.get('NAME') or row.get('MEMO', ''),
+        'amount': row.get('TRNAMT', '').replace(',', '.'),
+    }
+
+    date_posted = row.get('DTPOSTED', '')
+    if re.match(r'^\d{8}', date_posted):
+        values['date'] = '{}-{}-{}'.format(
+            date_posted[:4], date_posted[4:6], date_posted[6:8],
+        )
+    else:
+        values['date'] = date_posted
+
+    if row.get('NAME') and row.get('MEMO'):
+        values['memo'] = row['MEMO']
+    if row.get('TRNTYPE', '').upper() in OFX_PAYMENT_METHODS:
+        values['payment_method'] = OFX_PAYMENT_METHODS[row['TRNTYPE'].upper()]
+
+    return values
+
+
+def parse_statement(lines, statement_format, **kwargs):
+
+    if statement_format == FORMAT_CSV:
+        return parse_csv(lines, **kwargs)
+    elif statement_format == FORMAT_OFX:
+        return parse_ofx(lines)
+
+    raise UnknownFormat('Unknown statement format: %s' % statement_format)
+
+
+def build_banktransaction(bankaccount, values):
+    """
+    Returns an unsaved bank transaction from the raw values given, or raise
+    a ValidationError with errors of each field.
+    """
+    cleaned_data, errors = {}, {}
+
+    for name in REQUIRED_FIELDS + OPTIONAL_FIELDS:
+        value = values.get(name)
+        if name in OPTIONAL_FIELDS and value in (None, ''):
+            continue
+
+        try:
+            cleaned_data[name] = (
+                BankTransaction._meta.get_field(name).clean(value, None)
+            )
+        except ValidationError as e:
+            errors[name] = e.messages
+
+    if errors:
+        raise ValidationError(errors)
+
+    return BankTransaction(bankaccount=bankaccount, **cleaned_data)
+
+
+def import_statement(bankaccount, rows, chunk_size=500, max_rejections=100,
+                     skip_duplicates=False, dry_run=False):
+    """
+    Validate and insert bank transactions by chunks from the rows given,
+    which could be a generator to keep memory flat. Invalid rows are
+    rejected, but only the first ones are reported.
+
+    Bank transactions are tagged with the rules of the bank account owners.
+    Those which already exist are counted as duplicates, and only skipped if
+    required. A dry run previews the import without inserting anything.
+    """
+    imported, rejected, rejections, duplicates = 0, 0, [], 0
+    fingerprints = set()
+    matcher = BankTransactionTagRule.objects.get_matcher(
+        bankaccount.owners.all(),
+    )
+    start = time.time()
+    rows = iter(rows)
+
+    with transaction.atomic():
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+
+            objs = []
+            for number, values in chunk:
+                try:
+                    obj = build_banktransaction(bankaccount, values)
+                except ValidationError as e:
+                    rejected += 1
+                    if len(rejections) < max_rejections:
+                        rejections.append((number, e.message_dict))
+                else:
+                    obj.tag_id = matcher.match(
+                        obj.label, obj.amount, obj.payment_method,
+                    )
+                    objs.append(obj)
+
+            if skip_duplicates or dry_run:
+                # Only compare with the history, not with rows of previous
+                # chunks just inserted.
+                chunk_duplicates = {
+                    id(obj)
+                    for obj in BankTransaction.objects.find_duplicates(objs)
+                    if obj.fingerprint not in fingerprints
+                }
+                duplicates += len(chunk_duplicates)
+                if skip_duplicates:
+                    objs = [obj for obj in objs if id(obj) not in chunk_duplicates]
+                    fingerprints.update(obj.fingerprint for obj in objs)
+
+            if objs and not dry_run:
+                BankTransaction.objects.bulk_create_with_balance(
+                    objs,
+                    batch_size=chunk_size,
+                    update_aggregates=False,
+                )
+            imported += len(objs)
+
+        if imported and not dry_run:
+            BankAccountDailyBalance.objects.rebuild(
+                bankaccount, batch_size=chunk_size,
+            )
+            BankTransactionRollup.objects.rebuild(
+                bankaccount, batch_size=chunk_size,
+            )
+
+    return StatementImportResult(
+        imported, rejected, rejections, duplicates, time.time() - start,
+    )
@@ -0,0 +1,163 @@
+import datetime
+import os
+import tempfile
+import unittest
+from decimal import Decimal
+
+from django.core.management import CommandError, call_command
+from django.utils.six import StringIO
+
+from mymoney.apps.bankaccounts.factories import BankAccountFactory
+from mymoney.apps.bankaccounts.models import BankAccount
+from mymoney.apps.banktransactiontags.factories import (
+    BankTransactionTagFactory,
+)
+from mymoney.apps.banktransactiontags.models import BankTransactionTagRule
+from mymoney.core.factories import UserFactory
+
+from ..factories import BankTransactionFactory
+from ..models import BankAccountDailyBalance, BankTransactionRollup
+
+
+class CommandTestCase(unittest.TestCase):
+
+    def test_rebuild_daily_balances(self):
+
+        bankaccount = BankAccountFactory()
+        BankTransactionFactory(
+            bankaccount=bankaccount,
+            amount=Decimal('-10'),
+            date=datetime.date(2015, 6, 3),
+        )
+        BankTransactionFactory(
+            bankaccount=bankaccount,
+            amount=Decimal('15'),
+            date=datetime.date(2015, 6, 5),
+        )
+        BankAccountDailyBalance.objects.filter(bankaccount=bankaccount).delete()
+
+        out = StringIO()
+        call_command('rebuilddailybalances', bankaccount.pk, stdout=out)
+        self.assertIn('Daily balances have been rebuilt.', out.getvalue())
+
+        self.assertListEqual(
+            list(
+                BankAccountDailyBalance.objects
+                .filter(bankaccount=bankaccount)
+                .order_by('date')
+                .values_list('date', 'balance')
+            ),
+            [
+                (datetime.date(2015, 6, 3), Decimal('-10')),
+                (datetime.date(2015, 6, 5), Decimal('5')),
+            ],
+        )
+
+    def test_rebuild_rollups(self):
+
+        bankaccount = BankAccountFactory()
+        for day, amount in ((3, '-10'), (5, '-15'), (5, '20')):
+            BankTransactionFactory(
+                bankaccount=bankaccount,
+                amount=Decimal(amount),
+                date=datetime.date(2015, 6, day),
+            )
+        BankTransactionRollup.objects.filter(bankaccount=bankaccount).delete()
+
+        out = StringIO()
+        call_command('rebuildrollups', bankaccount.pk, stdout=out)
+        self.assertIn('Rollups have been rebuilt.', out.getvalue())
+
+        self.assertListEqual(
+            list(
+                BankTransactionRollup.objects
+                .filter(bankaccount=bankaccount)
+                .order_by('sign')
+                .values_list('month', 'sign', 'sum', 'count')
+            ),
+            [
+                (datetime.date(2015, 6, 1), -1, Decimal('-25'), 2),
+                (datetime.date(2015, 6, 1), 1, Decimal('20'), 1),
+            ],
+        )
+
+    def test_roll_forward_balances(self):
+
+        bankaccount = BankAccountFactory(balance=0)
+        BankTransactionFactory(
+            bankaccount=bankaccount,
+            amount=Decimal('-10'),
+            date=datetime.date.today() + datetime.timedelta(days=2),
+        )
+        BankTransactionFactory(
+            bankaccount=bankaccount,
+            amount=Decimal('15'),
+            date=datetime.date.today() - datetime.timedelta(days=2),
+        )
+        # Pretend the first one was in the future yesterday.
+        BankAccount.objects.filter(pk=bankaccount.pk).update(
+            future_delta=Decimal('25'),
+        )
+
+        out = StringIO()
+        call_command('rollforwardbalances', stdout=out)
+        self.assertIn('Future deltas have been rolled forward.', out.getvalue())
+
+        bankaccount.refresh_from_db()
+        self.assertEqual(bankaccount.future_delta, Decimal('-10'))
+        self.assertEqual(bankaccount.balance, Decimal('5'))
+
+    def test_import_statement(self):
+
+        bankaccount = BankAccountFactory(balance=0)
+
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write(
+                'date,label,amount\n'
+                '2015-06-03,Grocery,-15.59\n'
+                '2015-06-04,Foo,bar\n'
+            )
+        self.addCleanup(os.remove, f.name)
+
+        out, err = StringIO(), StringIO()
+        call_command('importstatement', bankaccount.pk, f.name, stdout=out, stderr=err)
+        self.assertIn('1 bank transactions imported in', out.getvalue())
+        self.assertIn('1 rejected, 0 duplicates.', out.getvalue())
+        self.assertIn('Row 3 rejected, amount:', err.getvalue())
+
+        bankaccount.refresh_from_db()
+        self.assertEqual(bankaccount.balance, Decimal('-15.59'))
+
+        out = StringIO()
+        call_command('importstatement', bankaccount.pk, f.name, dry_run=True,
+                     stdout=out, stderr=StringIO())
+        self.assertIn('1 bank transactions to import in', out.getvalue())
+        self.assertIn('1 duplicates.', out.getvalue())
+        bankaccount.refresh_from_db()
+        self.assertEqual(bankaccount.balance, Decimal('-15.59'))
+
+        with self.assertRaises(CommandError):
+            call_command('importstatement', bankaccount.pk, f.name, format='qif', stdout=out)
+
+        with self.assertRaises(CommandError):
+            call_command('importstatement', bankaccount.pk, f.name + '.foo', stdout=out)
+
+        with self.assertRaises(CommandError):
+            call_command('importstatement', 20120918, f.name, stdout=out)
+
+    def test_retag_bankaccounts(self):
+
+        owner = UserFactory(username='retag_command_owner')
+        bankaccount = BankAccountFactory(owners=[owner])
+        tag = BankTransactionTagFactory(owner=owner)
+        BankTransactionTagRule.objects.create(tag=tag, label_contains='foo')
+        banktransaction = BankTransactionFactory(bankaccount=bankaccount, label='foo')
+        BankTransactionFactory(bankaccount=bankaccount, label='bar')
+
+        out = StringIO()
+        call_command('retagbankaccounts', bankaccount.pk, stdout=out)
+        self.assertIn('1 bank transactions have been tagged.', out.getvalue())
+
+        banktransaction.refresh_from_db()
+        self.assertEqual(banktransaction.tag, tag)
+        owner.delete()
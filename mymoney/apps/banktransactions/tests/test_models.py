@@ -1,17 +1,26 @@
 import datetime
 import unittest
+from contextlib import contextmanager
 from decimal import Decimal
 from unittest.mock import patch
 
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
+
 from mymoney.apps.bankaccounts.factories import BankAccountFactory
 from mymoney.apps.bankaccounts.models import BankAccount
 from mymoney.apps.banktransactiontags.factories import (
     BankTransactionTagFactory,
 )
+from mymoney.apps.banktransactiontags.models import BankTransactionTagRule
+from mymoney.core.factories import UserFactory
 from mymoney.core.utils.dates import GRANULARITY_MONTH, GRANULARITY_WEEK
 
 from ..factories import BankTransactionFactory
-from ..models import BankTransaction
+from ..models import (
+    BALANCE_PREFIX, BALANCE_SUFFIX, BankAccountDailyBalance, BankTransaction,
+    BankTransactionRollup,
+)
 
 
 class ModelTestCase(unittest.TestCase):
@@ -118,16 +127,58 @@ class ModelTestCase(unittest.TestCase):
         bankaccount.refresh_from_db()
         self.assertEqual(bankaccount.balance, Decimal('250'))
 
+        # Disabling it cancels its amount.
         banktransaction.status = BankTransaction.STATUS_INACTIVE
         banktransaction.amount = Decimal('180')
         banktransaction.save()
         bankaccount.refresh_from_db()
-        self.assertEqual(bankaccount.balance, Decimal('250'))
+        self.assertEqual(bankaccount.balance, Decimal('100'))
+
+        # Then enabling it back applies the new amount.
+        banktransaction.status = BankTransaction.STATUS_ACTIVE
+        banktransaction.save()
+        bankaccount.refresh_from_db()
+        self.assertEqual(bankaccount.balance, Decimal('280'))
 
         # Then test with delete op.
+        banktransaction.status = BankTransaction.STATUS_INACTIVE
+        banktransaction.save()
         banktransaction.delete()
         bankaccount.refresh_from_db()
-        self.assertEqual(bankaccount.balance, Decimal('250'))
+        self.assertEqual(bankaccount.balance, Decimal('100'))
+
+    def test_update_without_fetching(self):
+
+        bankaccount = BankAccountFactory(balance=0)
+        banktransaction = BankTransactionFactory(
+            bankaccount=bankaccount,
+            amount='-10',
+        )
+        banktransaction = BankTransaction.objects.get(pk=banktransaction.pk)
+
+        banktransaction.amount = Decimal('-25')
+        with CaptureQueriesContext(connection) as context:
+            banktransaction.save()
+        self.assertFalse([
+            query for query in context.captured_queries
+            if query['sql'].startswith('SELECT') and
+            'FROM "banktransactions" ' in query['sql']
+        ])
+        self.assertEqual(banktransaction.bankaccount.balance, Decimal('-25'))
+
+        # Loaded values are kept up-to-date for the next save.
+        banktransaction.amount = Decimal('-5')
+        banktransaction.save()
+        self.assertEqual(banktransaction.bankaccount.balance, Decimal('-5'))
+
+        # Or fetched again for strict consistency.
+        BankTransaction.objects.filter(pk=banktransaction.pk).update(amount=-15)
+        banktransaction.amount = Decimal('-20')
+        banktransaction.save(select_for_update=True)
+        self.assertEqual(banktransaction.bankaccount.balance, Decimal('-10'))
+
+        banktransaction.delete(select_for_update=True)
+        self.assertEqual(banktransaction.bankaccount.balance, Decimal('10'))
 
     def test_force_currency(self):
 
@@ -333,6 +384,1084 @@ class ManagerTestCase(unittest.TestCase):
                 bt1.amount + bt2.amount,
             )
 
+    def test_find_duplicates(self):
+
+        bankaccount = BankAccountFactory()
+        BankTransactionFactory(
+            bankaccount=bankaccount,
+            label='Café  de la gare',
+            amount=Decimal('-3.5'),
+            date=datetime.date(2015, 6, 3),
+        )
+
+        candidates = [
+            BankTransaction(
+                bankaccount=bankaccount,
+                label='CAFE DE LA GARE.',
+                amount=Decimal('-3.50'),
+                date=datetime.date(2015, 6, 3),
+            ),
+            BankTransaction(
+                bankaccount=bankaccount,
+                label='Cafe de la gare',
+                amount=Decimal('-3.50'),
+                date=datetime.date(2015, 6, 4),
+            ),
+            BankTransaction(
+                bankaccount=BankAccountFactory(),
+                label='Cafe de la gare',
+                amount=Decimal('-3.50'),
+                date=datetime.date(2015, 6, 3),
+            ),
+        ]
+        self.assertListEqual(
+            BankTransaction.objects.find_duplicates(candidates),
+            candidates[:1],
+        )
+
+        with patch.object(connection.ops, 'bulk_batch_size', return_value=1):
+            self.assertListEqual(
+                BankTransaction.objects.find_duplicates(candidates),
+                candidates[:1],
+            )
+
+    def test_find_duplicates_bankaccount(self):
+
+        bankaccount = BankAccountFactory()
+        candidate = BankTransaction(
+            bankaccount=bankaccount,
+            label='Cafe de la gare',
+            amount=Decimal('-3.50'),
+            date=datetime.date(2015, 6, 3),
+        )
+        candidate.set_fingerprint()
+
+        # Same fingerprint, but not the same bank account.
+        banktransaction = BankTransactionFactory(bankaccount=BankAccountFactory())
+        BankTransaction.objects.filter(pk=banktransaction.pk).update(
+            fingerprint=candidate.fingerprint,
+        )
+        self.assertListEqual(
+            BankTransaction.objects.find_duplicates([candidate]), [],
+        )
+
+        BankTransaction.objects.filter(pk=banktransaction.pk).update(
+            bankaccount=bankaccount,
+        )
+        self.assertListEqual(
+            BankTransaction.objects.find_duplicates([candidate]), [candidate],
+        )
+
+    def test_retag(self):
+
+        owner = UserFactory(username='retag_owner')
+        bankaccount = BankAccountFactory(owners=[owner])
+        tags = [
+            BankTransactionTagFactory(owner=owner),
+            BankTransactionTagFactory(owner=owner),
+        ]
+        BankTransactionTagRule.objects.create(tag=tags[0], label_contains='market')
+        BankTransactionTagRule.objects.create(
+            tag=tags[1], label_regex=r'^train', amount_max=Decimal('0'),
+        )
+
+        bt1 = BankTransactionFactory(bankaccount=bankaccount, label='Super Market')
+        bt2 = BankTransactionFactory(
+            bankaccount=bankaccount, label='Train ticket', amount=Decimal('-30'),
+        )
+        bt3 = BankTransactionFactory(
+            bankaccount=bankaccount, label='Train refund', amount=Decimal('30'),
+        )
+        bt4 = BankTransactionFactory(
+            bankaccount=bankaccount, label='Market', tag=tags[1],
+        )
+
+        with patch.object(connection.ops, 'bulk_batch_size', return_value=1):
+            self.assertEqual(BankTransaction.objects.retag(bankaccount), 2)
+
+        def get_tags():
+            return [
+                BankTransaction.objects.get(pk=bt.pk).tag_id
+                for bt in (bt1, bt2, bt3, bt4)
+            ]
+        self.assertListEqual(get_tags(), [tags[0].pk, tags[1].pk, None, tags[1].pk])
+
+        self.assertEqual(BankTransaction.objects.retag(bankaccount, overwrite=True), 1)
+        self.assertListEqual(get_tags(), [tags[0].pk, tags[1].pk, None, tags[0].pk])
+
+        owner.delete()
+
+    def test_running_balances(self):
+
+        bankaccount = BankAccountFactory(balance=0, balance_initial=0)
+
+        bt1 = BankTransactionFactory(
+            bankaccount=bankaccount,
+            amount=Decimal('-15.59'),
+            date=datetime.date(2015, 6, 3),
+        )
+        bt2 = BankTransactionFactory(
+            bankaccount=bankaccount,
+            amount=Decimal('-4.41'),
+            reconciled=True,
+            date=datetime.date(2015, 6, 3),
+        )
+        bt3 = BankTransactionFactory(
+            bankaccount=bankaccount,
+            amount=Decimal('1000'),
+            status=BankTransaction.STATUS_INACTIVE,
+            reconciled=True,
+            date=datetime.date(2015, 6, 4),
+        )
+        bt4 = BankTransactionFactory(
+            bankaccount=bankaccount,
+            amount=Decimal('6.59'),
+            reconciled=True,
+            date=datetime.date(2015, 6, 4),
+        )
+        # Another bank account.
+        BankTransactionFactory(
+            amount=Decimal('-10000'),
+            date=datetime.date(2015, 6, 3),
+        )
+
+        expected = {
+            bt1.pk: (Decimal('-15.59'), None),
+            bt2.pk: (Decimal('-20'), Decimal('-4.41')),
+            bt3.pk: (Decimal('-20'), Decimal('-4.41')),
+            bt4.pk: (Decimal('-13.41'), Decimal('2.18')),
+        }
+        banktransactions = [bt1, bt2, bt3, bt4]
+
+        self.assertDictEqual(
+            BankTransaction.objects.get_running_balances(
+                bankaccount, banktransactions,
+            ),
+            expected,
+        )
+        with patch('mymoney.apps.banktransactions.models.supports_window_functions',
+                   return_value=False):
+            self.assertDictEqual(
+                BankTransaction.objects.get_running_balances(
+                    bankaccount, banktransactions,
+                ),
+                expected,
+            )
+
+        # Deduced backward from the current balance, same results.
+        bankaccount.refresh_from_db()
+        self.assertDictEqual(
+            BankTransaction.objects.get_running_balances(
+                bankaccount, banktransactions, direction=BALANCE_SUFFIX,
+            ),
+            expected,
+        )
+        self.assertDictEqual(
+            BankTransaction.objects.get_running_balances(
+                bankaccount, [bt1, bt4], direction=BALANCE_SUFFIX,
+            ),
+            {bt1.pk: expected[bt1.pk], bt4.pk: expected[bt4.pk]},
+        )
+        with patch('mymoney.apps.banktransactions.models.supports_window_functions',
+                   return_value=False):
+            self.assertDictEqual(
+                BankTransaction.objects.get_running_balances(
+                    bankaccount, banktransactions, direction=BALANCE_SUFFIX,
+                ),
+                expected,
+            )
+            self.assertDictEqual(
+                BankTransaction.objects.get_running_balances(
+                    bankaccount, [bt3, bt4], direction=BALANCE_SUFFIX,
+                ),
+                {bt3.pk: expected[bt3.pk], bt4.pk: expected[bt4.pk]},
+            )
+
+        # Only rows fetched are computed, no matter the filters applied.
+        qs = (
+            BankTransaction.objects
+            .filter(bankaccount=bankaccount, reconciled=True)
+            .order_by('date', 'id')
+            .with_balances(bankaccount)
+        )
+        self.assertListEqual(
+            [(bt.total_balance, bt.reconciled_balance) for bt in qs],
+            [expected[bt2.pk], expected[bt3.pk], expected[bt4.pk]],
+        )
+
+        bankaccount.balance_initial = Decimal('150')
+        bankaccount.save()
+        self.assertDictEqual(
+            BankTransaction.objects.get_running_balances(bankaccount, [bt1]),
+            {bt1.pk: (Decimal('134.41'), None)},
+        )
+        # Opening balances of previous days are read from daily balances.
+        self.assertDictEqual(
+            BankTransaction.objects.get_running_balances(bankaccount, [bt4]),
+            {bt4.pk: (Decimal('136.59'), Decimal('152.18'))},
+        )
+
+    def test_running_balances_unreconciled(self):
+
+        bankaccount = BankAccountFactory(balance=0, balance_initial=Decimal('100'))
+        bt1 = BankTransactionFactory(
+            bankaccount=bankaccount,
+            amount=Decimal('-10'),
+            date=datetime.date(2015, 6, 3),
+        )
+        bt2 = BankTransactionFactory(
+            bankaccount=bankaccount,
+            amount=Decimal('-5'),
+            date=datetime.date(2015, 6, 4),
+        )
+        bankaccount.refresh_from_db()
+
+        # Nothing reconciled before the opening day, in both directions.
+        for direction in (BALANCE_PREFIX, BALANCE_SUFFIX):
+            self.assertDictEqual(
+                BankTransaction.objects.get_running_balances(
+                    bankaccount, [bt2], direction=direction,
+                ),
+                {bt2.pk: (Decimal('85'), None)},
+            )
+
+        # Reconciled amounts compensating each other are still reconciled.
+        for amount in ('20', '-20'):
+            BankTransactionFactory(
+                bankaccount=bankaccount,
+                amount=Decimal(amount),
+                reconciled=True,
+                date=datetime.date(2015, 6, 3),
+            )
+        bankaccount.refresh_from_db()
+        for direction in (BALANCE_PREFIX, BALANCE_SUFFIX):
+            self.assertDictEqual(
+                BankTransaction.objects.get_running_balances(
+                    bankaccount, [bt1, bt2], direction=direction,
+                ),
+                {
+                    bt1.pk: (Decimal('90'), None),
+                    bt2.pk: (Decimal('85'), Decimal('100')),
+                },
+            )
+
+
+class BankAccountBalancesTestCase(unittest.TestCase):
+
+    def assertBalances(self, bankaccount, balance, reconciled, future):
+        bankaccount.refresh_from_db()
+        self.assertEqual(bankaccount.balance, balance)
+        self.assertEqual(bankaccount.reconciled_balance, reconciled)
+        self.assertEqual(bankaccount.future_delta, future)
+
+    def test_save_delete(self):
+
+        bankaccount = BankAccountFactory(balance=0, balance_initial=Decimal('100'))
+        self.assertBalances(bankaccount, 100, 100, 0)
+
+        bt1 = BankTransactionFactory(
+            bankaccount=bankaccount,
+            amount=Decimal('-10'),
+            reconciled=True,
+            date=datetime.date.today() - datetime.timedelta(days=5),
+        )
+        bt2 = BankTransactionFactory(
+            bankaccount=bankaccount,
+            amount=Decimal('25'),
+            date=datetime.date.today() + datetime.timedelta(days=5),
+        )
+        self.assertBalances(bankaccount, 115, 90, 25)
+
+        bt2.reconciled = True
+        bt2.date = datetime.date.today()
+        bt2.save()
+        self.assertBalances(bankaccount, 115, 115, 0)
+
+        bt1.amount = Decimal('-20')
+        bt1.date = datetime.date.today() + datetime.timedelta(days=1)
+        bt1.save()
+        self.assertBalances(bankaccount, 105, 105, -20)
+
+        bt1.delete()
+        self.assertBalances(bankaccount, 125, 125, 0)
+
+        BankTransaction.objects.update_reconciled([bt2.pk], False)
+        self.assertBalances(bankaccount, 125, 100, 0)
+
+        self.assertEqual(
+            BankTransaction.objects.get_current_balance(bankaccount), 125,
+        )
+        self.assertEqual(
+            BankTransaction.objects.get_reconciled_balance(bankaccount), 100,
+        )
+
+    def test_bulk_delete(self):
+
+        bankaccount1 = BankAccountFactory(balance=0)
+        bankaccount2 = BankAccountFactory(balance=0)
+
+        bt1 = BankTransactionFactory(
+            bankaccount=bankaccount1,
+            amount=Decimal('-10'),
+            reconciled=True,
+            date=datetime.date(2015, 6, 3),
+        )
+        bt2 = BankTransactionFactory(
+            bankaccount=bankaccount1,
+            amount=Decimal('25'),
+            status=BankTransaction.STATUS_IGNORED,
+            date=datetime.date.today() + datetime.timedelta(days=5),
+        )
+        bt3 = BankTransactionFactory(
+            bankaccount=bankaccount1,
+            amount=Decimal('1000'),
+            status=BankTransaction.STATUS_INACTIVE,
+            date=datetime.date(2015, 6, 3),
+        )
+        BankTransactionFactory(
+            bankaccount=bankaccount1,
+            amount=Decimal('5'),
+            reconciled=True,
+            date=datetime.date(2015, 6, 5),
+        )
+        bt5 = BankTransactionFactory(
+            bankaccount=bankaccount2,
+            amount=Decimal('-7.5'),
+            date=datetime.date(2015, 6, 4),
+        )
+        self.assertBalances(bankaccount1, 20, -5, 25)
+        self.assertBalances(bankaccount2, Decimal('-7.5'), 0, 0)
+
+        count = BankTransaction.objects.bulk_delete_with_balance(
+            [bt1.pk, bt2.pk, bt3.pk, bt5.pk],
+        )
+        self.assertEqual(count, 4)
+        self.assertEqual(
+            BankTransaction.objects.filter(bankaccount=bankaccount1).count(), 1,
+        )
+        self.assertBalances(bankaccount1, 5, 5, 0)
+        self.assertBalances(bankaccount2, 0, 0, 0)
+
+        self.assertListEqual(
+            list(
+                BankAccountDailyBalance.objects
+                .filter(bankaccount=bankaccount1)
+                .order_by('date')
+                .values_list('date', 'balance', 'reconciled_balance')
+            ),
+            [
+                (datetime.date(2015, 6, 3), 0, 0),
+                (datetime.date(2015, 6, 5), 5, 5),
+                (bt2.date, 5, 5),
+            ],
+        )
+
+    def test_bulk_create(self):
+
+        bankaccount1 = BankAccountFactory(balance=10, currency='EUR')
+        bankaccount2 = BankAccountFactory(balance=0, currency='USD')
+
+        objs = BankTransaction.objects.bulk_create_with_balance([
+            BankTransaction(
+                bankaccount=bankaccount1,
+                label='foo',
+                amount=Decimal('-10'),
+                reconciled=True,
+                date=datetime.date(2015, 6, 3),
+            ),
+            BankTransaction(
+                bankaccount=bankaccount1,
+                label='bar',
+                amount=Decimal('25'),
+                date=datetime.date.today() + datetime.timedelta(days=5),
+            ),
+            BankTransaction(
+                bankaccount=bankaccount1,
+                label='baz',
+                amount=Decimal('1000'),
+                status=BankTransaction.STATUS_INACTIVE,
+                date=datetime.date(2015, 6, 3),
+            ),
+            BankTransaction(
+                bankaccount=bankaccount2,
+                label='qux',
+                amount=Decimal('-7.5'),
+                date=datetime.date(2015, 6, 4),
+            ),
+        ], batch_size=2)
+        self.assertEqual(len(objs), 4)
+
+        self.assertEqual(bankaccount1.balance, 25)
+        self.assertBalances(bankaccount1, 25, -10, 25)
+        self.assertBalances(bankaccount2, Decimal('-7.5'), 0, 0)
+        self.assertListEqual(
+            list(
+                BankTransaction.objects
+                .filter(bankaccount=bankaccount2)
+                .values_list('currency', flat=True)
+            ),
+            ['USD'],
+        )
+        self.assertListEqual(
+            list(
+                BankAccountDailyBalance.objects
+                .filter(bankaccount=bankaccount1)
+                .order_by('date')
+                .values_list('date', 'balance', 'reconciled_balance')
+            ),
+            [
+                (datetime.date(2015, 6, 3), -10, -10),
+                (objs[1].date, 15, -10),
+            ],
+        )
+
+
+class DataVersionTestCase(unittest.TestCase):
+
+    @contextmanager
+    def assertBumps(self, bankaccount):
+        qs = BankAccount.objects.filter(pk=bankaccount.pk).values_list('data_version')
+        version = qs.get()[0]
+        yield
+        self.assertGreater(qs.get()[0], version)
+
+    def test_write_paths(self):
+        owner = UserFactory()
+        bankaccount = BankAccountFactory(owners=[owner])
+        tag = BankTransactionTagFactory(owner=owner)
+
+        with self.assertBumps(bankaccount):
+            bt = BankTransactionFactory(bankaccount=bankaccount)
+
+        # Even if balances don't change.
+        with self.assertBumps(bankaccount):
+            bt.label = 'foo'
+            bt.save()
+
+        with self.assertBumps(bankaccount):
+            BankTransaction.objects.update_reconciled([bt.pk], True)
+
+        with self.assertBumps(bankaccount):
+            BankTransactionTagRule.objects.create(tag=tag, label_contains='foo')
+            BankTransaction.objects.retag(bankaccount)
+
+        with self.assertBumps(bankaccount):
+            tag.name = 'bar'
+            tag.save()
+
+        with self.assertBumps(bankaccount):
+            tag.delete()
+
+        with self.assertBumps(bankaccount):
+            BankAccountDailyBalance.objects.rebuild(bankaccount)
+
+        with self.assertBumps(bankaccount):
+            BankTransactionRollup.objects.rebuild(bankaccount)
+
+        with self.assertBumps(bankaccount):
+            bt.delete()
+
+        with self.assertBumps(bankaccount):
+            BankTransaction.objects.bulk_create_with_balance([
+                BankTransaction(bankaccount=bankaccount, label='foo', amount=Decimal('5')),
+            ])
+
+        with self.assertBumps(bankaccount):
+            BankTransaction.objects.bulk_delete_with_balance(
+                BankTransaction.objects.filter(bankaccount=bankaccount)
+                .values_list('pk', flat=True)
+            )
+
+
+class DailyBalanceTestCase(unittest.TestCase):
+
+    def get_daily_balances(self, bankaccount):
+        return list(
+            BankAccountDailyBalance.objects
+            .filter(bankaccount=bankaccount)
+            .order_by('date')
+            .values_list('date', *BankAccountDailyBalance.BALANCE_FIELDS)
+        )
+
+    def test_save_delete(self):
+
+        bankaccount = BankAccountFactory(balance=0)
+
+        bt1 = BankTransactionFactory(
+            bankaccount=bankaccount,
+            amount=Decimal('-10'),
+            date=datetime.date(2015, 6, 3),
+        )
+        bt2 = BankTransactionFactory(
+            bankaccount=bankaccount,
+            amount=Decimal('25'),
+            reconciled=True,
+            date=datetime.date(2015, 6, 5),
+        )
+        bt3 = BankTransactionFactory(
+            bankaccount=bankaccount,
+            amount=Decimal('5'),
+            status=BankTransaction.STATUS_IGNORED,
+            date=datetime.date(2015, 6, 5),
+        )
+        # Inactive doesn't count.
+        BankTransactionFactory(
+            bankaccount=bankaccount,
+            amount=Decimal('1000'),
+            status=BankTransaction.STATUS_INACTIVE,
+            date=datetime.date(2015, 6, 1),
+        )
+        self.assertListEqual(self.get_daily_balances(bankaccount), [
+            (datetime.date(2015, 6, 3), -10, 0, -10, 0),
+            (datetime.date(2015, 6, 5), 20, 25, 15, 25),
+        ])
+
+        # Move it before, then the new day opened should be shifted too.
+        bt2.date = datetime.date(2015, 6, 4)
+        bt2.save()
+        self.assertListEqual(self.get_daily_balances(bankaccount), [
+            (datetime.date(2015, 6, 3), -10, 0, -10, 0),
+            (datetime.date(2015, 6, 4), 15, 25, 15, 25),
+            (datetime.date(2015, 6, 5), 20, 25, 15, 25),
+        ])
+
+        bt1.amount = Decimal('-20')
+        bt1.reconciled = True
+        bt1.save()
+        self.assertListEqual(self.get_daily_balances(bankaccount), [
+            (datetime.date(2015, 6, 3), -20, -20, -20, -20),
+            (datetime.date(2015, 6, 4), 5, 5, 5, 5),
+            (datetime.date(2015, 6, 5), 10, 5, 5, 5),
+        ])
+
+        bt3.status = BankTransaction.STATUS_INACTIVE
+        bt3.save()
+        bt1.delete()
+        self.assertListEqual(self.get_daily_balances(bankaccount), [
+            (datetime.date(2015, 6, 3), 0, 0, 0, 0),
+            (datetime.date(2015, 6, 4), 25, 25, 25, 25),
+            (datetime.date(2015, 6, 5), 25, 25, 25, 25),
+        ])
+
+        self.assertDictEqual(
+            BankAccountDailyBalance.objects.get_balances_before(
+                bankaccount, datetime.date(2015, 6, 5),
+            ),
+            {
+                'balance': 25,
+                'reconciled_balance': 25,
+                'active_balance': 25,
+                'active_reconciled_balance': 25,
+            },
+        )
+        self.assertIsNone(
+            BankAccountDailyBalance.objects.get_balances_before(
+                bankaccount, datetime.date(2015, 6, 3),
+            ),
+        )
+
+    def test_update_reconciled(self):
+
+        bankaccount = BankAccountFactory(balance=0)
+
+        bt1 = BankTransactionFactory(
+            bankaccount=bankaccount,
+            amount=Decimal('-10'),
+            date=datetime.date(2015, 6, 3),
+        )
+        bt2 = BankTransactionFactory(
+            bankaccount=bankaccount,
+            amount=Decimal('25'),
+            reconciled=True,
+            date=datetime.date(2015, 6, 5),
+        )
+
+        BankTransaction.objects.update_reconciled([bt1.pk, bt2.pk], True)
+        self.assertListEqual(self.get_daily_balances(bankaccount), [
+            (datetime.date(2015, 6, 3), -10, -10, -10, -10),
+            (datetime.date(2015, 6, 5), 15, 15, 15, 15),
+        ])
+
+        BankTransaction.objects.update_reconciled([bt2.pk], False)
+        self.assertListEqual(self.get_daily_balances(bankaccount), [
+            (datetime.date(2015, 6, 3), -10, -10, -10, -10),
+            (datetime.date(2015, 6, 5), 15, -10, 15, -10),
+        ])
+        bt2.refresh_from_db()
+        self.assertFalse(bt2.reconciled)
+
+    def test_bulk_constant_queries(self):
+
+        def run(days):
+            bankaccount = BankAccountFactory(balance=0)
+            pks = [
+                BankTransactionFactory(
+                    bankaccount=bankaccount,
+                    amount=Decimal(day),
+                    reconciled=bool(day % 2),
+                    status=(BankTransaction.STATUS_IGNORED if day % 4
+                            else BankTransaction.STATUS_ACTIVE),
+                    date=datetime.date(2015, 6, day),
+                ).pk
+                for day in range(1, days + 1)
+            ]
+            BankTransactionFactory(
+                bankaccount=bankaccount,
+                amount=Decimal('100'),
+                date=datetime.date(2015, 7, 1),
+            )
+
+            with CaptureQueriesContext(connection) as reconciled:
+                BankTransaction.objects.update_reconciled(pks[1:], True)
+            with CaptureQueriesContext(connection) as deleted:
+                BankTransaction.objects.bulk_delete_with_balance(pks[::2])
+
+            # Same daily balances as if they were rebuilt from scratch, except
+            # for days left without bank transaction.
+            balances = self.get_daily_balances(bankaccount)
+            BankAccountDailyBalance.objects.rebuild(bankaccount)
+            rebuilt = self.get_daily_balances(bankaccount)
+            dates = {row[0] for row in rebuilt}
+            self.assertListEqual([row for row in balances if row[0] in dates], rebuilt)
+            return len(reconciled), len(deleted)
+
+        # Rollups keys are the same, only the number of days differs.
+        self.assertEqual(run(4), run(20))
+
+    def test_bulk_create(self):
+
+        def run(days):
+            bankaccount = BankAccountFactory(balance=0)
+            for day in (2, 10, 25):
+                BankTransactionFactory(
+                    bankaccount=bankaccount,
+                    amount=Decimal(day),
+                    date=datetime.date(2015, 6, day),
+                )
+
+            with CaptureQueriesContext(connection) as context:
+                BankTransaction.objects.bulk_create_with_balance([
+                    BankTransaction(
+                        bankaccount=bankaccount,
+                        label='foo',
+                        amount=Decimal('-1.5'),
+                        reconciled=bool(day % 2),
+                        status=(BankTransaction.STATUS_IGNORED if day % 4
+                                else BankTransaction.STATUS_ACTIVE),
+                        date=datetime.date(2015, 6, day),
+                    )
+                    for day in range(4, 4 + days)
+                ])
+
+            balances = self.get_daily_balances(bankaccount)
+            BankAccountDailyBalance.objects.rebuild(bankaccount)
+            self.assertListEqual(balances, self.get_daily_balances(bankaccount))
+            return len(context)
+
+        self.assertEqual(run(4), run(20))
+
+    def test_rebuild(self):
+
+        bankaccount = BankAccountFactory(balance=0)
+
+        for day, amount, status, reconciled in (
+                (3, '-10', BankTransaction.STATUS_ACTIVE, False),
+                (3, '7.5', BankTransaction.STATUS_IGNORED, True),
+                (5, '25', BankTransaction.STATUS_ACTIVE, True),
+                (8, '-100', BankTransaction.STATUS_INACTIVE, True)):
+            BankTransactionFactory(
+                bankaccount=bankaccount,
+                amount=Decimal(amount),
+                status=status,
+                reconciled=reconciled,
+                date=datetime.date(2015, 6, day),
+            )
+
+        expected = self.get_daily_balances(bankaccount)
+        BankAccountDailyBalance.objects.filter(bankaccount=bankaccount).update(balance=0)
+
+        BankAccountDailyBalance.objects.rebuild(bankaccount)
+        self.assertListEqual(self.get_daily_balances(bankaccount), expected)
+
+
+class DailySeriesTestCase(unittest.TestCase):
+
+    def get_series(self, series):
+        return list(zip(series.dates, series.sums, series.counts, series.balances))
+
+    def test_series(self):
+
+        bankaccount = BankAccountFactory(balance=0)
+
+        for day, amount, status, reconciled in (
+                (3, '-10', BankTransaction.STATUS_ACTIVE, False),
+                (3, '7.5', BankTransaction.STATUS_ACTIVE, True),
+                (3, '2', BankTransaction.STATUS_IGNORED, True),
+                (5, '25', BankTransaction.STATUS_ACTIVE, True),
+                (8, '-100', BankTransaction.STATUS_INACTIVE, True)):
+            BankTransactionFactory(
+                bankaccount=bankaccount,
+                amount=Decimal(amount),
+                status=status,
+                reconciled=reconciled,
+                date=datetime.date(2015, 6, day),
+            )
+
+        expected = [
+            (datetime.date(2015, 6, 3), Decimal('-2.50'), 2, Decimal('-2.50')),
+            (datetime.date(2015, 6, 5), Decimal('25.00'), 1, Decimal('22.50')),
+        ]
+        expected_reconciled = [
+            (datetime.date(2015, 6, 3), Decimal('7.50'), 1, Decimal('7.50')),
+            (datetime.date(2015, 6, 5), Decimal('25.00'), 1, Decimal('32.50')),
+        ]
+
+        series = BankTransaction.objects.get_daily_series(bankaccount)
+        self.assertListEqual(self.get_series(series), expected)
+        self.assertListEqual(
+            self.get_series(BankTransaction.objects.get_daily_series(
+                bankaccount, reconciled=True,
+            )),
+            expected_reconciled,
+        )
+        with patch('mymoney.apps.banktransactions.models.supports_window_functions',
+                   return_value=False):
+            BankAccount.objects.bump_data_version(bankaccount.pk)
+            bankaccount.refresh_from_db()
+            self.assertListEqual(
+                self.get_series(BankTransaction.objects.get_daily_series(bankaccount)),
+                expected,
+            )
+            self.assertListEqual(
+                self.get_series(BankTransaction.objects.get_daily_series(
+                    bankaccount, reconciled=True,
+                )),
+                expected_reconciled,
+            )
+
+        self.assertEqual(series.first, datetime.date(2015, 6, 3))
+        self.assertEqual(series.last, datetime.date(2015, 6, 5))
+        self.assertEqual(series.get_balance_before(datetime.date(2015, 6, 3)), 0)
+        self.assertEqual(
+            series.get_balance_before(datetime.date(2015, 6, 5)),
+            Decimal('-2.50'),
+        )
+        self.assertEqual(
+            series.get_balance_before(datetime.date(2015, 7, 1)),
+            Decimal('22.50'),
+        )
+
+        # Every day of the range is filled, amounts are in cents.
+        days = series.get_range(
+            datetime.date(2015, 6, 4), datetime.date(2015, 6, 6), opening=1000,
+        )
+        self.assertListEqual(days.dates, [
+            datetime.date(2015, 6, 4),
+            datetime.date(2015, 6, 5),
+            datetime.date(2015, 6, 6),
+        ])
+        self.assertListEqual(list(days.deltas), [0, 2500, 0])
+        self.assertListEqual(list(days.counts), [0, 1, 0])
+        self.assertListEqual(list(days.balances), [750, 3250, 3250])
+        self.assertEqual(days.opening, 750)
+
+        days = series.get_range(datetime.date(2015, 6, 1), datetime.date(2015, 6, 3))
+        self.assertListEqual(list(days.balances), [0, 0, -250])
+        self.assertEqual(days.opening, 0)
+
+    def test_cache(self):
+
+        bankaccount = BankAccountFactory(balance=0)
+        bt = BankTransactionFactory(
+            bankaccount=bankaccount,
+            amount=Decimal('-10'),
+            date=datetime.date(2015, 6, 3),
+        )
+
+        BankTransaction.objects.get_daily_series(bankaccount)
+        with CaptureQueriesContext(connection) as context:
+            series = BankTransaction.objects.get_daily_series(bankaccount)
+        self.assertEqual(len(context.captured_queries), 0)
+        self.assertListEqual(series.balances, [Decimal('-10')])
+
+        # Any change of its bank transactions clears it.
+        bt.date = datetime.date(2015, 6, 4)
+        bt.save()
+        series = BankTransaction.objects.get_daily_series(bankaccount)
+        self.assertListEqual(series.dates, [datetime.date(2015, 6, 4)])
+
+        # Bulk updates bump the data version of bank accounts, which must be
+        # fetched again.
+        BankTransaction.objects.update_reconciled([bt.pk], True)
+        bankaccount.refresh_from_db()
+        series = BankTransaction.objects.get_daily_series(bankaccount, reconciled=True)
+        self.assertListEqual(series.balances, [Decimal('-10')])
+
+        BankTransaction.objects.bulk_delete_with_balance([bt.pk])
+        bankaccount.refresh_from_db()
+        series = BankTransaction.objects.get_daily_series(bankaccount)
+        self.assertEqual(len(series), 0)
+
+        BankTransaction.objects.bulk_create_with_balance([
+            BankTransaction(
+                bankaccount=bankaccount,
+                label='foo',
+                amount=Decimal('5'),
+                date=datetime.date(2015, 6, 5),
+            ),
+        ])
+        series = BankTransaction.objects.get_daily_series(bankaccount)
+        self.assertListEqual(series.balances, [Decimal('5')])
+
+
+class RollupTestCase(unittest.TestCase):
+
+    def get_rollups(self, bankaccount):
+        return list(
+            BankTransactionRollup.objects
+            .filter(bankaccount=bankaccount, count__gt=0)
+            .order_by('month', 'tag', 'sign', 'reconciled')
+            .values_list('month', 'tag', 'sign', 'reconciled', 'sum', 'count')
+        )
+
+    def assertRebuiltEqual(self, bankaccount):
+        expected = self.get_rollups(bankaccount)
+        BankTransactionRollup.objects.rebuild(bankaccount)
+        self.assertListEqual(self.get_rollups(bankaccount), expected)
+
+    def test_unique_untagged(self):
+
+        bankaccount = BankAccountFactory(balance=0)
+        lookups = {
+            'bankaccount': bankaccount,
+            'month': datetime.date(2015, 6, 1),
+            'tag': None,
+            'sign': -1,
+            'reconciled': False,
+        }
+        BankTransactionRollup.objects.create(**lookups)
+
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                BankTransactionRollup.objects.create(**lookups)
+
+        # Thus concurrent inserts of the same untagged rollup are merged.
+        BankTransactionRollup.objects.apply_deltas(bankaccount.pk, {
+            (lookups['month'], None, -1, False): (Decimal('-10'), 1),
+        })
+        self.assertEqual(self.get_rollups(bankaccount), [
+            (datetime.date(2015, 6, 1), None, -1, False, Decimal('-10'), 1),
+        ])
+
+    def test_save_delete(self):
+
+        bankaccount = BankAccountFactory(balance=0)
+        tag = BankTransactionTagFactory()
+
+        bt1 = BankTransactionFactory(
+            bankaccount=bankaccount,
+            amount=Decimal('-10'),
+            date=datetime.date(2015, 6, 3),
+            tag=tag,
+        )
+        bt2 = BankTransactionFactory(
+            bankaccount=bankaccount,
+            amount=Decimal('-15'),
+            date=datetime.date(2015, 6, 28),
+            tag=tag,
+        )
+        bt3 = BankTransactionFactory(
+            bankaccount=bankaccount,
+            amount=Decimal('25'),
+            reconciled=True,
+            date=datetime.date(2015, 7, 5),
+        )
+        # Only active bank transactions are summed up.
+        BankTransactionFactory(
+            bankaccount=bankaccount,
+            amount=Decimal('1000'),
+            status=BankTransaction.STATUS_IGNORED,
+            date=datetime.date(2015, 6, 1),
+        )
+        self.assertListEqual(self.get_rollups(bankaccount), [
+            (datetime.date(2015, 6, 1), tag.pk, -1, False, Decimal('-25'), 2),
+            (datetime.date(2015, 7, 1), None, 1, True, Decimal('25'), 1),
+        ])
+
+        # Changes which don't matter don't update anything.
+        bt1.label = 'foo'
+        with CaptureQueriesContext(connection) as context:
+            bt1.save()
+        self.assertFalse([
+            query for query in context.captured_queries
+            if 'banktransactions_rollups' in query['sql']
+        ])
+
+        bt2.tag = None
+        bt2.reconciled = True
+        bt2.save()
+        bt3.date = datetime.date(2015, 6, 5)
+        bt3.save()
+        self.assertListEqual(self.get_rollups(bankaccount), [
+            (datetime.date(2015, 6, 1), None, -1, True, Decimal('-15'), 1),
+            (datetime.date(2015, 6, 1), None, 1, True, Decimal('25'), 1),
+            (datetime.date(2015, 6, 1), tag.pk, -1, False, Decimal('-10'), 1),
+        ])
+
+        bt1.status = BankTransaction.STATUS_INACTIVE
+        bt1.save()
+        bt3.delete()
+        self.assertListEqual(self.get_rollups(bankaccount), [
+            (datetime.date(2015, 6, 1), None, -1, True, Decimal('-15'), 1),
+        ])
+        self.assertRebuiltEqual(bankaccount)
+
+    def test_bulk(self):
+
+        bankaccount = BankAccountFactory(balance=0)
+        tag = BankTransactionTagFactory()
+
+        BankTransaction.objects.bulk_create_with_balance([
+            BankTransaction(
+                bankaccount=bankaccount,
+                label='foo',
+                amount=Decimal(amount),
+                date=datetime.date(2015, month, 10),
+                tag=tag,
+            )
+            for month, amount in ((5, '-10'), (5, '-5'), (6, '20'), (6, '0'))
+        ])
+        pks = list(
+            BankTransaction.objects
+            .filter(bankaccount=bankaccount)
+            .order_by('date', 'amount')
+            .values_list('pk', flat=True)
+        )
+        self.assertListEqual(self.get_rollups(bankaccount), [
+            (datetime.date(2015, 5, 1), tag.pk, -1, False, Decimal('-15'), 2),
+            (datetime.date(2015, 6, 1), tag.pk, 0, False, Decimal('0'), 1),
+            (datetime.date(2015, 6, 1), tag.pk, 1, False, Decimal('20'), 1),
+        ])
+
+        BankTransaction.objects.update_reconciled([pks[0], pks[3]], True)
+        self.assertListEqual(self.get_rollups(bankaccount), [
+            (datetime.date(2015, 5, 1), tag.pk, -1, False, Decimal('-5'), 1),
+            (datetime.date(2015, 5, 1), tag.pk, -1, True, Decimal('-10'), 1),
+            (datetime.date(2015, 6, 1), tag.pk, 0, False, Decimal('0'), 1),
+            (datetime.date(2015, 6, 1), tag.pk, 1, True, Decimal('20'), 1),
+        ])
+        self.assertRebuiltEqual(bankaccount)
+
+        BankTransaction.objects.bulk_delete_with_balance(pks[:3])
+        self.assertListEqual(self.get_rollups(bankaccount), [
+            (datetime.date(2015, 6, 1), tag.pk, 1, True, Decimal('20'), 1),
+        ])
+        self.assertRebuiltEqual(bankaccount)
+
+    def test_retag(self):
+
+        owner = UserFactory()
+        bankaccount = BankAccountFactory(owners=[owner])
+        tag = BankTransactionTagFactory(owner=owner)
+        BankTransactionTagRule.objects.create(tag=tag, label_contains='food')
+
+        BankTransactionFactory(
+            bankaccount=bankaccount,
+            label='Food',
+            amount=Decimal('-10'),
+            date=datetime.date(2015, 6, 3),
+        )
+        BankTransactionFactory(
+            bankaccount=bankaccount,
+            label='Other',
+            amount=Decimal('-5'),
+            date=datetime.date(2015, 6, 3),
+        )
+
+        BankTransaction.objects.retag(bankaccount)
+        self.assertListEqual(self.get_rollups(bankaccount), [
+            (datetime.date(2015, 6, 1), None, -1, False, Decimal('-5'), 1),
+            (datetime.date(2015, 6, 1), tag.pk, -1, False, Decimal('-10'), 1),
+        ])
+        self.assertRebuiltEqual(bankaccount)
+
+    def test_delete_tag(self):
+
+        bankaccount = BankAccountFactory()
+        tag = BankTransactionTagFactory()
+
+        for amount, banktransaction_tag in (('-10', tag), ('-5', None)):
+            BankTransactionFactory(
+                bankaccount=bankaccount,
+                amount=Decimal(amount),
+                date=datetime.date(2015, 6, 3),
+                tag=banktransaction_tag,
+            )
+
+        tag.delete()
+        self.assertListEqual(self.get_rollups(bankaccount), [
+            (datetime.date(2015, 6, 1), None, -1, False, Decimal('-15'), 2),
+        ])
+        self.assertRebuiltEqual(bankaccount)
+
+    def test_get_tag_sums(self):
+
+        bankaccount = BankAccountFactory()
+        tag = BankTransactionTagFactory(name='foo')
+
+        for date_value, amount, banktransaction_tag, reconciled in (
+                ('2015-05-20', '-10', tag, False),    # Edge.
+                ('2015-06-01', '-20', tag, True),     # Whole month.
+                ('2015-06-15', '5', tag, False),      # Whole month.
+                ('2015-07-10', '-40', None, False),   # Edge.
+                ('2015-07-11', '-1000', None, False)):  # Out of range.
+            BankTransactionFactory(
+                bankaccount=bankaccount,
+                amount=Decimal(amount),
+                date=date_value,
+                tag=banktransaction_tag,
+                reconciled=reconciled,
+            )
+
+        def get_tag_sums(**kwargs):
+            rows, total = BankTransactionRollup.objects.get_tag_sums(
+                bankaccount,
+                datetime.date(2015, 5, 20),
+                datetime.date(2015, 7, 10),
+                **kwargs
+            )
+            rows = sorted(
+                ((data['tag'], data['tag__name'], data['sum'], data['count'])
+                 for data in rows),
+                key=lambda row: row[0] or 0,
+            )
+            return rows, total
+
+        for window in (True, False):
+            with patch('mymoney.apps.banktransactions.models.supports_window_functions',
+                       return_value=window):
+
+                with CaptureQueriesContext(connection) as context:
+                    rows, total = get_tag_sums()
+                self.assertEqual(len(context.captured_queries), 1)
+                self.assertEqual(total, Decimal('-65'))
+                self.assertListEqual(rows, [
+                    (None, None, Decimal('-40'), 1),
+                    (tag.pk, 'foo', Decimal('-25'), 3),
+                ])
+
+                rows, total = get_tag_sums(sign=1)
+                self.assertEqual(total, Decimal('5'))
+                self.assertListEqual(rows, [(tag.pk, 'foo', Decimal('5'), 1)])
+
+                rows, total = get_tag_sums(reconciled=True)
+                self.assertEqual(total, Decimal('-20'))
+                self.assertListEqual(rows, [(tag.pk, 'foo', Decimal('-20'), 1)])
+
+                rows, total = get_tag_sums(sum_sign=1)
+                self.assertIsNone(total)
+                self.assertListEqual(rows, [])
+
 
 class RelationshipTestCase(unittest.TestCase):
 
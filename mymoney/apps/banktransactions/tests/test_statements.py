@@ -0,0 +1,240 @@
+import datetime
+import io
+import unittest
+from decimal import Decimal
+
+from mymoney.apps.bankaccounts.factories import BankAccountFactory
+from mymoney.apps.banktransactiontags.factories import (
+    BankTransactionTagFactory,
+)
+from mymoney.apps.banktransactiontags.models import BankTransactionTagRule
+from mymoney.core.factories import UserFactory
+
+from ..models import BankAccountDailyBalance, BankTransaction
+from ..statements import (
+    FORMAT_CSV, FORMAT_OFX, UnknownFormat, import_statement, parse_csv,
+    parse_ofx, parse_statement,
+)
+
+OFX_SGML = """OFXHEADER:100
+DATA:OFXSGML
+
+<OFX>
+<BANKMSGSRSV1>
+<STMTTRNRS>
+<STMTRS>
+<BANKTRANLIST>
+<STMTTRN>
+<TRNTYPE>POS
+<DTPOSTED>20150603120000
+<TRNAMT>-15,59
+<NAME>Grocery
+<MEMO>Card 1234
+</STMTTRN>
+<STMTTRN>
+<TRNTYPE>XFER
+<DTPOSTED>20150605
+<TRNAMT>1500.00
+<NAME>Salary
+</STMTTRN>
+</BANKTRANLIST>
+</STMTRS>
+</STMTTRNRS>
+</BANKMSGSRSV1>
+</OFX>
+"""
+
+OFX_XML = (
+    '<?xml version="1.0"?><OFX><BANKTRANLIST>'
+    '<STMTTRN><TRNTYPE>CHECK</TRNTYPE><DTPOSTED>20150607</DTPOSTED>'
+    '<TRNAMT>-20</TRNAMT><MEMO>Check 42</MEMO></STMTTRN>'
+    '</BANKTRANLIST></OFX>'
+)
+
+
+class ParserTestCase(unittest.TestCase):
+
+    def test_csv(self):
+
+        rows = list(parse_csv(io.StringIO(
+            'Date;Label;Amount;Reconciled\n'
+            '2015-06-03;Grocery;-15.59;1\n'
+            '2015-06-05;Salary;1500;\n'
+        ), delimiter=';'))
+
+        self.assertListEqual(rows, [
+            (2, {
+                'date': '2015-06-03',
+                'label': 'Grocery',
+                'amount': '-15.59',
+                'reconciled': '1',
+            }),
+            (3, {
+                'date': '2015-06-05',
+                'label': 'Salary',
+                'amount': '1500',
+                'reconciled': '',
+            }),
+        ])
+
+    def test_ofx_sgml(self):
+
+        rows = list(parse_ofx(io.StringIO(OFX_SGML)))
+        self.assertListEqual(rows, [
+            (1, {
+                'date': '2015-06-03',
+                'label': 'Grocery',
+                'amount': '-15.59',
+                'memo': 'Card 1234',
+                'payment_method': BankTransaction.PAYMENT_METHOD_CREDIT_CARD,
+            }),
+            (2, {
+                'date': '2015-06-05',
+                'label': 'Salary',
+                'amount': '1500.00',
+                'payment_method': BankTransaction.PAYMENT_METHOD_TRANSFER,
+            }),
+        ])
+
+    def test_ofx_xml(self):
+
+        rows = list(parse_ofx(io.StringIO(OFX_XML)))
+        self.assertListEqual(rows, [
+            (1, {
+                'date': '2015-06-07',
+                'label': 'Check 42',
+                'amount': '-20',
+                'payment_method': BankTransaction.PAYMENT_METHOD_CHECK,
+            }),
+        ])
+
+    def test_unknown_format(self):
+
+        with self.assertRaises(UnknownFormat):
+            parse_statement(io.StringIO(''), 'qif')
+
+
+class ImportTestCase(unittest.TestCase):
+
+    def test_import(self):
+
+        bankaccount = BankAccountFactory(balance=0, currency='EUR')
+
+        rows = parse_statement(io.StringIO(
+            'date,label,amount,status,reconciled\n'
+            '2015-06-03,Grocery,-15.59,,1\n'
+            '2015-06-04,,10,,\n'
+            '2015-06-05,Salary,1500,,\n'
+            'foo,Bar,baz,unknown,\n'
+            '2015-06-06,Refund,5,inactive,\n'
+        ), FORMAT_CSV)
+        result = import_statement(bankaccount, rows, chunk_size=2)
+
+        self.assertEqual(result.imported, 3)
+        self.assertEqual(result.rejected, 2)
+        self.assertListEqual(
+            [(number, sorted(errors)) for number, errors in result.rejections],
+            [(3, ['label']), (5, ['amount', 'date', 'status'])],
+        )
+
+        bankaccount.refresh_from_db()
+        self.assertEqual(bankaccount.balance, Decimal('1484.41'))
+        self.assertEqual(bankaccount.reconciled_balance, Decimal('-15.59'))
+        self.assertListEqual(
+            list(
+                BankTransaction.objects
+                .filter(bankaccount=bankaccount)
+                .order_by('date')
+                .values_list('label', 'currency', 'status')
+            ),
+            [
+                ('Grocery', 'EUR', BankTransaction.STATUS_ACTIVE),
+                ('Salary', 'EUR', BankTransaction.STATUS_ACTIVE),
+                ('Refund', 'EUR', BankTransaction.STATUS_INACTIVE),
+            ],
+        )
+        self.assertListEqual(
+            list(
+                BankAccountDailyBalance.objects
+                .filter(bankaccount=bankaccount)
+                .order_by('date')
+                .values_list('date', 'balance')
+            ),
+            [
+                (datetime.date(2015, 6, 3), Decimal('-15.59')),
+                (datetime.date(2015, 6, 5), Decimal('1484.41')),
+            ],
+        )
+
+    def test_import_ofx(self):
+
+        bankaccount = BankAccountFactory(balance=0)
+        result = import_statement(
+            bankaccount,
+            parse_statement(io.StringIO(OFX_SGML), FORMAT_OFX),
+        )
+        self.assertEqual(result.imported, 2)
+        self.assertEqual(result.rejected, 0)
+
+        bankaccount.refresh_from_db()
+        self.assertEqual(bankaccount.balance, Decimal('1484.41'))
+
+    def test_import_duplicates(self):
+
+        bankaccount = BankAccountFactory(balance=0)
+        BankTransaction.objects.create(
+            bankaccount=bankaccount,
+            label='Grocery',
+            amount=Decimal('-15.59'),
+            date=datetime.date(2015, 6, 3),
+        )
+
+        def get_rows():
+            return parse_statement(io.StringIO(
+                'date,label,amount\n'
+                '2015-06-03,GROCERY ,-15.59\n'
+                '2015-06-04,Salary,1500\n'
+                '2015-06-04,Salary,1500\n'
+            ), FORMAT_CSV)
+
+        result = import_statement(bankaccount, get_rows(), dry_run=True)
+        self.assertEqual(result.imported, 3)
+        self.assertEqual(result.duplicates, 1)
+        self.assertEqual(
+            BankTransaction.objects.filter(bankaccount=bankaccount).count(), 1,
+        )
+
+        # Same bank transactions of the statement are not duplicates, even
+        # between chunks.
+        result = import_statement(
+            bankaccount, get_rows(), chunk_size=2, skip_duplicates=True,
+        )
+        self.assertEqual(result.imported, 2)
+        self.assertEqual(result.duplicates, 1)
+
+        bankaccount.refresh_from_db()
+        self.assertEqual(bankaccount.balance, Decimal('2984.41'))
+
+    def test_import_tags(self):
+
+        owner = UserFactory(username='import_owner')
+        bankaccount = BankAccountFactory(balance=0, owners=[owner])
+        tag = BankTransactionTagFactory(owner=owner)
+        BankTransactionTagRule.objects.create(tag=tag, label_contains='grocery')
+
+        import_statement(bankaccount, parse_statement(io.StringIO(
+            'date,label,amount\n'
+            '2015-06-03,Grocery,-15.59\n'
+            '2015-06-05,Salary,1500\n'
+        ), FORMAT_CSV))
+
+        self.assertListEqual(
+            list(
+                BankTransaction.objects
+                .filter(bankaccount=bankaccount)
+                .order_by('date')
+                .values_list('tag', flat=True)
+            ),
+            [tag.pk, None],
+        )
+        owner.delete()
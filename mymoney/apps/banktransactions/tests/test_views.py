@@ -1,4 +1,6 @@
+import base64
 import datetime
+import json
 import time
 from decimal import Decimal
 
@@ -14,6 +16,8 @@ from mymoney.apps.banktransactiontags.factories import (
     BankTransactionTagFactory,
 )
 from mymoney.core.factories import UserFactory
+from mymoney.core.paginators import KeysetPaginator
+from mymoney.core.querybudgets import QueryBudgetTestMixin
 
 from ..factories import BankTransactionFactory
 from ..models import BankTransaction
@@ -88,6 +92,29 @@ class AccessTestCase(TestCase):
         self.assertEqual(404, response.status_code)
         self.client.logout()
 
+    def test_access_import(self):
+        url = reverse('banktransactions:import', kwargs={
+            'bankaccount_pk': self.bankaccount.pk
+        })
+
+        # Missing permission.
+        self.client.force_login(self.owner)
+        response = self.client.get(url)
+        self.assertEqual(403, response.status_code)
+        self.client.logout()
+
+        # Having permission but not owner.
+        self.client.force_login(self.not_owner)
+        response = self.client.get(url)
+        self.assertEqual(403, response.status_code)
+        self.client.logout()
+
+        # Owner with permission.
+        self.client.force_login(self.superowner)
+        response = self.client.get(url)
+        self.assertEqual(200, response.status_code)
+        self.client.logout()
+
     def test_access_update(self):
         url = reverse('banktransactions:update', kwargs={
             'pk': self.banktransaction.pk
@@ -853,6 +880,81 @@ class ListViewTestCase(WebTest):
         )
         form.submit('reset').maybe_follow()
 
+    def test_export(self):
+
+        bankaccount = BankAccountFactory(
+            balance=0,
+            balance_initial=Decimal('100'),
+            owners=[self.superowner],
+        )
+        url = reverse('banktransactions:list', kwargs={
+            'bankaccount_pk': bankaccount.pk
+        })
+
+        BankTransactionFactory(
+            bankaccount=bankaccount,
+            label='before',
+            amount='-10',
+            reconciled=True,
+            date=datetime.date(2015, 5, 10),
+        )
+        BankTransactionFactory(
+            bankaccount=bankaccount,
+            label='credit',
+            amount='15.59',
+            date=datetime.date(2015, 5, 11),
+            tag=self.banktransactiontags[0],
+            reconciled=True,
+        )
+        BankTransactionFactory(
+            bankaccount=bankaccount,
+            label='inactive',
+            amount='-1000',
+            status=BankTransaction.STATUS_INACTIVE,
+            date=datetime.date(2015, 5, 12),
+        )
+        BankTransactionFactory(
+            bankaccount=bankaccount,
+            label='debit',
+            amount='-25.59',
+            date=datetime.date(2015, 5, 12),
+        )
+
+        response = self.app.get(url + '?export=csv', user='superowner')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = response.text.splitlines()
+        self.assertEqual(
+            lines[0],
+            'date,label,amount,currency,status,reconciled,payment_method,'
+            'memo,tag,balance,reconciled_balance',
+        )
+        self.assertListEqual(
+            [line.split(',')[1:2] + line.split(',')[-2:] for line in lines[1:]],
+            [
+                ['before', '90.00', '90.00'],
+                ['credit', '105.59', '105.59'],
+                ['inactive', '105.59', '105.59'],
+                ['debit', '80.00', '105.59'],
+            ],
+        )
+        self.assertIn(self.banktransactiontags[0].name, lines[2])
+
+        # Session filters apply to the rows exported, not to their balances.
+        form = self.app.get(url, user='superowner').form
+        form['date_start'] = '2015-05-11'
+        form['status'] = BankTransaction.STATUS_ACTIVE
+        form.submit('filter').maybe_follow()
+
+        response = self.app.get(url + '?export=ndjson', user='superowner')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        self.assertListEqual(
+            [(row['label'], row['balance'], row['reconciled_balance']) for row in rows],
+            [('credit', '105.59', '105.59'), ('debit', '80.00', '105.59')],
+        )
+        self.assertEqual(rows[0]['date'], '2015-05-11')
+        self.assertTrue(rows[0]['reconciled'])
+
     def test_paginator(self):
 
         # Monkey patch just to reduce it.
@@ -868,15 +970,33 @@ class ListViewTestCase(WebTest):
 
         response = self.app.get(self.url, user='superowner')
         self.assertEqual(len(response.context[0].get('object_list')), limit)
+        page = response.context[0].get('page_obj')
+        self.assertFalse(page.has_previous())
+        self.assertTrue(page.has_next())
 
-        response = self.app.get(self.url + '?page=2', user='superowner')
+        response = self.app.get(
+            self.url + '?cursor=' + page.next_cursor(), user='superowner',
+        )
         self.assertEqual(len(response.context[0].get('object_list')), 1)
+        page = response.context[0].get('page_obj')
+        self.assertTrue(page.has_previous())
+        self.assertFalse(page.has_next())
 
-        response = self.app.get(self.url + '?page=465465456', user='superowner')
+        response = self.app.get(
+            self.url + '?cursor=' + page.previous_cursor(), user='superowner',
+        )
+        self.assertEqual(len(response.context[0].get('object_list')), limit)
+        self.assertFalse(response.context[0].get('page_obj').has_previous())
+
+        response = self.app.get(self.url + '?cursor=foo', user='superowner')
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.context[0].get('object_list')), limit)
 
-        response = self.app.get(self.url + '?page=foo', user='superowner')
+        # Tampered cursor with values which are not strings.
+        cursor = base64.urlsafe_b64encode(json.dumps(['n', 1, 2]).encode())
+        response = self.app.get(
+            self.url + '?cursor=' + cursor.decode(), user='superowner',
+        )
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.context[0].get('object_list')), limit)
 
@@ -1020,6 +1140,59 @@ class ListViewTestCase(WebTest):
         )
 
 
+class ImportViewTestCase(WebTest):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.superowner = UserFactory(username='superowner', user_permissions='admin')
+
+    def test_import(self):
+
+        bankaccount = BankAccountFactory(balance=0, owners=[self.superowner])
+        url = reverse('banktransactions:import', kwargs={
+            'bankaccount_pk': bankaccount.pk
+        })
+
+        form = self.app.get(url, user='superowner').form
+        form['statement'] = (
+            'statement.csv',
+            'date,label,amount\n'
+            '2015-06-03,Grocery,-15.59\n'
+            '2015-06-04,Foo,bar\n'.encode('utf-8'),
+        )
+        form['format'] = 'csv'
+        response = form.submit().maybe_follow()
+
+        storage = [str(message) for message in response.context['messages']]
+        self.assertIn(
+            '1 bank transactions imported, 1 rejected, 0 duplicates.', storage,
+        )
+        self.assertTrue(storage[1].startswith('Row 3 rejected: amount:'))
+
+        bankaccount.refresh_from_db()
+        self.assertEqual(bankaccount.balance, Decimal('-15.59'))
+
+        # Byte order mark prepended by some spreadsheet exports.
+        form['statement'] = (
+            'statement.csv',
+            '\ufeffdate,label,amount\n'
+            '2015-06-05,Grocery,-4.41\n'.encode('utf-8'),
+        )
+        response = form.submit().maybe_follow()
+        storage = [str(message) for message in response.context['messages']]
+        self.assertIn(
+            '1 bank transactions imported, 0 rejected, 0 duplicates.', storage,
+        )
+        bankaccount.refresh_from_db()
+        self.assertEqual(bankaccount.balance, Decimal('-20'))
+
+        form['statement'] = ('statement.csv', 'date,label\n\xe9'.encode('latin-1'))
+        response = form.submit()
+        self.assertFormError(
+            response, 'form', 'statement', 'Statement must be UTF-8 encoded.',
+        )
+
+
 class CalendarViewTestCase(WebTest):
 
     @classmethod
@@ -1208,3 +1381,97 @@ class CalendarEventAjaxTestCase(WebTest):
             response.context['url_delete'],
             reverse('banktransactions:delete', kwargs={'pk': banktransaction.pk})
         )
+
+
+@modify_settings(MIDDLEWARE={
+    'remove': ['mymoney.core.middleware.AnonymousRedirectMiddleware'],
+})
+class QueryBudgetTestCase(QueryBudgetTestMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = UserFactory(username='owner', user_permissions='admin')
+        cls.bankaccount = BankAccountFactory(owners=[cls.owner])
+        cls.banktransactiontags = [
+            BankTransactionTagFactory(owner=cls.owner),
+            BankTransactionTagFactory(owner=cls.owner),
+        ]
+        cls.banktransaction = BankTransactionFactory(
+            bankaccount=cls.bankaccount,
+            date=datetime.date.today(),
+            reconciled=True,
+            tag=cls.banktransactiontags[0],
+        )
+
+    def setUp(self):
+        self.client.force_login(self.owner)
+
+    def grow(self, size=60):
+        def grow():
+            today = datetime.date.today()
+            for i in range(size):
+                BankTransactionFactory(
+                    bankaccount=self.bankaccount,
+                    date=today - datetime.timedelta(days=i % 25 + 1),
+                    reconciled=i % 3 > 0,
+                    tag=self.banktransactiontags[i % 2],
+                )
+        return grow
+
+    def test_list(self):
+        url = reverse('banktransactions:list', kwargs={
+            'bankaccount_pk': self.bankaccount.pk,
+        })
+        self.assertConstantQueries(lambda: self.client.get(url), self.grow())
+
+    def test_list_cursor(self):
+        paginator = KeysetPaginator(BankTransaction.objects.all(), 50)
+        url = reverse('banktransactions:list', kwargs={
+            'bankaccount_pk': self.bankaccount.pk,
+        })
+        cursor = paginator.encode_cursor(
+            paginator.CURSOR_NEXT, self.banktransaction,
+        )
+        # Otherwise, the empty page would fall back to the first one.
+        self.grow(size=2)()
+        self.assertConstantQueries(
+            lambda: self.client.get(url, {'cursor': cursor}), self.grow(),
+        )
+
+    def test_calendar_ajax_events(self):
+        url = reverse('banktransactions:calendar_ajax_events', kwargs={
+            'bankaccount_pk': self.bankaccount.pk,
+        })
+        today = datetime.date.today()
+        params = {
+            'from': int(time.mktime((today - datetime.timedelta(days=30)).timetuple())) * 1000,
+            'to': int(time.mktime(today.timetuple())) * 1000,
+        }
+        self.assertConstantQueries(
+            lambda: self.client.get(url, params), self.grow(),
+        )
+
+    def test_calendar_ajax_event(self):
+        url = reverse('banktransactions:calendar_ajax_event', kwargs={
+            'pk': self.banktransaction.pk,
+        })
+        self.assertConstantQueries(lambda: self.client.get(url), self.grow())
+
+    def test_forms(self):
+        for url in (
+            reverse('banktransactions:create', kwargs={
+                'bankaccount_pk': self.bankaccount.pk,
+            }),
+            reverse('banktransactions:update', kwargs={
+                'pk': self.banktransaction.pk,
+            }),
+            reverse('banktransactions:delete', kwargs={
+                'pk': self.banktransaction.pk,
+            }),
+            reverse('banktransactions:import', kwargs={
+                'bankaccount_pk': self.bankaccount.pk,
+            }),
+        ):
+            self.assertConstantQueries(
+                lambda: self.client.get(url), self.grow(size=10),
+            )
@@ -44,4 +44,9 @@ urlpatterns = [
         views.BankTransactionDeleteMultipleView.as_view(),
         name='delete_multiple',
     ),
+    url(
+        r'^import/(?P<bankaccount_pk>\d+)/$',
+        views.BankTransactionImportView.as_view(),
+        name='import',
+    ),
 ]
@@ -1,16 +1,20 @@
+import codecs
+import csv
 import datetime
+import json
 import time
-from collections import OrderedDict
+from itertools import chain
 
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.mixins import PermissionRequiredMixin
 from django.contrib.messages.views import SuccessMessageMixin
 from django.core.exceptions import PermissionDenied
-from django.core.paginator import InvalidPage, Paginator
-from django.db.models import QuerySet
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q, QuerySet
 from django.http import (
     HttpResponseBadRequest, HttpResponseRedirect, JsonResponse,
+    StreamingHttpResponse,
 )
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
@@ -18,16 +22,18 @@ from django.utils.functional import cached_property
 from django.utils.translation import ugettext as _, ugettext_lazy
 from django.views import generic
 
+from mymoney.core.paginators import InvalidCursor, KeysetPaginator
 from mymoney.core.templatetags.core_tags import (
     currency_positive, localize_positive,
 )
 
 from .forms import (
-    BankTransactionCreateForm, BankTransactionListForm,
-    BankTransactionUpdateForm,
+    BankTransactionCreateForm, BankTransactionImportForm,
+    BankTransactionListForm, BankTransactionUpdateForm,
 )
 from .mixins import BankTransactionAccessMixin, BankTransactionSaveViewMixin
-from .models import BankTransaction
+from .models import BALANCE_PREFIX, BALANCE_SUFFIX, BankTransaction
+from .statements import import_statement, parse_statement
 
 
 class BankTransactionListView(BankTransactionAccessMixin, generic.FormView):
@@ -37,6 +43,18 @@ class BankTransactionListView(BankTransactionAccessMixin, generic.FormView):
     paginate_by = 50
     _session_key = 'banktransactionlistform'
 
+    export_formats = ('csv', 'ndjson')
+    # Same columns as imported statements, so that it could be reimported.
+    export_fields = ('date', 'label', 'amount', 'currency', 'status',
+                     'reconciled', 'payment_method', 'memo', 'tag__name')
+
+    def get(self, request, *args, **kwargs):
+
+        if request.GET.get('export') in self.export_formats:
+            return self.export(request.GET['export'])
+
+        return super(BankTransactionListView, self).get(request, *args, **kwargs)
+
     def get_initial(self):
         initial = super(BankTransactionListView, self).get_initial()
 
@@ -116,18 +134,14 @@ class BankTransactionListView(BankTransactionAccessMixin, generic.FormView):
             ids = form.cleaned_data['banktransactions']
 
             if op == 'reconcile':
-                (BankTransaction.objects
-                    .filter(pk__in=ids)
-                    .update(reconciled=True))
+                BankTransaction.objects.update_reconciled(ids, True)
                 messages.success(
                     self.request,
                     _('Bank transaction have been reconciled.'),
                 )
 
             elif op == 'unreconcile':
-                (BankTransaction.objects
-                    .filter(pk__in=ids)
-                    .update(reconciled=False))
+                BankTransaction.objects.update_reconciled(ids, False)
                 messages.success(
                     self.request,
                     _('Undo bank transaction reconciled.'),
@@ -146,62 +160,123 @@ class BankTransactionListView(BankTransactionAccessMixin, generic.FormView):
     @cached_property
     def page(self):
 
-        paginator = Paginator(self.queryset, self.paginate_by)
+        cursor = self.request.GET.get('cursor')
+
+        # Balances are computed for the rows of the page only.
+        qs = queryset_extra_balance_fields(
+            self.queryset, self.bankaccount, latest=not cursor,
+        )
+        paginator = KeysetPaginator(qs, self.paginate_by)
         try:
-            page = paginator.page(self.request.GET.get('page'))
-        except InvalidPage:
-            page = paginator.page(1)
+            page = paginator.page(cursor)
+        except InvalidCursor:
+            page = paginator.page()
 
         return page
 
     @property
     def queryset(self):
 
-        qs = (
+        return (
             BankTransaction.objects
             .filter(bankaccount=self.bankaccount)
+            .filter(self.filters)
             .select_related('tag')
             .order_by('-date', '-id')
         )
 
-        qs = queryset_extra_balance_fields(qs, self.bankaccount)
-
+    @property
+    def session_filters(self):
         if self._session_key in self.request.session:
-            filters = self.request.session[self._session_key].get('filters', {})
+            return self.request.session[self._session_key].get('filters', {})
+        return {}
 
-            if 'label' in filters:
-                qs = qs.filter(label__icontains=filters['label'])
+    @property
+    def filters(self):
 
-            if 'date_start' in filters and 'date_end' in filters:
-                qs = qs.filter(date__range=(
-                    filters['date_start'],
-                    filters['date_end'])
-                )
-            elif 'date_start' in filters:
-                qs = qs.filter(date__gte=filters['date_start'])
-            elif 'date_end' in filters:
-                qs = qs.filter(date__lte=filters['date_end'])
-
-            if 'amount_min' in filters and 'amount_max' in filters:
-                qs = qs.filter(amount__range=(
-                    filters['amount_min'],
-                    filters['amount_max'])
-                )
-            elif 'amount_min' in filters:
-                qs = qs.filter(amount__gte=filters['amount_min'])
-            elif 'amount_max' in filters:
-                qs = qs.filter(amount__lte=filters['amount_max'])
+        q = Q()
+        filters = self.session_filters
 
-            if 'status' in filters:
-                qs = qs.filter(status=filters['status'])
+        if 'label' in filters:
+            q &= Q(label__icontains=filters['label'])
 
-            if 'reconciled' in filters:
-                qs = qs.filter(reconciled=filters['reconciled'])
+        if 'date_start' in filters and 'date_end' in filters:
+            q &= Q(date__range=(
+                filters['date_start'],
+                filters['date_end'])
+            )
+        elif 'date_start' in filters:
+            q &= Q(date__gte=filters['date_start'])
+        elif 'date_end' in filters:
+            q &= Q(date__lte=filters['date_end'])
+
+        if 'amount_min' in filters and 'amount_max' in filters:
+            q &= Q(amount__range=(
+                filters['amount_min'],
+                filters['amount_max'])
+            )
+        elif 'amount_min' in filters:
+            q &= Q(amount__gte=filters['amount_min'])
+        elif 'amount_max' in filters:
+            q &= Q(amount__lte=filters['amount_max'])
 
-            if 'tags' in filters:
-                qs = qs.filter(tag__in=filters['tags'])
+        if 'status' in filters:
+            q &= Q(status=filters['status'])
 
-        return qs
+        if 'reconciled' in filters:
+            q &= Q(reconciled=filters['reconciled'])
+
+        if 'tags' in filters:
+            q &= Q(tag__in=filters['tags'])
+
+        return q
+
+    def export(self, export_format):
+        """
+        Stream bank transactions matching the session filters with their
+        running balances, without loading them all in memory.
+        """
+        filters = self.session_filters
+        rows = BankTransaction.objects.iter_running_balances(
+            self.bankaccount,
+            self.export_fields,
+            filters=self.filters,
+            date_start=filters.get('date_start'),
+            date_end=filters.get('date_end'),
+        )
+        header = [field.replace('__name', '') for field in self.export_fields]
+        header += ['balance', 'reconciled_balance']
+
+        if export_format == 'csv':
+            writer = csv.writer(EchoBuffer())
+            content = (
+                writer.writerow(row) for row in chain([header], rows)
+            )
+            content_type = 'text/csv'
+        else:
+            content = (
+                json.dumps(dict(zip(header, row)), cls=DjangoJSONEncoder) + '\n'
+                for row in rows
+            )
+            content_type = 'application/x-ndjson'
+
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = (
+            'attachment; filename="bankaccount-{pk}.{ext}"'.format(
+                pk=self.bankaccount.pk,
+                ext=export_format,
+            )
+        )
+        return response
+
+
+class EchoBuffer(object):
+    """
+    File-like object which returns what is written instead of storing it.
+    """
+
+    def write(self, value):
+        return value
 
 
 class BankTransactionCalendarView(BankTransactionAccessMixin,
@@ -278,7 +353,7 @@ class BankTransactionCalendarEventsAjax(BankTransactionAccessMixin,
                     "reconciled_balance": banktransaction.reconciled_balance,
                     "reconciled_balance_view": localize_positive(
                         banktransaction.reconciled_balance
-                    ),
+                    ) if banktransaction.reconciled_balance is not None else '',
                 },
             })
 
@@ -418,8 +493,9 @@ class BankTransactionDeleteMultipleView(PermissionRequiredMixin,
 
     def post(self, request, *args, **kwargs):
 
-        for banktransaction in self.banktransactions:
-            banktransaction.delete()
+        BankTransaction.objects.bulk_delete_with_balance(
+            [banktransaction.pk for banktransaction in self.banktransactions],
+        )
 
         del self.request.session['banktransactionlistdelete']
         messages.success(request, "Bank transactions deleted successfully.")
@@ -435,7 +511,66 @@ class BankTransactionDeleteMultipleView(PermissionRequiredMixin,
         return context
 
 
-def queryset_extra_balance_fields(qs, bankaccount):
+class BankTransactionImportView(PermissionRequiredMixin,
+                                BankTransactionAccessMixin,
+                                generic.FormView):
+
+    form_class = BankTransactionImportForm
+    template_name = 'banktransactions/banktransaction_import.html'
+
+    permission_required = ('banktransactions.add_banktransaction',)
+    raise_exception = True
+
+    def get_context_data(self, **kwargs):
+        context = super(BankTransactionImportView, self).get_context_data(**kwargs)
+        context['bankaccount'] = self.bankaccount
+        return context
+
+    def get_success_url(self):
+        return reverse('banktransactions:list', kwargs={
+            'bankaccount_pk': self.bankaccount.pk,
+        })
+
+    def form_valid(self, form):
+
+        # Decode uploaded chunks on the fly instead of reading it at once. The
+        # BOM prepended by some spreadsheet exports is dropped if any.
+        lines = codecs.iterdecode(form.cleaned_data['statement'], 'utf-8-sig')
+        try:
+            result = import_statement(
+                self.bankaccount,
+                parse_statement(lines, form.cleaned_data['format']),
+                skip_duplicates=form.cleaned_data['skip_duplicates'],
+            )
+        except UnicodeDecodeError:
+            form.add_error('statement', _('Statement must be UTF-8 encoded.'))
+            return self.form_invalid(form)
+
+        messages.success(
+            self.request,
+            _('%(imported)d bank transactions imported, %(rejected)d '
+              'rejected, %(duplicates)d duplicates.') % {
+                'imported': result.imported,
+                'rejected': result.rejected,
+                'duplicates': result.duplicates,
+            },
+        )
+        for number, errors in result.rejections[:10]:
+            messages.warning(
+                self.request,
+                _('Row %(number)d rejected: %(errors)s') % {
+                    'number': number,
+                    'errors': ' '.join(
+                        '%s: %s' % (field, ' '.join(errors[field]))
+                        for field in sorted(errors)
+                    ),
+                },
+            )
+
+        return super(BankTransactionImportView, self).form_valid(form)
+
+
+def queryset_extra_balance_fields(qs, bankaccount, latest=False):
     """
     Add extra fields to the queryset provided. Useful if you need to know
     previous balance of the current row, no matter which filters/orders are
@@ -443,54 +578,14 @@ def queryset_extra_balance_fields(qs, bankaccount):
     Extra fields are:
     - total_balance
     - reconciled_balance
-    """
 
-    # Unfortunetly, we cannot get it by doing the opposite (i.e :
-    # total balance - SUM(futur bt) because with postgreSQL at least,
-    # the last dated bt would give None : total balance - SUM(NULL).
-    # It could be usefull because most of the time, we are seeing the
-    # latest pages, not the first (past).
-    total_balance_subquery = """
-        SELECT SUM(bt_sub.amount) + {balance_initial}
-        FROM {table} AS bt_sub
-        WHERE
-            bt_sub.bankaccount_id = %s
-            AND (
-                bt_sub.date < {table}.date
-                OR (
-                    bt_sub.date = {table}.date
-                    AND
-                    bt_sub.id <= {table}.id
-                )
-            )
-        """.format(
-        table=BankTransaction._meta.db_table,
-        balance_initial=bankaccount.balance_initial,
-    )
-
-    reconciled_balance_subquery = """
-        SELECT SUM(bt_sub_r.amount) + {balance_initial}
-        FROM {table} AS bt_sub_r
-        WHERE
-            bt_sub_r.bankaccount_id = %s
-            AND
-            bt_sub_r.reconciled = \'1\'
-            AND (
-                bt_sub_r.date < {table}.date
-                OR (
-                    bt_sub_r.date = {table}.date
-                    AND
-                    bt_sub_r.id <= {table}.id
-                )
-            )""".format(
-        table=BankTransaction._meta.db_table,
-        balance_initial=bankaccount.balance_initial,
-    )
+    Balances are computed once per fetch with running sums (window functions
+    if available), instead of two correlated subqueries per row.
 
-    return qs.extra(
-        select=OrderedDict([
-            ('total_balance', total_balance_subquery),
-            ('reconciled_balance', reconciled_balance_subquery),
-        ]),
-        select_params=(bankaccount.pk, bankaccount.pk)
-    )
+    If rows fetched are the latest bank transactions, balances are deduced
+    backward from the current balance. Most of the time, we are seeing the
+    latest page, not the first (past), so it prevents summing up the whole
+    history.
+    """
+    direction = BALANCE_SUFFIX if latest else BALANCE_PREFIX
+    return qs.with_balances(bankaccount, direction=direction)
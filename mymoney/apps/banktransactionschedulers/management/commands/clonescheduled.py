@@ -1,8 +1,19 @@
-from django.core.management.base import BaseCommand
+import multiprocessing
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from mymoney.core.utils.db import supports_skip_locked
 
 from ...models import BankTransactionScheduler
 
 
+def clone_worker(batch_size, catch_up=False):
+    return BankTransactionScheduler.objects.clone_awaiting_banktransactions(
+        batch_size=batch_size, catch_up=catch_up,
+    )
+
+
 class Command(BaseCommand):
     help = 'Clone bank transaction scheduled'
 
@@ -10,18 +21,62 @@ class Command(BaseCommand):
 
         parser.add_argument('--limit', action='store', type=int, default=100,
                             help='Limit the number of scheduled bank '
-                                 'transaction to clone.')
+                                 'transaction to clone. With workers, the '
+                                 'number claimed per batch instead.')
+        parser.add_argument('--workers', action='store', type=int,
+                            default=None,
+                            help='Number of processes cloning batches of '
+                                 'scheduled bank transaction until none is '
+                                 'left. Bank accounts of each batch are '
+                                 'locked, so that concurrent runs never '
+                                 'clone for the same ones.')
+        parser.add_argument('--catch-up', action='store_true', default=False,
+                            help='Clone every scheduled bank transaction '
+                                 'missed up to the current period at once, '
+                                 'instead of the next one only.')
 
     def handle(self, *args, **options):
 
-        # Sort by date instead of last action because last action could be NULL
-        # and postgreSQL sort NULL value as latest.
-        qs = (BankTransactionScheduler.objects
-              .get_awaiting_banktransactions()
-              .order_by('date')
-              [:options['limit']])
+        if options['workers'] is not None:
+            self.clone_workers(
+                options['workers'], options['limit'], options['catch_up'],
+            )
+        else:
+            # Sort by date instead of last action because last action could
+            # be NULL and postgreSQL sort NULL value as latest.
+            qs = (BankTransactionScheduler.objects
+                  .get_awaiting_banktransactions()
+                  .select_related('bankaccount')
+                  .order_by('date')
+                  [:options['limit']])
 
-        for bts in qs:
-            bts.clone()
+            BankTransactionScheduler.objects.clone_batch(
+                qs, catch_up=options['catch_up'],
+            )
 
         self.stdout.write('Scheduled bank transaction have been cloned.')
+
+    def clone_workers(self, workers, batch_size, catch_up):
+
+        if workers < 1:
+            raise CommandError('At least one worker is required.')
+        if workers > 1 and not supports_skip_locked(connection):
+            raise CommandError(
+                'Several workers require a database supporting '
+                'SELECT ... FOR UPDATE SKIP LOCKED.'
+            )
+
+        if workers == 1:
+            count = clone_worker(batch_size, catch_up)
+        else:
+            # Forked processes must not share the connections of the parent.
+            connections.close_all()
+            with multiprocessing.Pool(workers) as pool:
+                count = sum(pool.starmap(
+                    clone_worker, [(batch_size, catch_up)] * workers,
+                ))
+
+        self.stdout.write(
+            '{count} scheduled bank transaction processed by {workers} '
+            'worker(s).'.format(count=count, workers=workers)
+        )
@@ -0,0 +1,140 @@
+import json
+import logging
+import os
+import signal
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from dateutil.relativedelta import relativedelta
+
+from mymoney.core.utils.dates import get_datetime_ranges
+
+from ...models import BankTransactionScheduler
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Resident process cloning scheduled bank transactions, instead of booting
+    the whole project from cron each time. It wakes up at the beginning of
+    each period (or more often with an interval) until SIGTERM or SIGINT is
+    received.
+    """
+    help = 'Run the scheduler cloning bank transactions scheduled'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('--batch-size', action='store', type=int,
+                            default=100, dest='batch_size',
+                            help='Number of scheduled bank transaction '
+                                 'cloned at once.')
+        parser.add_argument('--catch-up', action='store_true', default=False,
+                            dest='catch_up',
+                            help='Clone every scheduled bank transaction '
+                                 'missed up to the current period at once.')
+        parser.add_argument('--interval', action='store', type=int,
+                            default=None,
+                            help='Maximum number of seconds to sleep between '
+                                 'runs. Default: until the next period.')
+        parser.add_argument('--status-file', action='store', default=None,
+                            dest='status_file',
+                            help='Path of a JSON file refreshed after each '
+                                 'run with health and metrics.')
+        parser.add_argument('--once', action='store_true', default=False,
+                            help='Run once then exit.')
+
+    def handle(self, *args, **options):
+
+        self.stopping = threading.Event()
+        self.status_file = options['status_file']
+        self.status = {
+            'pid': os.getpid(),
+            'state': 'running',
+            'started_at': timezone.now(),
+            'runs': 0,
+            'errors': 0,
+            'cloned': 0,
+            'last_run_at': None,
+            'last_run_duration': None,
+            'last_run_cloned': None,
+            'next_run_at': None,
+        }
+
+        handlers = {
+            signum: signal.signal(signum, self.stop)
+            for signum in (signal.SIGTERM, signal.SIGINT)
+        }
+        try:
+            while not self.stopping.is_set():
+                self.run(options['batch_size'], options['catch_up'])
+                if options['once']:
+                    break
+
+                next_run = self.get_next_run(timezone.now(), options['interval'])
+                self.write_status(next_run_at=next_run)
+                self.stopping.wait((next_run - timezone.now()).total_seconds())
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+            self.write_status(state='stopped', next_run_at=None)
+
+        self.stdout.write('Scheduler stopped after {runs} run(s), {cloned} '
+                          'scheduled bank transaction cloned.'.format(**self.status))
+
+    def stop(self, signum, frame):
+        # Current run is completed first, only sleeping is interrupted.
+        self.stopping.set()
+
+    def run(self, batch_size, catch_up):
+
+        started_at, start = timezone.now(), time.monotonic()
+
+        # Connections could have been closed by the server meanwhile.
+        close_old_connections()
+        try:
+            count = BankTransactionScheduler.objects.clone_awaiting_banktransactions(
+                batch_size=batch_size, catch_up=catch_up,
+            )
+        except Exception:
+            logger.exception('Error occured while running the scheduler.')
+            count = None
+            self.status['errors'] += 1
+        finally:
+            close_old_connections()
+
+        self.status['runs'] += 1
+        self.status['cloned'] += count or 0
+        self.write_status(
+            last_run_at=started_at,
+            last_run_duration=round(time.monotonic() - start, 3),
+            last_run_cloned=count,
+        )
+
+    def get_next_run(self, now, interval=None):
+        """
+        Returns the beginning of the next period, weekly or monthly, or
+        earlier with the interval given (in seconds).
+        """
+        next_run = min(
+            get_datetime_ranges(now, granularity)[1] + relativedelta(seconds=1)
+            for granularity in set(BankTransactionScheduler.GRANULARITIES.values())
+        )
+        if interval is not None:
+            next_run = min(next_run, now + relativedelta(seconds=interval))
+        return next_run
+
+    def write_status(self, **kwargs):
+        self.status.update(kwargs)
+        if self.status_file is None:
+            return
+
+        # Replaced at once, so that it is never read half written.
+        path = '{}.tmp'.format(self.status_file)
+        with open(path, 'w') as f:
+            json.dump(self.status, f, default=str, indent=2, sort_keys=True)
+        os.replace(path, self.status_file)
@@ -1,20 +1,23 @@
 import logging
 from datetime import timedelta
+from decimal import Decimal
 
-from django.db import models, transaction
-from django.db.models import Q, Sum
+from django.db import connection, models, transaction
+from django.db.models import Q
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
 from dateutil.relativedelta import relativedelta
 
+from mymoney.apps.bankaccounts.models import BankAccount
 from mymoney.apps.banktransactions.models import (
     AbstractBankTransaction, BankTransaction,
 )
 from mymoney.core.utils.dates import (
-    GRANULARITY_MONTH, GRANULARITY_WEEK, get_datetime_ranges,
+    GRANULARITY_MONTH, GRANULARITY_WEEK, get_date_ranges, get_datetime_ranges,
 )
+from mymoney.core.utils.db import supports_skip_locked
 
 logger = logging.getLogger(__name__)
 
@@ -49,27 +52,178 @@ class BankTransactionSchedulerManager(models.Manager):
             )
         )
 
-    def get_total_debit(self, bankaccount):
-        return dict(
-            self.filter(
-                bankaccount=bankaccount,
-                amount__lt=0,
+    def lock_awaiting_banktransactions(self, limit):
+        """
+        Returns up to `limit` awaiting bank transactions scheduled, locked
+        until the end of the current transaction with their bank accounts.
+
+        Bank accounts are claimed first, by primary key order, so that
+        concurrent workers never update balances of the same bank account,
+        which could deadlock. Bank accounts already locked by other
+        transactions are skipped instead of waited for if the database
+        supports it.
+        """
+        # Sort by date instead of last action because last action could be NULL
+        # and postgreSQL sort NULL value as latest.
+        qs = self.get_awaiting_banktransactions().order_by('date')
+
+        bankaccounts = (
+            BankAccount.objects
+            .filter(pk__in=qs.values('bankaccount'))
+            .order_by('pk')
+        )
+        if supports_skip_locked(connection):
+            # Django doesn't support SKIP LOCKED yet.
+            sql, params = bankaccounts.values('pk')[:limit].query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(sql + ' FOR UPDATE SKIP LOCKED', params)
+                pks = [row[0] for row in cursor.fetchall()]
+        else:
+            pks = list(
+                bankaccounts.select_for_update().values_list('pk', flat=True)[:limit]
             )
-            .exclude(status=BankTransactionScheduler.STATUS_INACTIVE)
-            .values_list('type')
-            .annotate(total=Sum('amount'))
+
+        return list(
+            qs
+            .filter(bankaccount__in=pks)
+            .select_related('bankaccount')
+            .select_for_update()[:limit]
         )
 
-    def get_total_credit(self, bankaccount):
-        return dict(
-            self.filter(
-                bankaccount=bankaccount,
-                amount__gt=0,
+    def clone_awaiting_banktransactions(self, batch_size=100, catch_up=False):
+        """
+        Clone awaiting bank transactions scheduled batch by batch, each one
+        locked within its own transaction, until none is left. Returns how
+        many have been processed.
+        """
+        count = 0
+        while True:
+            with transaction.atomic():
+                schedulers = self.lock_awaiting_banktransactions(batch_size)
+                self.clone_batch(schedulers, catch_up=catch_up)
+
+            if not schedulers:
+                return count
+            count += len(schedulers)
+
+    def clone_batch(self, schedulers, catch_up=False):
+        """
+        Clone the bank transactions scheduled given at once. Bank
+        transactions are bulk inserted with balances shifted once per bank
+        account, then schedulers are updated with a single query and the
+        exhausted ones deleted with another one.
+
+        If anything goes wrong, they are cloned one by one instead, so that
+        only the faulty ones are marked as failed.
+        """
+        schedulers = list(schedulers)
+        if not schedulers:
+            return
+
+        now = timezone.now()
+        banktransactions, updates, exhausted = [], {}, []
+
+        for bts in schedulers:
+            dates = bts.get_due_dates(bts.get_date_max(now) if catch_up else None)
+            banktransactions += [bts.build_banktransaction(date_value) for date_value in dates]
+
+            recurrence = bts.recurrence
+            if recurrence is not None:
+                recurrence -= len(dates)
+
+            if recurrence is not None and recurrence <= 0:
+                exhausted.append(bts.pk)
+            else:
+                updates[bts.pk] = (dates[-1], recurrence)
+
+        try:
+            with transaction.atomic():
+                BankTransaction.objects.bulk_create_with_balance(banktransactions)
+
+                if updates:
+                    self.filter(pk__in=updates).update(
+                        date=models.Case(
+                            *[
+                                models.When(pk=pk, then=models.Value(date_value))
+                                for pk, (date_value, recurrence) in updates.items()
+                            ],
+                            output_field=models.DateField()
+                        ),
+                        recurrence=models.Case(
+                            *[
+                                models.When(pk=pk, then=models.Value(recurrence))
+                                for pk, (date_value, recurrence) in updates.items()
+                                if recurrence is not None
+                            ],
+                            default=models.Value(None),
+                            output_field=models.PositiveSmallIntegerField()
+                        ),
+                        last_action=now,
+                        state=BankTransactionScheduler.STATE_FINISHED,
+                    )
+                if exhausted:
+                    self.filter(pk__in=exhausted).delete()
+
+        except Exception:
+            logger.exception(
+                'Error occured while trying to clone a batch of %d scheduled '
+                'bank transactions, cloning them one by one.', len(schedulers),
             )
-            .exclude(status=BankTransactionScheduler.STATUS_INACTIVE)
-            .values_list('type')
-            .annotate(total=Sum('amount'))
+            for bts in schedulers:
+                bts.clone(catch_up=catch_up)
+
+    def get_summary(self, bankaccount):
+        """
+        Returns a dict keyed by the types of the bank transactions scheduled
+        (excluding inactive ones) having amounts, with their total of credits
+        and debits, and the total of the bank transactions not scheduled
+        during the current period of the type (named used). They are
+        computed with a single query.
+        """
+        usages, params = [], []
+        for bts_type, granularity in self.model.GRANULARITIES.items():
+            usages.append("""
+                WHEN %s THEN (
+                    SELECT SUM(bt.amount)
+                    FROM {table} AS bt
+                    WHERE
+                        bt.bankaccount_id = %s
+                        AND bt.date BETWEEN %s AND %s
+                        AND bt.scheduled = %s
+                        AND bt.status <> %s
+                )""")
+            params += [bts_type, bankaccount.pk]
+            params += list(get_date_ranges(timezone.now(), granularity))
+            params += [False, BankTransaction.STATUS_INACTIVE]
+
+        query = """
+            SELECT
+                bts.type,
+                SUM(CASE WHEN bts.amount > 0 THEN bts.amount ELSE 0 END),
+                SUM(CASE WHEN bts.amount < 0 THEN bts.amount ELSE 0 END),
+                CASE bts.type {usages} END
+            FROM {table_scheduler} AS bts
+            WHERE bts.bankaccount_id = %s AND bts.status <> %s
+            GROUP BY bts.type
+            HAVING SUM(CASE WHEN bts.amount <> 0 THEN 1 ELSE 0 END) > 0
+            """.format(
+            usages=''.join(usages).format(table=BankTransaction._meta.db_table),
+            table_scheduler=self.model._meta.db_table,
         )
+        params += [bankaccount.pk, self.model.STATUS_INACTIVE]
+
+        places = Decimal(10) ** -self.model._meta.get_field('amount').decimal_places
+
+        summary = {}
+        with connection.cursor() as cursor:
+            cursor.execute(query, params)
+            for bts_type, credit, debit, used in cursor.fetchall():
+                summary[bts_type] = {
+                    'credit': Decimal(credit).quantize(places),
+                    'debit': Decimal(debit).quantize(places),
+                    'used': Decimal(used or 0).quantize(places),
+                }
+        return summary
 
 
 class BankTransactionScheduler(AbstractBankTransaction):
@@ -83,6 +237,10 @@ class BankTransactionScheduler(AbstractBankTransaction):
         (TYPE_MONTHLY, _('Monthly')),
         (TYPE_WEEKLY, _('Weekly')),
     )
+    GRANULARITIES = {
+        TYPE_MONTHLY: GRANULARITY_MONTH,
+        TYPE_WEEKLY: GRANULARITY_WEEK,
+    }
 
     STATE_WAITING = 'waiting'
     STATE_FINISHED = 'finished'
@@ -134,42 +292,89 @@ class BankTransactionScheduler(AbstractBankTransaction):
             'bankaccount_pk': self.bankaccount.pk
         })
 
-    def clone(self):
+    def get_datedelta(self):
+        if self.type == BankTransactionScheduler.TYPE_MONTHLY:
+            return relativedelta(months=1)
+        elif self.type == BankTransactionScheduler.TYPE_WEEKLY:  # pragma: no branch
+            return timedelta(weeks=1)
+
+    def get_due_dates(self, date_max=None):
+        """
+        Returns the dates of the bank transactions to clone: the next one,
+        followed by the next ones up to the date given, if any, within the
+        recurrence left.
+        """
+        datedelta = self.get_datedelta()
+        dates = [self.date + datedelta]
+
+        while date_max is not None:
+            if self.recurrence is not None and len(dates) >= self.recurrence:
+                break
+
+            # Dates are shifted one by one, as successive clones would do.
+            date_next = dates[-1] + datedelta
+            if date_next > date_max:
+                break
+            dates.append(date_next)
+
+        return dates
+
+    def get_date_max(self, now):
+        """
+        Returns the last date of the current period, up to which missed bank
+        transactions are cloned.
+        """
+        return get_datetime_ranges(now, self.GRANULARITIES[self.type])[1].date()
+
+    def build_banktransaction(self, date_value):
+        """
+        Returns a new bank transaction, not saved yet, based on model.
+        """
+        return BankTransaction(
+            label=self.label,
+            bankaccount=self.bankaccount,
+            date=date_value,
+            amount=self.amount,
+            currency=self.currency,
+            status=self.status,
+            reconciled=False,
+            payment_method=self.payment_method,
+            memo=self.memo,
+            tag_id=self.tag_id,
+            scheduled=True,
+        )
+
+    def clone(self, catch_up=False):
         """
         Clone the model instance into a BankTransaction instance.
+
+        With catch up, every bank transaction missed up to the end of the
+        current period is cloned at once, for example after an outage.
         """
 
         try:
             with transaction.atomic():
 
-                # Create a new bank transaction based on model.
-                if self.type == BankTransactionScheduler.TYPE_MONTHLY:
-                    datedelta = relativedelta(months=1)
-                elif self.type == BankTransactionScheduler.TYPE_WEEKLY:  # pragma: no branch
-                    datedelta = timedelta(weeks=1)
-
-                BankTransaction.objects.create(
-                    label=self.label,
-                    bankaccount=self.bankaccount,
-                    date=self.date + datedelta,
-                    amount=self.amount,
-                    currency=self.currency,
-                    status=self.status,
-                    reconciled=False,
-                    payment_method=self.payment_method,
-                    memo=self.memo,
-                    tag=self.tag,
-                    scheduled=True,
-                )
+                date_max = self.get_date_max(timezone.now()) if catch_up else None
+
+                # Create new bank transactions based on model.
+                banktransactions = [
+                    self.build_banktransaction(date_value)
+                    for date_value in self.get_due_dates(date_max)
+                ]
+                if len(banktransactions) > 1:
+                    BankTransaction.objects.bulk_create_with_balance(banktransactions)
+                else:
+                    banktransactions[0].save()
 
                 # Then update the scheduled bank transaction or delete it.
                 if self.recurrence is not None:
-                    self.recurrence -= 1
+                    self.recurrence -= len(banktransactions)
 
                 if self.recurrence is not None and self.recurrence <= 0:
                     self.delete()
                 else:
-                    self.date = self.date + datedelta
+                    self.date = banktransactions[-1].date
                     self.last_action = timezone.now()
                     self.state = BankTransactionScheduler.STATE_FINISHED
                     self.save()
@@ -1,8 +1,13 @@
 import datetime
+import json
+import os
+import signal
+import tempfile
 import unittest
 from decimal import Decimal
+from unittest import mock
 
-from django.core.management import call_command
+from django.core.management import CommandError, call_command
 from django.utils import timezone
 from django.utils.six import StringIO
 
@@ -10,6 +15,7 @@ from mymoney.apps.bankaccounts.factories import BankAccountFactory
 from mymoney.apps.banktransactions.models import BankTransaction
 
 from ..factories import BankTransactionSchedulerFactory
+from ..management.commands.runscheduler import Command as RunSchedulerCommand
 from ..models import BankTransactionScheduler
 
 
@@ -81,3 +87,147 @@ class CommandTestCase(unittest.TestCase):
             BankTransaction.objects.filter(bankaccount=bankaccount).count(),
             3,
         )
+
+    def test_scheduler_workers(self):
+
+        bankaccount = BankAccountFactory(balance=0)
+        for i in range(5):
+            BankTransactionSchedulerFactory(
+                amount=Decimal(10),
+                bankaccount=bankaccount,
+                date="2015-01-31",
+                last_action=None,
+                state=BankTransactionScheduler.STATE_WAITING,
+            )
+
+        # Batches are cloned until none is left.
+        out = StringIO()
+        call_command('clonescheduled', limit=2, workers=1, stdout=out)
+        self.assertIn('processed by 1 worker(s).', out.getvalue())
+        bankaccount.refresh_from_db()
+        self.assertEqual(bankaccount.balance, Decimal(50))
+        self.assertFalse(
+            BankTransactionScheduler.objects
+            .get_awaiting_banktransactions()
+            .filter(bankaccount=bankaccount)
+            .exists()
+        )
+
+        # Nothing happen.
+        out = StringIO()
+        call_command('clonescheduled', workers=1, stdout=out)
+        self.assertIn('0 scheduled bank transaction processed', out.getvalue())
+
+        with self.assertRaises(CommandError):
+            call_command('clonescheduled', workers=0, stdout=StringIO())
+
+        # Concurrent workers need to skip locked rows.
+        with self.assertRaises(CommandError):
+            call_command('clonescheduled', workers=2, stdout=StringIO())
+
+    def test_scheduler_catch_up(self):
+
+        bankaccount = BankAccountFactory(balance=0)
+        BankTransactionSchedulerFactory(
+            amount=Decimal(10),
+            bankaccount=bankaccount,
+            date=datetime.date.today() - datetime.timedelta(weeks=3),
+            type=BankTransactionScheduler.TYPE_WEEKLY,
+            recurrence=None,
+            last_action=None,
+            state=BankTransactionScheduler.STATE_WAITING,
+        )
+
+        call_command('clonescheduled', catch_up=True, stdout=StringIO())
+        bankaccount.refresh_from_db()
+        self.assertEqual(
+            BankTransaction.objects.filter(bankaccount=bankaccount).count(),
+            3,
+        )
+
+
+class RunSchedulerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.status_file = tempfile.NamedTemporaryFile(suffix='.json', delete=False).name
+
+    def tearDown(self):
+        os.remove(self.status_file)
+
+    def get_status(self):
+        with open(self.status_file) as f:
+            return json.load(f)
+
+    def test_once(self):
+
+        bankaccount = BankAccountFactory(balance=0)
+        BankTransactionSchedulerFactory(
+            amount=Decimal(10),
+            bankaccount=bankaccount,
+            date="2015-01-31",
+            last_action=None,
+            state=BankTransactionScheduler.STATE_WAITING,
+        )
+
+        out = StringIO()
+        call_command('runscheduler', once=True, status_file=self.status_file, stdout=out)
+        self.assertIn('Scheduler stopped after 1 run(s)', out.getvalue())
+        bankaccount.refresh_from_db()
+        self.assertEqual(bankaccount.balance, Decimal(10))
+
+        status = self.get_status()
+        self.assertEqual(status['state'], 'stopped')
+        self.assertEqual(status['runs'], 1)
+        self.assertEqual(status['errors'], 0)
+        self.assertGreaterEqual(status['last_run_cloned'], 1)
+
+    def test_error(self):
+
+        with mock.patch.object(
+                BankTransactionScheduler.objects, 'clone_awaiting_banktransactions',
+                side_effect=Exception('Click-click boom!')):
+            with self.assertLogs(
+                    logger='mymoney.apps.banktransactionschedulers.management.commands.runscheduler',
+                    level='ERROR'):
+                call_command('runscheduler', once=True, status_file=self.status_file,
+                             stdout=StringIO())
+
+        status = self.get_status()
+        self.assertEqual(status['errors'], 1)
+        self.assertIsNone(status['last_run_cloned'])
+
+    def test_sigterm(self):
+
+        # Sleeping is interrupted, then the scheduler stops gracefully.
+        def run(*args, **kwargs):
+            os.kill(os.getpid(), signal.SIGTERM)
+            return 0
+
+        with mock.patch.object(
+                BankTransactionScheduler.objects, 'clone_awaiting_banktransactions',
+                side_effect=run):
+            call_command('runscheduler', status_file=self.status_file, stdout=StringIO())
+
+        status = self.get_status()
+        self.assertEqual(status['state'], 'stopped')
+        self.assertEqual(status['runs'], 1)
+        self.assertIsNone(status['next_run_at'])
+
+    def test_next_run(self):
+
+        command = RunSchedulerCommand()
+        with mock.patch('mymoney.core.utils.dates.get_weekday', return_value=0):
+            now = timezone.make_aware(datetime.datetime(2015, 6, 24, 15))
+            self.assertEqual(
+                command.get_next_run(now),
+                timezone.make_aware(datetime.datetime(2015, 6, 29)),
+            )
+            now = timezone.make_aware(datetime.datetime(2015, 6, 30, 15))
+            self.assertEqual(
+                command.get_next_run(now),
+                timezone.make_aware(datetime.datetime(2015, 7, 1)),
+            )
+            self.assertEqual(
+                command.get_next_run(now, interval=60),
+                timezone.make_aware(datetime.datetime(2015, 6, 30, 15, 1)),
+            )
@@ -3,7 +3,9 @@ import unittest
 from decimal import Decimal
 from unittest.mock import patch
 
+from django.db import connection
 from django.db.models import QuerySet
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
 from mymoney.apps.bankaccounts.factories import BankAccountFactory
@@ -108,6 +110,97 @@ class ModelTestCase(unittest.TestCase):
         bts.refresh_from_db()
         self.assertEqual(bts.date, datetime.date(2015, 4, 9))
 
+    def test_clone_catch_up(self):
+
+        bankaccount = BankAccountFactory(balance=0)
+
+        # Monthly, missed since January.
+        bts = BankTransactionSchedulerFactory(
+            bankaccount=bankaccount,
+            amount=Decimal('-10'),
+            date=datetime.date(2015, 1, 31),
+            type=BankTransactionScheduler.TYPE_MONTHLY,
+            recurrence=None,
+            last_action=timezone.make_aware(datetime.datetime(2015, 1, 31, 10)),
+            state=BankTransactionScheduler.STATE_FINISHED,
+        )
+        with patch('django.utils.timezone.now'):
+            timezone.now.return_value = timezone.make_aware(
+                datetime.datetime(2015, 5, 2, 15),
+            )
+            bts.clone(catch_up=True)
+
+        self.assertListEqual(
+            list(
+                BankTransaction.objects
+                .filter(bankaccount=bankaccount)
+                .order_by('date')
+                .values_list('date', flat=True)
+            ),
+            [
+                datetime.date(2015, 2, 28),
+                datetime.date(2015, 3, 28),
+                datetime.date(2015, 4, 28),
+                datetime.date(2015, 5, 28),
+            ],
+        )
+        bankaccount.refresh_from_db()
+        self.assertEqual(bankaccount.balance, Decimal('-40'))
+
+        bts.refresh_from_db()
+        self.assertEqual(bts.date, datetime.date(2015, 5, 28))
+        self.assertEqual(bts.state, BankTransactionScheduler.STATE_FINISHED)
+
+        # Weekly, within the recurrence left.
+        bts = BankTransactionSchedulerFactory(
+            bankaccount=bankaccount,
+            amount=Decimal('5'),
+            date=datetime.date(2015, 4, 1),
+            type=BankTransactionScheduler.TYPE_WEEKLY,
+            recurrence=3,
+            last_action=None,
+            state=BankTransactionScheduler.STATE_WAITING,
+        )
+        with patch('django.utils.timezone.now'):
+            timezone.now.return_value = timezone.make_aware(
+                datetime.datetime(2015, 5, 2, 15),
+            )
+            bts.clone(catch_up=True)
+
+        self.assertEqual(
+            BankTransaction.objects.filter(
+                bankaccount=bankaccount, amount=Decimal('5'),
+            ).count(),
+            3,
+        )
+        bankaccount.refresh_from_db()
+        self.assertEqual(bankaccount.balance, Decimal('-25'))
+        self.assertFalse(BankTransactionScheduler.objects.filter(pk=bts.pk).exists())
+
+    def test_get_due_dates(self):
+
+        bts = BankTransactionScheduler(
+            date=datetime.date(2015, 1, 31),
+            type=BankTransactionScheduler.TYPE_MONTHLY,
+            recurrence=None,
+        )
+        # The next one is always due.
+        self.assertListEqual(bts.get_due_dates(), [datetime.date(2015, 2, 28)])
+        self.assertListEqual(
+            bts.get_due_dates(datetime.date(2015, 1, 1)),
+            [datetime.date(2015, 2, 28)],
+        )
+        self.assertListEqual(
+            bts.get_due_dates(datetime.date(2015, 3, 28)),
+            [datetime.date(2015, 2, 28), datetime.date(2015, 3, 28)],
+        )
+
+        bts.recurrence = 2
+        self.assertListEqual(
+            bts.get_due_dates(datetime.date(2015, 12, 31)),
+            [datetime.date(2015, 2, 28), datetime.date(2015, 3, 28)],
+        )
+
     @patch.object(BankTransaction, 'save')
     def test_clone_insert_failed(self, save_mock):
         save_mock.side_effect = Exception('Click-click boom!')
@@ -284,93 +377,141 @@ class ManagerTestCase(unittest.TestCase):
                 [bts1.pk],
             )
 
-    def test_total_debit(self):
+    def test_lock_awaiting_bank_transactions(self):
 
-        total = BankTransactionScheduler.objects.get_total_debit(self.bankaccount)
-        self.assertFalse(total)
+        other = BankAccountFactory(balance=0)
+        self.addCleanup(other.delete)
 
-        BankTransactionSchedulerFactory(
-            amount=Decimal('-15'),
+        bts1 = BankTransactionSchedulerFactory(
             bankaccount=self.bankaccount,
-            type=BankTransactionScheduler.TYPE_MONTHLY,
+            date=datetime.date(2015, 6, 1),
+            state=BankTransactionScheduler.STATE_WAITING,
         )
-        BankTransactionSchedulerFactory(
-            amount=Decimal('35'),
-            bankaccount=self.bankaccount,
-            type=BankTransactionScheduler.TYPE_MONTHLY,
+        bts2 = BankTransactionSchedulerFactory(
+            bankaccount=other,
+            date=datetime.date(2015, 3, 1),
+            state=BankTransactionScheduler.STATE_WAITING,
         )
-        BankTransactionSchedulerFactory(
-            amount=Decimal('-30'),
+        bts3 = BankTransactionSchedulerFactory(
             bankaccount=self.bankaccount,
-            type=BankTransactionScheduler.TYPE_MONTHLY,
+            date=datetime.date(2015, 4, 1),
+            state=BankTransactionScheduler.STATE_WAITING,
         )
-        BankTransactionSchedulerFactory(
-            amount=Decimal('-5'),
-            bankaccount=self.bankaccount,
-            type=BankTransactionScheduler.TYPE_WEEKLY,
+
+        # Bank accounts are claimed by primary key, then their bank
+        # transactions scheduled by date.
+        self.assertListEqual(
+            BankTransactionScheduler.objects.lock_awaiting_banktransactions(1),
+            [bts3],
         )
-        # Inactive.
-        BankTransactionSchedulerFactory(
-            amount=Decimal('-5'),
-            bankaccount=self.bankaccount,
-            type=BankTransactionScheduler.TYPE_WEEKLY,
-            status=BankTransactionScheduler.STATUS_INACTIVE,
+        self.assertListEqual(
+            BankTransactionScheduler.objects.lock_awaiting_banktransactions(2),
+            [bts2, bts3],
         )
-        # Not a scheduler, don't count it.
-        BankTransactionFactory(
-            amount=Decimal('-10'),
-            bankaccount=self.bankaccount,
+        self.assertListEqual(
+            BankTransactionScheduler.objects.lock_awaiting_banktransactions(5),
+            [bts2, bts3, bts1],
         )
 
-        total = BankTransactionScheduler.objects.get_total_debit(self.bankaccount)
-        self.assertDictEqual(total, {
-            BankTransactionScheduler.TYPE_MONTHLY: Decimal(-45),
-            BankTransactionScheduler.TYPE_WEEKLY: Decimal(-5),
-        })
 
-    def test_total_credit(self):
+class CloneBatchTestCase(unittest.TestCase):
 
-        total = BankTransactionScheduler.objects.get_total_credit(self.bankaccount)
-        self.assertFalse(total)
+    def create_schedulers(self, bankaccount, count):
+        return [
+            BankTransactionSchedulerFactory(
+                bankaccount=bankaccount,
+                amount=Decimal('-10'),
+                date=datetime.date(2015, 1, 31),
+                type=BankTransactionScheduler.TYPE_MONTHLY,
+                recurrence=recurrence,
+                last_action=None,
+                state=BankTransactionScheduler.STATE_WAITING,
+            )
+            for recurrence in ([None, 1, 3] * count)[:count]
+        ]
 
-        BankTransactionSchedulerFactory(
-            amount=Decimal('15'),
-            bankaccount=self.bankaccount,
-            type=BankTransactionScheduler.TYPE_MONTHLY,
-        )
-        BankTransactionSchedulerFactory(
-            amount=Decimal('-35'),
-            bankaccount=self.bankaccount,
-            type=BankTransactionScheduler.TYPE_MONTHLY,
-        )
-        BankTransactionSchedulerFactory(
-            amount=Decimal('30'),
-            bankaccount=self.bankaccount,
-            type=BankTransactionScheduler.TYPE_MONTHLY,
-        )
-        BankTransactionSchedulerFactory(
-            amount=Decimal('5'),
-            bankaccount=self.bankaccount,
-            type=BankTransactionScheduler.TYPE_WEEKLY,
-        )
-        # Inactive.
-        BankTransactionSchedulerFactory(
-            amount=Decimal('5'),
-            bankaccount=self.bankaccount,
-            type=BankTransactionScheduler.TYPE_WEEKLY,
-            status=BankTransactionScheduler.STATUS_INACTIVE,
-        )
-        # Not a scheduler, don't count it.
-        BankTransactionFactory(
-            amount=Decimal('10'),
-            bankaccount=self.bankaccount,
+    def clone_batch(self, bankaccount, **kwargs):
+        schedulers = BankTransactionScheduler.objects.filter(
+            bankaccount=bankaccount,
+        ).select_related('bankaccount')
+
+        with CaptureQueriesContext(connection) as context:
+            BankTransactionScheduler.objects.clone_batch(schedulers, **kwargs)
+        return len(context.captured_queries)
+
+    def test_clone_batch(self):
+
+        bankaccount = BankAccountFactory(balance=0)
+        bts1, bts2, bts3 = self.create_schedulers(bankaccount, 3)
+
+        self.clone_batch(bankaccount)
+
+        bankaccount.refresh_from_db()
+        self.assertEqual(bankaccount.balance, Decimal('-30'))
+        self.assertListEqual(
+            list(
+                BankTransaction.objects
+                .filter(bankaccount=bankaccount)
+                .values_list('date', 'scheduled', 'reconciled')
+                .distinct()
+            ),
+            [(datetime.date(2015, 2, 28), True, False)],
         )
 
-        total = BankTransactionScheduler.objects.get_total_credit(self.bankaccount)
-        self.assertDictEqual(total, {
-            BankTransactionScheduler.TYPE_MONTHLY: Decimal(45),
-            BankTransactionScheduler.TYPE_WEEKLY: Decimal(5),
-        })
+        # Exhausted ones are deleted, others are moved forward.
+        self.assertFalse(BankTransactionScheduler.objects.filter(pk=bts2.pk).exists())
+        bts1.refresh_from_db()
+        bts3.refresh_from_db()
+        for bts in (bts1, bts3):
+            self.assertEqual(bts.date, datetime.date(2015, 2, 28))
+            self.assertEqual(bts.state, BankTransactionScheduler.STATE_FINISHED)
+            self.assertIsNotNone(bts.last_action)
+        self.assertIsNone(bts1.recurrence)
+        self.assertEqual(bts3.recurrence, 2)
+
+    def test_clone_batch_catch_up(self):
+
+        bankaccount = BankAccountFactory(balance=0)
+        bts = self.create_schedulers(bankaccount, 1)[0]
+
+        with patch('django.utils.timezone.now'):
+            timezone.now.return_value = timezone.make_aware(
+                datetime.datetime(2015, 4, 2, 15),
+            )
+            self.clone_batch(bankaccount, catch_up=True)
+
+        bankaccount.refresh_from_db()
+        self.assertEqual(bankaccount.balance, Decimal('-30'))
+        bts.refresh_from_db()
+        self.assertEqual(bts.date, datetime.date(2015, 4, 28))
+
+    def test_constant_queries(self):
+
+        bankaccount = BankAccountFactory(balance=0)
+        self.create_schedulers(bankaccount, 3)
+        count = self.clone_batch(bankaccount)
+
+        bankaccount = BankAccountFactory(balance=0)
+        self.create_schedulers(bankaccount, 12)
+        self.assertEqual(self.clone_batch(bankaccount), count)
+
+    @patch.object(BankTransaction.objects, 'bulk_create_with_balance')
+    def test_clone_batch_failed(self, bulk_mock):
+        bulk_mock.side_effect = Exception('Click-click boom!')
+
+        bankaccount = BankAccountFactory(balance=0)
+        bts1, bts2 = self.create_schedulers(bankaccount, 2)
+
+        # Cloned one by one instead.
+        with self.assertLogs(logger='mymoney.apps.banktransactionschedulers.models',
+                             level='ERROR'):
+            self.clone_batch(bankaccount)
+
+        bankaccount.refresh_from_db()
+        self.assertEqual(bankaccount.balance, Decimal('-20'))
+        self.assertFalse(BankTransactionScheduler.objects.filter(pk=bts2.pk).exists())
+        bts1.refresh_from_db()
+        self.assertEqual(bts1.state, BankTransactionScheduler.STATE_FINISHED)
 
 
 class RelationshipTestCase(unittest.TestCase):
@@ -14,6 +14,7 @@ from mymoney.apps.banktransactionschedulers.models import (
     BankTransactionScheduler,
 )
 from mymoney.core.factories import UserFactory
+from mymoney.core.querybudgets import QueryBudgetTestMixin
 
 from ..factories import BankTransactionSchedulerFactory
 
@@ -414,3 +415,41 @@ class WebViewTestCase(WebTest):
         response = self.app.get(url, user='owner')
         with self.assertRaises(IndexError):
             response.click(href=delete_url)
+
+
+@modify_settings(MIDDLEWARE={
+    'remove': ['mymoney.core.middleware.AnonymousRedirectMiddleware'],
+})
+class QueryBudgetTestCase(QueryBudgetTestMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = UserFactory(username='owner')
+        cls.bankaccount = BankAccountFactory(owners=[cls.owner])
+        BankTransactionSchedulerFactory(bankaccount=cls.bankaccount)
+
+    def setUp(self):
+        self.client.force_login(self.owner)
+
+    def grow(self, size=20):
+        def grow():
+            for i in range(size):
+                BankTransactionSchedulerFactory(
+                    bankaccount=self.bankaccount,
+                    type=BankTransactionScheduler.TYPES[i % 2][0],
+                    amount=Decimal(i - 10),
+                )
+                BankTransactionFactory(bankaccount=self.bankaccount)
+        return grow
+
+    def test_list(self):
+        url = reverse('banktransactionschedulers:list', kwargs={
+            'bankaccount_pk': self.bankaccount.pk,
+        })
+        self.assertConstantQueries(lambda: self.client.get(url), self.grow())
+
+    def test_summary_single_query(self):
+        BankTransactionSchedulerFactory(bankaccount=self.bankaccount, amount=Decimal(10))
+
+        with self.assertNumQueries(1):
+            BankTransactionScheduler.objects.get_summary(self.bankaccount)
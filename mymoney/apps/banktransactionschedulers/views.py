@@ -8,8 +8,6 @@ from django.views import generic
 from mymoney.apps.banktransactions.mixins import (
     BankTransactionAccessMixin, BankTransactionSaveViewMixin,
 )
-from mymoney.apps.banktransactions.models import BankTransaction
-from mymoney.core.utils.dates import GRANULARITY_MONTH, GRANULARITY_WEEK
 
 from .forms import (
     BankTransactionSchedulerCreateForm, BankTransactionSchedulerUpdateForm,
@@ -34,35 +32,17 @@ class BankTransactionSchedulerListView(BankTransactionAccessMixin,
         context = super(BankTransactionSchedulerListView, self).get_context_data(**kwargs)
         context['bankaccount'] = self.bankaccount
 
-        totals, summary = {}, {}
-        manager = BankTransactionScheduler.objects
-
-        total = 0
-        totals['debit'] = manager.get_total_debit(self.bankaccount)
-        totals['credit'] = manager.get_total_credit(self.bankaccount)
-
-        for bts_type in BankTransactionScheduler.TYPES:
-            key = bts_type[0]
-            if key in totals['debit'] or key in totals['credit']:
-
-                if key == BankTransactionScheduler.TYPE_WEEKLY:
-                    granularity = GRANULARITY_WEEK
-                else:
-                    granularity = GRANULARITY_MONTH
-
-                total_credit = totals['credit'].get(key, 0)
-                total_debit = totals['debit'].get(key, 0)
-                used = BankTransaction.objects.get_total_unscheduled_period(
-                    self.bankaccount, granularity) or 0
-
-                summary[key] = {
-                    'type': bts_type[1],
-                    'credit': total_credit,
-                    'debit': total_debit,
-                    'used': used,
-                    'remaining': total_credit + total_debit + used,
-                }
-                summary[key]['total'] = total_credit + total_debit
+        summary, total = {}, 0
+        totals = BankTransactionScheduler.objects.get_summary(self.bankaccount)
+
+        for key, label in BankTransactionScheduler.TYPES:
+            if key in totals:
+                summary[key] = dict(
+                    totals[key],
+                    type=label,
+                    remaining=sum(totals[key].values()),
+                    total=totals[key]['credit'] + totals[key]['debit'],
+                )
                 total += summary[key]['total']
 
         context['summary'] = summary
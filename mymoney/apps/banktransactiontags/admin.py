@@ -1,6 +1,11 @@
 from django.contrib import admin
 
-from .models import BankTransactionTag
+from .models import BankTransactionTag, BankTransactionTagRule
+
+
+class BankTransactionTagRuleInline(admin.TabularInline):
+    model = BankTransactionTagRule
+    extra = 0
 
 
 class BankTransactionTagAdmin(admin.ModelAdmin):
@@ -8,6 +13,7 @@ class BankTransactionTagAdmin(admin.ModelAdmin):
     list_display_links = ['name']
     ordering = ['name', 'owner']
     search_fields = ['name']
+    inlines = [BankTransactionTagRuleInline]
 
 
 admin.site.register(BankTransactionTag, BankTransactionTagAdmin)
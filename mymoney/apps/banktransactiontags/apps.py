@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class BankTransactionTagConfig(AppConfig):
     name = 'mymoney.apps.banktransactiontags'
     verbose_name = "Bank transaction tags"
+
+    def ready(self):
+        import mymoney.apps.banktransactiontags.signals.handlers  # noqa
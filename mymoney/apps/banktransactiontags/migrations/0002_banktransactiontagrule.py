@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.8 on 2026-10-18 02:10
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import mymoney.apps.banktransactiontags.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banktransactiontags', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BankTransactionTagRule',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('label_contains', models.CharField(blank=True, help_text='Case insensitive.', max_length=255, verbose_name='Label contains')),
+                ('label_regex', models.CharField(blank=True, help_text='Case insensitive.', max_length=255, validators=[mymoney.apps.banktransactiontags.models.validate_regex], verbose_name='Label regular expression')),
+                ('amount_min', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Minimum amount')),
+                ('amount_max', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Maximum amount')),
+                ('payment_method', models.CharField(blank=True, max_length=32, verbose_name='Payment method')),
+                ('priority', models.PositiveSmallIntegerField(default=0, help_text='Rules with the lowest priority are applied first.', verbose_name='Priority')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rules', to='banktransactiontags.BankTransactionTag', verbose_name='Tag')),
+            ],
+            options={
+                'db_table': 'banktransactiontags_rules',
+                'default_permissions': (),
+            },
+        ),
+    ]
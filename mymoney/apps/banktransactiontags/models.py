@@ -1,11 +1,18 @@
+import re
+import uuid
+
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.urls import reverse
 from django.utils.translation import ugettext_lazy as _
 
 from mymoney.apps.bankaccounts.models import BankAccount
 
+from .rules import TagMatcher
+
 
 class BankTransactionTagManager(models.Manager):
 
@@ -58,3 +65,112 @@ class BankTransactionTag(models.Model):
 
     def get_absolute_url(self):
         return reverse('banktransactiontags:list')
+
+
+def validate_regex(value):
+    try:
+        re.compile(value)
+    except re.error as e:
+        raise ValidationError(
+            _('Invalid regular expression: %(error)s'),
+            params={'error': e},
+            code='invalid_regex',
+        )
+
+
+class BankTransactionTagRuleManager(models.Manager):
+
+    _cache_version_key = 'banktransactiontagrules_version'
+
+    def get_matcher(self, users):
+        """
+        Returns the rules of tags owned by the users given, compiled into a
+        single matcher. It is cached until any rule changes.
+        """
+        user_pks = sorted(getattr(user, 'pk', user) for user in users)
+
+        version = cache.get(self._cache_version_key)
+        if version is None:
+            version = uuid.uuid4().hex
+            cache.set(self._cache_version_key, version, None)
+
+        key = 'banktransactiontagrules:{}:{}'.format(
+            version, '-'.join(str(pk) for pk in user_pks),
+        )
+        matcher = cache.get(key)
+
+        if matcher is None:
+            matcher = TagMatcher(
+                self
+                .filter(tag__owner__in=user_pks)
+                .order_by('priority', 'pk')
+                .values_list(
+                    'pk', 'tag_id', 'label_contains', 'label_regex',
+                    'amount_min', 'amount_max', 'payment_method',
+                )
+            )
+            cache.set(key, matcher)
+
+        return matcher
+
+    def clear_matchers_cache(self):
+        cache.delete(self._cache_version_key)
+
+
+class BankTransactionTagRule(models.Model):
+    """
+    Conditions which must all be satisfied by a bank transaction to be
+    tagged automatically.
+    """
+    tag = models.ForeignKey(
+        BankTransactionTag,
+        related_name='rules',
+        on_delete=models.CASCADE,
+        verbose_name=_('Tag'),
+    )
+    label_contains = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name=_('Label contains'),
+        help_text=_('Case insensitive.'),
+    )
+    label_regex = models.CharField(
+        max_length=255,
+        blank=True,
+        validators=[validate_regex],
+        verbose_name=_('Label regular expression'),
+        help_text=_('Case insensitive.'),
+    )
+    amount_min = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        blank=True,
+        null=True,
+        verbose_name=_('Minimum amount'),
+    )
+    amount_max = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        blank=True,
+        null=True,
+        verbose_name=_('Maximum amount'),
+    )
+    payment_method = models.CharField(
+        max_length=32,
+        blank=True,
+        verbose_name=_('Payment method'),
+    )
+    priority = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name=_('Priority'),
+        help_text=_('Rules with the lowest priority are applied first.'),
+    )
+
+    objects = BankTransactionTagRuleManager()
+
+    class Meta:
+        db_table = 'banktransactiontags_rules'
+        default_permissions = ()
+
+    def __str__(self):
+        return str(self.tag)
@@ -0,0 +1,98 @@
+import re
+
+try:  # Python 3.11+, where the sre_* aliases are deprecated.
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:
+    import sre_constants
+    import sre_parse
+
+REGEX_FLAGS = re.IGNORECASE | re.DOTALL
+
+
+def is_combinable(pattern):
+    """
+    Returns whether the pattern given could be combined with other ones into
+    a single regex: backreferences and named groups would refer to groups of
+    other rules, and inline global flags would apply to all rules.
+    """
+    parsed = sre_parse.parse(pattern)
+    # Parsing state was renamed on Python 3.8.
+    state = parsed.state if hasattr(parsed, 'state') else parsed.pattern
+    if state.flags & ~sre_constants.SRE_FLAG_UNICODE or state.groupdict:
+        return False
+
+    items = list(parsed)
+    while items:
+        item = items.pop()
+        # Opcodes are singletons, unlike the integers of their arguments.
+        if item is sre_constants.GROUPREF or item is sre_constants.GROUPREF_EXISTS:
+            return False
+        if isinstance(item, (tuple, list, sre_parse.SubPattern)):
+            items.extend(item)
+    return True
+
+
+class TagMatcher(object):
+    """
+    Rules compiled into a single matcher. Each label condition of the rules
+    is an optional lookahead of one combined regex, capturing a named group
+    if it matches. Thus a label is matched once against a single regex to
+    know every rules it satisfies, no matter how many rules there are,
+    although each lookahead still scans it from the beginning.
+
+    Regex which couldn't be combined (i.e: with backreferences or global
+    inline flags) are matched on their own instead.
+    """
+
+    def __init__(self, rules):
+        """
+        Rules are tuples of (pk, tag_id, label_contains, label_regex,
+        amount_min, amount_max, payment_method), ordered by priority.
+        """
+        self.rules = []
+        patterns = []
+
+        for pk, tag_id, contains, regex, amount_min, amount_max, payment_method in rules:
+            groups, regexes = [], []
+            for prefix, pattern in (('c', re.escape(contains or '')), ('r', regex)):
+                if not pattern:
+                    continue
+                if not is_combinable(pattern):
+                    regexes.append(re.compile(pattern, REGEX_FLAGS))
+                    continue
+
+                group = '{}{}'.format(prefix, pk)
+                patterns.append('(?:(?=.*?(?P<{}>{})))?'.format(group, pattern))
+                groups.append(group)
+
+            self.rules.append(
+                (tag_id, groups, regexes, amount_min, amount_max, payment_method)
+            )
+
+        self.regex = None
+        if patterns:
+            self.regex = re.compile(''.join(patterns), REGEX_FLAGS)
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    def match(self, label, amount, payment_method):
+        """
+        Returns the tag primary key of the first rule satisfied, or None.
+        """
+        groups = self.regex.match(label).groupdict() if self.regex else {}
+
+        for tag_id, rule_groups, regexes, amount_min, amount_max, rule_payment_method in self.rules:
+            if any(groups[group] is None for group in rule_groups):
+                continue
+            if amount_min is not None and amount < amount_min:
+                continue
+            if amount_max is not None and amount > amount_max:
+                continue
+            if rule_payment_method and payment_method != rule_payment_method:
+                continue
+            if not all(regex.search(label) for regex in regexes):
+                continue
+            return tag_id
+
+        return None
@@ -0,0 +1,15 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from ..models import BankTransactionTag, BankTransactionTagRule
+
+
+@receiver(post_save, sender=BankTransactionTagRule)
+@receiver(post_delete, sender=BankTransactionTagRule)
+@receiver(post_save, sender=BankTransactionTag)
+def clear_matchers_cache(sender, **kwargs):
+    """
+    Compiled rules are outdated once a rule changes, or a tag changes of
+    owner.
+    """
+    BankTransactionTagRule.objects.clear_matchers_cache()
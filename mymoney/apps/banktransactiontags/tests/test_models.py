@@ -1,10 +1,14 @@
 import unittest
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
 
 from mymoney.apps.bankaccounts.factories import BankAccountFactory
 from mymoney.core.factories import UserFactory
 
 from ..factories import BankTransactionTagFactory
-from ..models import BankTransactionTag
+from ..models import BankTransactionTag, BankTransactionTagRule
+from ..rules import TagMatcher, is_combinable
 
 
 class ManagerTestCase(unittest.TestCase):
@@ -55,3 +59,100 @@ class RelationshipTestCase(unittest.TestCase):
         owner.delete()
         with self.assertRaises(BankTransactionTag.DoesNotExist):
             banktransactiontag.refresh_from_db()
+
+
+class TagRuleTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.owner = UserFactory(username='owner')
+        self.other = UserFactory(username='other')
+        self.tags = [
+            BankTransactionTagFactory(owner=self.owner),
+            BankTransactionTagFactory(owner=self.owner),
+            BankTransactionTagFactory(owner=self.other),
+        ]
+
+    def tearDown(self):
+        UserFactory._meta.model.objects.all().delete()
+
+    def test_matcher(self):
+
+        matcher = TagMatcher([
+            (1, 10, 'carrefour', '', None, Decimal('-50'), ''),
+            (2, 20, 'carrefour', '', None, None, ''),
+            (3, 30, '', r'^sncf\s+\d+', None, None, 'credit_card'),
+            (4, 40, '', '', Decimal('1000'), None, 'transfer'),
+        ])
+
+        self.assertEqual(matcher.match('CB CARREFOUR MARKET', Decimal('-75'), 'cash'), 10)
+        self.assertEqual(matcher.match('CB CARREFOUR MARKET', Decimal('-15'), 'cash'), 20)
+        self.assertEqual(matcher.match('SNCF 1234', Decimal('-15'), 'credit_card'), 30)
+        self.assertIsNone(matcher.match('SNCF 1234', Decimal('-15'), 'cash'))
+        self.assertIsNone(matcher.match('Paris SNCF 1234', Decimal('-15'), 'credit_card'))
+        self.assertEqual(matcher.match('Salary', Decimal('2000'), 'transfer'), 40)
+        self.assertIsNone(matcher.match('Salary', Decimal('200'), 'transfer'))
+
+        self.assertFalse(TagMatcher([]))
+        self.assertIsNone(TagMatcher([]).match('foo', Decimal('1'), 'cash'))
+
+    def test_matcher_not_combined(self):
+
+        # Stored before being rejected, they are matched on their own.
+        matcher = TagMatcher([
+            (1, 10, '', r'(ab)\1', None, None, ''),
+            (2, 20, 'bar', r'(?m)^foo$', None, None, ''),
+            (3, 30, '', r'(?P<x>b)(?P=x)', None, None, ''),
+            (4, 40, '', r'^b', None, None, ''),
+        ])
+
+        self.assertEqual(matcher.match('ABab', Decimal('1'), 'cash'), 10)
+        self.assertEqual(matcher.match('bar\nfoo', Decimal('1'), 'cash'), 20)
+        self.assertIsNone(matcher.match('a bar foo', Decimal('1'), 'cash'))
+        self.assertEqual(matcher.match('abb', Decimal('1'), 'cash'), 30)
+        self.assertEqual(matcher.match('bar', Decimal('1'), 'cash'), 40)
+        self.assertIsNone(matcher.match('ab', Decimal('1'), 'cash'))
+
+    def test_is_combinable(self):
+
+        for regex in (r'foo', r'(foo)(bar)', r'(?:a|b)+c'):
+            self.assertTrue(is_combinable(regex))
+        for regex in (r'(ab)\1', r'(?m)^foo$', r'(a)?(?(1)b|c)', r'(?P<x>b)'):
+            self.assertFalse(is_combinable(regex))
+
+    def test_get_matcher(self):
+
+        BankTransactionTagRule.objects.create(
+            tag=self.tags[0], label_contains='foo', priority=1,
+        )
+        BankTransactionTagRule.objects.create(
+            tag=self.tags[2], label_contains='foo',
+        )
+
+        matcher = BankTransactionTagRule.objects.get_matcher([self.owner])
+        self.assertEqual(matcher.match('foo', Decimal('1'), 'cash'), self.tags[0].pk)
+
+        # Cache is cleared once rules are changed.
+        rule = BankTransactionTagRule.objects.create(
+            tag=self.tags[1], label_contains='foo',
+        )
+        matcher = BankTransactionTagRule.objects.get_matcher([self.owner])
+        self.assertEqual(matcher.match('foo', Decimal('1'), 'cash'), self.tags[1].pk)
+
+        rule.delete()
+        matcher = BankTransactionTagRule.objects.get_matcher([self.owner.pk])
+        self.assertEqual(matcher.match('foo', Decimal('1'), 'cash'), self.tags[0].pk)
+
+        # Rules of every users given are merged.
+        matcher = BankTransactionTagRule.objects.get_matcher([self.owner, self.other])
+        self.assertEqual(matcher.match('foo', Decimal('1'), 'cash'), self.tags[2].pk)
+
+    def test_invalid_regex(self):
+
+        rule = BankTransactionTagRule(tag=self.tags[0], label_regex='foo(')
+        with self.assertRaises(ValidationError):
+            rule.full_clean()
+
+        # Valid, even if some couldn't be combined with other rules.
+        for regex in (r'(ab)\1', r'(?m)^foo$', r'(a)?(?(1)b|c)', r'(foo)(bar)'):
+            rule = BankTransactionTagRule(tag=self.tags[0], label_regex=regex)
+            rule.full_clean()
@@ -0,0 +1,4 @@
+"""
+Benchmarks of the hot paths on fixed-size datasets, run with the
+``runbenchmarks`` management command.
+"""
@@ -0,0 +1,67 @@
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.utils.six import StringIO
+
+from mymoney.apps.bankaccounts.models import BankAccount
+from mymoney.apps.banktransactions.models import BankTransaction
+from mymoney.apps.banktransactionschedulers.factories import (
+    BankTransactionSchedulerFactory,
+)
+from mymoney.apps.banktransactionschedulers.models import (
+    BankTransactionScheduler,
+)
+
+USERNAME = 'benchmark'
+
+
+class Dataset(object):
+    """
+    Data on which scenarios are run.
+    """
+
+    def __init__(self, size, user, bankaccount):
+        self.size = size
+        self.user = user
+        self.bankaccount = bankaccount
+
+
+def delete_dataset():
+    user_model = get_user_model()
+    BankAccount.objects.filter(owners__username=USERNAME).delete()
+    user_model.objects.filter(username=USERNAME).delete()
+
+
+def seed_dataset(size, seed=0, schedulers=100):
+    """
+    Replace the previous dataset by a new one of a single bank account holding
+    the number of bank transactions given. The same seed always produces the
+    same dataset.
+    """
+    delete_dataset()
+
+    call_command(
+        'demo',
+        username=USERNAME,
+        interactive=False,
+        accounts=1,
+        transactions_per_account=size,
+        years=max(1, size // 50000),
+        seed=seed,
+        stdout=StringIO(),
+    )
+
+    user = get_user_model().objects.get(username=USERNAME)
+    # The synthetic bank account is always created after the demo one.
+    bankaccount = BankAccount.objects.filter(owners=user).order_by('-pk')[0]
+
+    for i in range(schedulers):
+        BankTransactionSchedulerFactory(
+            bankaccount=bankaccount,
+            label='Scheduled %d' % i,
+            status=BankTransaction.STATUS_ACTIVE,
+            type=BankTransactionScheduler.TYPE_MONTHLY,
+            recurrence=None,
+            state=BankTransactionScheduler.STATE_WAITING,
+        )
+
+    return Dataset(size, user, bankaccount)
@@ -0,0 +1,128 @@
+import math
+import os
+import platform
+import time
+import tracemalloc
+from collections import OrderedDict
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .datasets import delete_dataset, seed_dataset
+from .scenarios import SCENARIOS
+
+# Baseline stored along with the code, compared with by default.
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+
+def percentile(values, percent):
+    """
+    Nearest-rank percentile of the values given.
+    """
+    values = sorted(values)
+    rank = int(math.ceil(percent / 100.0 * len(values)))
+    return values[max(rank, 1) - 1]
+
+
+def measure(scenario, repeat=10, warmup=1):
+    """
+    Return latencies percentiles in milliseconds, then the number of queries
+    and the peak of memory allocated in bytes by a single run.
+
+    Memory is traced by a separate run, because tracing slows down a lot
+    allocations and would distort timings.
+    """
+    for i in range(warmup):
+        scenario.setup()
+        scenario.run()
+
+    timings = []
+    for i in range(repeat):
+        scenario.setup()
+        start = time.perf_counter()
+        scenario.run()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    scenario.setup()
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as context:
+            scenario.run()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return OrderedDict((
+        ('p50', round(percentile(timings, 50), 3)),
+        ('p95', round(percentile(timings, 95), 3)),
+        ('queries', len(context.captured_queries)),
+        ('peak_memory', peak_memory),
+    ))
+
+
+def run_benchmarks(sizes, scenarios=None, repeat=10, seed=0, log=None):
+    """
+    Seed a dataset for each size given and measure each scenario on it.
+    """
+    scenarios = scenarios or list(SCENARIOS)
+    results = OrderedDict((
+        ('meta', OrderedDict((
+            ('database', connection.vendor),
+            ('python', platform.python_version()),
+            ('repeat', repeat),
+            ('seed', seed),
+        ))),
+        ('results', OrderedDict()),
+    ))
+
+    try:
+        for size in sizes:
+            if log:
+                log("Seeding {size} bank transactions...".format(size=size))
+            dataset = seed_dataset(size, seed=seed)
+
+            metrics = results['results'][str(size)] = OrderedDict()
+            for name in scenarios:
+                if log:
+                    log("Running {name}...".format(name=name))
+                metrics[name] = measure(SCENARIOS[name](dataset), repeat=repeat)
+    finally:
+        delete_dataset()
+
+    return results
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Return regressions of the results against the baseline given, as
+    messages. Latencies and memory could grow up to the tolerance ratio
+    given, but any extra query is a regression.
+    """
+    regressions = []
+
+    for size, metrics in sorted(results['results'].items()):
+        baseline_metrics = baseline.get('results', {}).get(size, {})
+
+        for name, values in metrics.items():
+            if name not in baseline_metrics:
+                continue
+            reference = baseline_metrics[name]
+
+            for key in ('p50', 'p95', 'peak_memory'):
+                if values[key] > reference[key] * (1 + tolerance):
+                    regressions.append(
+                        "{size}/{name}: {key} {value} > {reference}".format(
+                            size=size, name=name, key=key,
+                            value=values[key], reference=reference[key],
+                        )
+                    )
+
+            if values['queries'] > reference['queries']:
+                regressions.append(
+                    "{size}/{name}: queries {value} > {reference}".format(
+                        size=size, name=name,
+                        value=values['queries'], reference=reference['queries'],
+                    )
+                )
+
+    return regressions
@@ -0,0 +1,209 @@
+import calendar
+import datetime
+from collections import OrderedDict
+
+from django.core.management import call_command
+from django.db import models
+from django.test import Client
+from django.urls import reverse
+from django.utils.six import StringIO
+
+from mymoney.apps.bankaccounts.models import BankAccount
+from mymoney.apps.banktransactionanalytics.forms import (
+    RatioForm, TrendtimeForm,
+)
+from mymoney.apps.banktransactions.models import BankTransaction
+from mymoney.apps.banktransactionschedulers.models import (
+    BankTransactionScheduler,
+)
+from mymoney.core.paginators import KeysetPaginator
+from mymoney.core.utils.dates import GRANULARITY_MONTH
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+class Scenario(object):
+    """
+    Base class of a benchmarked operation. Only run() is measured, setup() is
+    called before each run to restore the initial state if needed.
+    """
+    name = None
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.client = Client()
+        self.client.force_login(dataset.user)
+
+    def setup(self):
+        pass
+
+    def run(self):
+        raise NotImplementedError
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        if response.status_code != 200:
+            raise BenchmarkError(
+                "Scenario {name} got a {status} response.".format(
+                    name=self.name, status=response.status_code,
+                )
+            )
+        return response
+
+    def set_session(self, key, value):
+        session = self.client.session
+        session[key] = value
+        session.save()
+
+
+class BankTransactionListFirstPage(Scenario):
+    name = 'banktransactions_list_first_page'
+
+    def run(self):
+        self.get(reverse('banktransactions:list', kwargs={
+            'bankaccount_pk': self.dataset.bankaccount.pk,
+        }))
+
+
+class BankTransactionListDeepPage(Scenario):
+    name = 'banktransactions_list_deep_page'
+
+    def __init__(self, dataset):
+        super(BankTransactionListDeepPage, self).__init__(dataset)
+
+        # Seek right after the row at 90% of the list.
+        qs = BankTransaction.objects.filter(bankaccount=dataset.bankaccount)
+        paginator = KeysetPaginator(qs, per_page=50)
+        obj = (
+            qs.order_by(*paginator.ordering).only('date', 'id')
+            [paginator.count * 9 // 10]
+        )
+        self.cursor = paginator.encode_cursor(paginator.CURSOR_NEXT, obj)
+
+    def run(self):
+        self.get(reverse('banktransactions:list', kwargs={
+            'bankaccount_pk': self.dataset.bankaccount.pk,
+        }), cursor=self.cursor)
+
+
+class BankTransactionCalendarEventsMonth(Scenario):
+    name = 'banktransactions_calendar_events_month'
+
+    def run(self):
+        today = datetime.date.today()
+        date_start = today.replace(day=1)
+        date_end = today.replace(
+            day=calendar.monthrange(today.year, today.month)[1],
+        )
+        self.get(
+            reverse('banktransactions:calendar_ajax_events', kwargs={
+                'bankaccount_pk': self.dataset.bankaccount.pk,
+            }),
+            **{
+                'from': calendar.timegm(date_start.timetuple()) * 1000,
+                'to': calendar.timegm(date_end.timetuple()) * 1000,
+            }
+        )
+
+
+class Ratio(Scenario):
+    name = 'banktransactionanalytics_ratio'
+
+    def setup(self):
+        # Measure the computation, not the analytics cache.
+        BankAccount.objects.bump_data_version(self.dataset.bankaccount.pk)
+
+        today = datetime.date.today()
+        self.set_session('banktransactionanalyticratioform', {
+            'filters': {
+                'type': RatioForm.SUM_DEBIT,
+                'chart': RatioForm.CHART_DOUGHNUT,
+                'date_start': str(today.replace(year=today.year - 1)),
+                'date_end': str(today),
+            },
+        })
+
+    def run(self):
+        self.get(reverse('banktransactionanalytics:ratio', kwargs={
+            'bankaccount_pk': self.dataset.bankaccount.pk,
+        }))
+
+
+class TrendTime(Scenario):
+    name = 'banktransactionanalytics_trendtime'
+
+    def setup(self):
+        # Measure the computation, not the analytics cache.
+        BankAccount.objects.bump_data_version(self.dataset.bankaccount.pk)
+
+        today = datetime.date.today()
+        self.set_session('banktransactionanalytictrendtimeform', {
+            'filters': {
+                'chart': TrendtimeForm.CHART_LINE,
+                'granularity': GRANULARITY_MONTH,
+                'date': str(today),
+                'date_kwargs': {
+                    'year': today.year,
+                    'month': today.month,
+                    'day': today.day,
+                },
+            },
+        })
+
+    def run(self):
+        self.get(reverse('banktransactionanalytics:trendtime', kwargs={
+            'bankaccount_pk': self.dataset.bankaccount.pk,
+        }))
+
+
+class CloneScheduled(Scenario):
+    name = 'clonescheduled'
+
+    def __init__(self, dataset):
+        super(CloneScheduled, self).__init__(dataset)
+
+        self.last_pk = (
+            BankTransaction.objects.order_by('-pk')
+            .values_list('pk', flat=True).first() or 0
+        )
+        self.schedulers = BankTransactionScheduler.objects.filter(
+            bankaccount=dataset.bankaccount,
+        )
+        self.dates = dict(self.schedulers.values_list('pk', 'date'))
+
+    def setup(self):
+        # Each run must clone the same bank transactions, so the previous
+        # clones are deleted and schedulers are moved back.
+        BankTransaction.objects.bulk_delete_with_balance(
+            BankTransaction.objects
+            .filter(bankaccount=self.dataset.bankaccount, pk__gt=self.last_pk)
+            .values_list('pk', flat=True)
+        )
+        if self.dates:
+            self.schedulers.update(
+                state=BankTransactionScheduler.STATE_WAITING,
+                date=models.Case(
+                    *[
+                        models.When(pk=pk, then=models.Value(date_value))
+                        for pk, date_value in self.dates.items()
+                    ],
+                    output_field=models.DateField()
+                ),
+            )
+
+    def run(self):
+        call_command('clonescheduled', stdout=StringIO())
+
+
+SCENARIOS = OrderedDict(
+    (scenario.name, scenario) for scenario in (
+        BankTransactionListFirstPage,
+        BankTransactionListDeepPage,
+        BankTransactionCalendarEventsMonth,
+        Ratio,
+        TrendTime,
+        CloneScheduled,
+    )
+)
@@ -0,0 +1,132 @@
+import json
+import unittest
+
+from django.contrib.auth import get_user_model
+
+from mymoney.apps.bankaccounts.models import BankAccount
+from mymoney.apps.banktransactions.models import BankTransaction
+
+from ..datasets import USERNAME, delete_dataset, seed_dataset
+from ..runner import BASELINE, compare, percentile, run_benchmarks
+from ..scenarios import SCENARIOS, CloneScheduled
+
+
+class PercentileTestCase(unittest.TestCase):
+
+    def test_nearest_rank(self):
+        values = [15, 20, 35, 40, 50]
+        self.assertEqual(percentile(values, 5), 15)
+        self.assertEqual(percentile(values, 30), 20)
+        self.assertEqual(percentile(values, 50), 35)
+        self.assertEqual(percentile(values, 95), 50)
+        self.assertEqual(percentile(values, 100), 50)
+
+    def test_single_value(self):
+        self.assertEqual(percentile([3], 50), 3)
+        self.assertEqual(percentile([3], 95), 3)
+
+
+class CompareTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.baseline = {
+            'results': {
+                '100': {
+                    'foo': {
+                        'p50': 10, 'p95': 20, 'queries': 5,
+                        'peak_memory': 1000,
+                    },
+                },
+            },
+        }
+
+    def get_results(self, **values):
+        metrics = {'p50': 10, 'p95': 20, 'queries': 5, 'peak_memory': 1000}
+        metrics.update(values)
+        return {'results': {'100': {'foo': metrics, 'bar': metrics}}}
+
+    def test_no_regression(self):
+        results = self.get_results(p50=11.9, p95=23.9, peak_memory=1199)
+        self.assertEqual(compare(results, self.baseline), [])
+
+        results = self.get_results(queries=4, p95=1)
+        self.assertEqual(compare(results, self.baseline), [])
+
+    def test_latency(self):
+        results = self.get_results(p95=25)
+        self.assertEqual(
+            compare(results, self.baseline),
+            ['100/foo: p95 25 > 20'],
+        )
+        self.assertEqual(compare(results, self.baseline, tolerance=0.5), [])
+
+    def test_queries(self):
+        results = self.get_results(queries=6)
+        self.assertEqual(
+            compare(results, self.baseline, tolerance=1),
+            ['100/foo: queries 6 > 5'],
+        )
+
+    def test_memory(self):
+        results = self.get_results(peak_memory=2000)
+        self.assertEqual(
+            compare(results, self.baseline),
+            ['100/foo: peak_memory 2000 > 1000'],
+        )
+
+    def test_missing_baseline(self):
+        results = self.get_results(p95=100)
+        self.assertEqual(compare(results, {}), [])
+
+    def test_stored_baseline(self):
+        with open(BASELINE) as f:
+            baseline = json.load(f)
+        # Every scenario is measured at the default size.
+        self.assertEqual(list(baseline['results']['10000']), list(SCENARIOS))
+
+
+class RunBenchmarksTestCase(unittest.TestCase):
+
+    def test_run(self):
+        results = run_benchmarks([60], repeat=2)
+
+        self.assertEqual(results['meta']['repeat'], 2)
+        self.assertEqual(list(results['results']), ['60'])
+        metrics = results['results']['60']
+        self.assertEqual(list(metrics), list(SCENARIOS))
+
+        for values in metrics.values():
+            self.assertLessEqual(values['p50'], values['p95'])
+            self.assertGreater(values['queries'], 0)
+            self.assertGreater(values['peak_memory'], 0)
+
+        # The dataset is deleted once done.
+        self.assertFalse(
+            get_user_model().objects.filter(username=USERNAME).exists())
+        self.assertFalse(
+            BankAccount.objects.filter(owners__username=USERNAME).exists())
+
+
+class CloneScheduledTestCase(unittest.TestCase):
+
+    def tearDown(self):
+        delete_dataset()
+
+    def test_setup(self):
+        dataset = seed_dataset(60, schedulers=3)
+        scenario = CloneScheduled(dataset)
+
+        def run():
+            scenario.setup()
+            scenario.run()
+            dataset.bankaccount.refresh_from_db()
+            return (
+                BankTransaction.objects.filter(bankaccount=dataset.bankaccount).count(),
+                dataset.bankaccount.balance,
+            )
+
+        # Each run clones the same bank transactions from the same state.
+        first = run()
+        self.assertEqual(first[0], 63)
+        self.assertEqual(run(), first)
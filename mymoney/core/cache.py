@@ -0,0 +1,51 @@
+import hashlib
+import json
+import pickle
+
+from django.conf import settings
+from django.core.cache import caches
+
+_payload_key = 'analytics:{namespace}:{bankaccount_id}:{version}:{fingerprint}'
+
+
+def get_analytics_cache():
+    return caches[settings.MYMONEY['ANALYTICS_CACHE_ALIAS']]
+
+
+def get_fingerprint(filters):
+    """
+    Returns a digest of the filters given, which must be JSON serializable.
+    """
+    data = json.dumps(filters, sort_keys=True, default=str)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+def get_or_compute(namespace, bankaccount, filters, compute):
+    """
+    Returns the payload cached for the namespace, the bank account and the
+    filters given, computed by calling `compute` if missing. Payloads are
+    cached per data version of the bank account, which is bumped on any
+    change of its bank transactions.
+
+    Payloads bigger than the ANALYTICS_CACHE_MAX_SIZE setting (in bytes,
+    once pickled) are not cached. Outdated payloads are never read again and
+    are evicted by the cache backend, after ANALYTICS_CACHE_TIMEOUT seconds
+    at most.
+    """
+    cache = get_analytics_cache()
+    key = _payload_key.format(
+        namespace=namespace,
+        bankaccount_id=bankaccount.pk,
+        version=bankaccount.data_version,
+        fingerprint=get_fingerprint(filters),
+    )
+
+    payload = cache.get(key)
+    if payload is None:
+        payload = compute()
+
+        max_size = settings.MYMONEY['ANALYTICS_CACHE_MAX_SIZE']
+        if max_size is None or len(pickle.dumps(payload, pickle.HIGHEST_PROTOCOL)) <= max_size:
+            cache.set(key, payload, settings.MYMONEY['ANALYTICS_CACHE_TIMEOUT'])
+
+    return payload
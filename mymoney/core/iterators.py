@@ -1,4 +1,4 @@
-from dateutil.relativedelta import relativedelta
+import datetime
 
 
 class DateIterator(object):
@@ -6,6 +6,8 @@ class DateIterator(object):
     Iterate over each days for a given dates range.
     """
 
+    step = datetime.timedelta(days=1)
+
     def __init__(self, date_start, date_end):
         self.date_start = date_start
         self.date_end = date_end
@@ -19,9 +21,9 @@ class DateIterator(object):
         if self.date is None:
             self.date = self.date_start
         else:
-            self.date += relativedelta(days=1)
+            self.date += self.step
 
         if self.date > self.date_end:
-                raise StopIteration
+            raise StopIteration
 
         return self.date
@@ -1,4 +1,6 @@
 import datetime
+import random
+import time
 from decimal import Decimal
 
 from django.contrib.auth import get_user_model
@@ -11,7 +13,9 @@ from factory import fuzzy
 from mymoney.apps.bankaccounts.factories import BankAccountFactory
 from mymoney.apps.bankaccounts.models import BankAccount
 from mymoney.apps.banktransactions.factories import BankTransactionFactory
-from mymoney.apps.banktransactions.models import BankTransaction
+from mymoney.apps.banktransactions.models import (
+    BankAccountDailyBalance, BankTransaction, BankTransactionRollup,
+)
 from mymoney.apps.banktransactionschedulers.factories import (
     BankTransactionSchedulerFactory,
 )
@@ -48,6 +52,26 @@ class Command(BaseCommand):
         parser.add_argument('--noinput', action='store_false',
                             dest='interactive', default=True)
 
+        parser.add_argument('--accounts', type=int, default=1,
+                            help='Number of synthetic bank accounts to '
+                                 'generate. Default: 1')
+        parser.add_argument('--transactions-per-account', type=int, default=0,
+                            help='Number of synthetic bank transactions to '
+                                 'generate per bank account. Default: 0')
+        parser.add_argument('--years', type=int, default=1,
+                            help='Number of years until today on which '
+                                 'synthetic bank transactions are spread. '
+                                 'Default: 1')
+        parser.add_argument('--tags', type=int, default=5,
+                            help='Number of tags used by synthetic bank '
+                                 'transactions. Default: 5')
+        parser.add_argument('--seed', type=int, default=None,
+                            help='Seed of the random generator, to get the '
+                                 'same data on each run.')
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Number of rows inserted per transaction. '
+                                 'Default: 2000')
+
     def handle(self, *args, **options):
 
         if options.get('purge'):
@@ -68,6 +92,9 @@ class Command(BaseCommand):
             self.stdout.write('All data have been deleted.')
             return
 
+        if options.get('seed') is not None:
+            fuzzy.reseed_random(options['seed'])
+
         user = UserFactory(
             username=options.get('username'),
             password=options.get('password'),
@@ -201,4 +228,121 @@ class Command(BaseCommand):
 
             date += relativedelta(days=1)
 
+        if options.get('transactions_per_account', 0) > 0:
+            self.generate_bulk(user, options)
+
         self.stdout.write("Data have been generated successfully.")
+
+    def generate_bulk(self, user, options):
+        """
+        Generate a large volume of bank transactions for capacity planning.
+        Rows are inserted by batches and daily balances and rollups are only
+        rebuilt once per bank account at the end.
+        """
+        rand = random.Random(options.get('seed'))
+        batch_size = options.get('batch_size') or 2000
+
+        tag_names = [
+            _('Groceries'), _('Restaurant'), _('Car'), _('Shopping'),
+            _('Leisure'), _('Health'), _('Travel'), _('Bills'),
+        ]
+        tags = [
+            BankTransactionTagFactory(
+                name=tag_names[i] if i < len(tag_names) else _('Tag %d') % i,
+                owner=user,
+            )
+            for i in range(options.get('tags', 0))
+        ]
+
+        today = datetime.date.today()
+        date_start = today - relativedelta(years=options.get('years', 1))
+        days = (today - date_start).days + 1
+
+        total, start = 0, time.time()
+
+        for i in range(options.get('accounts', 1)):
+
+            bankaccount = BankAccountFactory(
+                label=_('Synthetic account %d') % (i + 1),
+                balance=0,
+                balance_initial=0,
+                currency=options.get('currency'),
+                owners=[user],
+            )
+
+            rows = self.iter_bulk_banktransactions(
+                rand, bankaccount, tags, date_start, days,
+                options['transactions_per_account'],
+            )
+            batch = []
+            for banktransaction in rows:
+                batch.append(banktransaction)
+                if len(batch) >= batch_size:
+                    total += self.insert_bulk(batch)
+                    batch = []
+            if batch:
+                total += self.insert_bulk(batch)
+
+            BankAccountDailyBalance.objects.rebuild(bankaccount)
+            BankTransactionRollup.objects.rebuild(bankaccount)
+
+        duration = time.time() - start
+        self.stdout.write(
+            "%d bank transactions generated in %.2fs (%d rows/s)." % (
+                total, duration, total / duration if duration else total,
+            )
+        )
+
+    def insert_bulk(self, batch):
+        # Let the backend choose how many rows fit in a single query.
+        BankTransaction.objects.bulk_create_with_balance(
+            batch, update_aggregates=False,
+        )
+        return len(batch)
+
+    def iter_bulk_banktransactions(self, rand, bankaccount, tags, date_start,
+                                   days, count):
+        """
+        Yield unsaved bank transactions with a realistic distribution: mostly
+        small expenses, some bigger ones and a few incomes. Recent ones are
+        less likely to be reconciled.
+        """
+        today = datetime.date.today()
+        payment_methods = [
+            BankTransaction.PAYMENT_METHOD_CREDIT_CARD,
+            BankTransaction.PAYMENT_METHOD_CREDIT_CARD,
+            BankTransaction.PAYMENT_METHOD_CREDIT_CARD,
+            BankTransaction.PAYMENT_METHOD_CASH,
+            BankTransaction.PAYMENT_METHOD_CHECK,
+            BankTransaction.PAYMENT_METHOD_TRANSFER,
+        ]
+
+        for _i in range(count):
+            date = date_start + datetime.timedelta(days=rand.randrange(days))
+            roll = rand.random()
+
+            if roll < 0.05:
+                amount = rand.randint(50000, 300000)
+                payment_method = BankTransaction.PAYMENT_METHOD_TRANSFER
+                tag = None
+            else:
+                if roll < 0.15:
+                    amount = -rand.randint(10000, 100000)
+                else:
+                    amount = -rand.randint(100, 10000)
+                payment_method = rand.choice(payment_methods)
+                tag = rand.choice(tags) if tags and rand.random() < 0.8 else None
+
+            yield BankTransaction(
+                bankaccount=bankaccount,
+                label=tag.name if tag is not None else _('Something'),
+                amount=Decimal(amount) / 100,
+                date=date,
+                reconciled=(today - date).days > rand.randint(0, 10),
+                status=(
+                    BankTransaction.STATUS_IGNORED if rand.random() < 0.02
+                    else BankTransaction.STATUS_ACTIVE
+                ),
+                payment_method=payment_method,
+                tag=tag,
+            )
@@ -0,0 +1,88 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.runner import DiscoverRunner
+
+from mymoney.benchmarks.runner import BASELINE, compare, run_benchmarks
+from mymoney.benchmarks.scenarios import SCENARIOS, BenchmarkError
+
+
+class Command(BaseCommand):
+    """
+    Measure the hot views and commands on fixed-size datasets, seeded into
+    a throwaway test database.
+    """
+    help = 'Run benchmarks and compare them against a baseline.'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('--sizes', default='10000',
+                            help='Comma separated numbers of bank '
+                                 'transactions of each dataset. Default: '
+                                 '10000')
+        parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS),
+                            help='Scenarios to run. Default: all')
+        parser.add_argument('--repeat', type=int, default=10,
+                            help='Number of measured runs per scenario. '
+                                 'Default: 10')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Seed of the datasets. Default: 0')
+        parser.add_argument('--output',
+                            help='Path of the JSON file to write results '
+                                 'to. Default: standard output')
+        parser.add_argument('--baseline', default=BASELINE,
+                            help='Path of a previous JSON output to compare '
+                                 'results with, or an empty string to skip '
+                                 'the comparison. Default: the baseline '
+                                 'stored in mymoney/benchmarks')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Growth ratio of latencies and memory '
+                                 'allowed against the baseline. Default: 0.2')
+
+    def handle(self, *args, **options):
+
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError('Sizes must be integers.')
+
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(str(e))
+
+        runner = DiscoverRunner(interactive=False, verbosity=0)
+        runner.setup_test_environment()
+        old_config = runner.setup_databases()
+        try:
+            results = run_benchmarks(
+                sizes,
+                scenarios=options['scenarios'],
+                repeat=options['repeat'],
+                seed=options['seed'],
+                log=self.stderr.write,
+            )
+        except BenchmarkError as e:
+            raise CommandError(str(e))
+        finally:
+            runner.teardown_databases(old_config)
+            runner.teardown_test_environment()
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        if baseline is not None:
+            regressions = compare(results, baseline, options['tolerance'])
+            for regression in regressions:
+                self.stderr.write('Regression %s' % regression)
+            if regressions:
+                raise CommandError(
+                    '%d regressions against the baseline.' % len(regressions)
+                )
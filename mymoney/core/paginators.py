@@ -1,3 +1,13 @@
+import base64
+import binascii
+import json
+from collections.abc import Sequence
+from functools import reduce
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.functional import cached_property
+
 from dateutil.relativedelta import relativedelta, weekday
 
 from mymoney.core.utils.dates import (
@@ -17,6 +27,10 @@ class EmptyPage(Exception):
     pass
 
 
+class InvalidCursor(Exception):
+    pass
+
+
 class DatePaginator(object):
 
     def __init__(self, date_min, date_max, granularity):
@@ -97,3 +111,153 @@ class WeeklyDatePage(BaseDatePage):
             weekday=weekday(self.week_day, n=-1),
             weeks=-1,
         )
+
+
+class KeysetPaginator(object):
+    """
+    Paginate a queryset by seeking after the ordering keys of the last row
+    seen instead of scanning an OFFSET, thus deep pages cost the same as the
+    first one. Total count is only computed if requested.
+    """
+    CURSOR_NEXT = 'n'
+    CURSOR_PREVIOUS = 'p'
+
+    def __init__(self, queryset, per_page, ordering=('-date', '-id')):
+        self.queryset = queryset.order_by(*ordering)
+        self.per_page = int(per_page)
+        self.ordering = ordering
+        self.fields = [
+            queryset.model._meta.get_field(key.lstrip('-')) for key in ordering
+        ]
+
+    @cached_property
+    def count(self):
+        return self.queryset.count()
+
+    def page(self, cursor=None):
+
+        if not cursor:
+            object_list = list(self.queryset[:self.per_page + 1])
+            return KeysetPage(
+                object_list[:self.per_page], self,
+                has_next=len(object_list) > self.per_page,
+                has_previous=False,
+            )
+
+        direction, values = self.decode_cursor(cursor)
+
+        if direction == self.CURSOR_NEXT:
+            object_list = list(
+                self.queryset.filter(self._seek(values))[:self.per_page + 1]
+            )
+            # Out of ranges, fallback on the first page instead.
+            if not object_list:
+                return self.page()
+
+            return KeysetPage(
+                object_list[:self.per_page], self,
+                has_next=len(object_list) > self.per_page,
+                has_previous=True,
+            )
+
+        object_list = list(
+            self.queryset
+            .filter(self._seek(values, reverse=True))
+            .reverse()[:self.per_page + 1]
+        )
+        # Nothing more before, so this is the first page which may have
+        # more rows.
+        if len(object_list) <= self.per_page:
+            return self.page()
+
+        return KeysetPage(
+            object_list[:self.per_page][::-1], self,
+            has_next=True,
+            has_previous=True,
+        )
+
+    def encode_cursor(self, direction, obj):
+        values = [
+            str(getattr(obj, field.attname)) for field in self.fields
+        ]
+        data = json.dumps([direction] + values).encode('utf-8')
+        return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, *values = json.loads(data.decode('utf-8'))
+        except (binascii.Error, TypeError, ValueError) as e:
+            raise InvalidCursor("Cursor could not be decoded.") from e
+
+        if (direction not in (self.CURSOR_NEXT, self.CURSOR_PREVIOUS) or
+                len(values) != len(self.fields)):
+            raise InvalidCursor("Cursor does not match the ordering.")
+
+        # Values are always encoded as strings.
+        if not all(isinstance(value, str) for value in values):
+            raise InvalidCursor("Cursor values are invalid.")
+
+        try:
+            values = [
+                field.to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+        except ValidationError as e:
+            raise InvalidCursor("Cursor values are invalid.") from e
+
+        return direction, values
+
+    def _seek(self, values, reverse=False):
+        """
+        Returns the condition to fetch rows after (or before if reversed) the
+        keys given, i.e for (-date, -id):
+        date < X OR (date = X AND id < Y)
+        """
+        conditions = []
+        for i, key in enumerate(self.ordering):
+            descending = key.startswith('-')
+            lookup = 'lt' if descending != reverse else 'gt'
+
+            filters = {
+                field.name: value
+                for field, value in zip(self.fields[:i], values[:i])
+            }
+            filters['{}__{}'.format(self.fields[i].name, lookup)] = values[i]
+            conditions.append(Q(**filters))
+
+        return reduce(lambda x, y: x | y, conditions)
+
+
+class KeysetPage(Sequence):
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+    def next_cursor(self):
+        return self.paginator.encode_cursor(
+            self.paginator.CURSOR_NEXT, self.object_list[-1],
+        )
+
+    def previous_cursor(self):
+        return self.paginator.encode_cursor(
+            self.paginator.CURSOR_PREVIOUS, self.object_list[0],
+        )
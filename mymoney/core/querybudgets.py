@@ -0,0 +1,154 @@
+from contextlib import ContextDecorator
+
+from django.core.signals import request_finished, request_started
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.urls import Resolver404, resolve
+
+# Maximum number of queries executed to display a page (GET), per URL name, no
+# matter the user permissions. They must not depend on the number of rows
+# displayed: any query executed per row is a regression. Submitting forms
+# shifts balances and aggregates instead, with a number of queries depending
+# on the days and months changed.
+#
+# Each budget is the most queries measured by the query budget tests, or by
+# the view tests for URL names without one, plus an allowance for paths not
+# exercised by tests (i.e: other permissions). Measure them again whenever a
+# view executes fewer queries, so that budgets stay tight.
+QUERY_BUDGET_ALLOWANCE = 2
+
+QUERY_BUDGETS = {
+    'home': 3 + QUERY_BUDGET_ALLOWANCE,
+    'login': 3 + QUERY_BUDGET_ALLOWANCE,
+    'logout': 5 + QUERY_BUDGET_ALLOWANCE,
+    'javascript-catalog': 0,
+
+    'bankaccounts:list': 13 + QUERY_BUDGET_ALLOWANCE,
+    'bankaccounts:create': 14 + QUERY_BUDGET_ALLOWANCE,
+    'bankaccounts:update': 18 + QUERY_BUDGET_ALLOWANCE,
+    'bankaccounts:delete': 15 + QUERY_BUDGET_ALLOWANCE,
+
+    'banktransactions:list': 13 + QUERY_BUDGET_ALLOWANCE,
+    'banktransactions:calendar': 15 + QUERY_BUDGET_ALLOWANCE,
+    'banktransactions:calendar_ajax_events': 7 + QUERY_BUDGET_ALLOWANCE,
+    'banktransactions:calendar_ajax_event': 8 + QUERY_BUDGET_ALLOWANCE,
+    'banktransactions:create': 10 + QUERY_BUDGET_ALLOWANCE,
+    'banktransactions:update': 13 + QUERY_BUDGET_ALLOWANCE,
+    'banktransactions:delete': 10 + QUERY_BUDGET_ALLOWANCE,
+    'banktransactions:delete_multiple': 8 + QUERY_BUDGET_ALLOWANCE,
+    'banktransactions:import': 7 + QUERY_BUDGET_ALLOWANCE,
+
+    'banktransactiontags:list': 16 + QUERY_BUDGET_ALLOWANCE,
+    'banktransactiontags:create': 12 + QUERY_BUDGET_ALLOWANCE,
+    'banktransactiontags:update': 15 + QUERY_BUDGET_ALLOWANCE,
+    'banktransactiontags:delete': 15 + QUERY_BUDGET_ALLOWANCE,
+
+    'banktransactionschedulers:list': 10 + QUERY_BUDGET_ALLOWANCE,
+    'banktransactionschedulers:create': 17 + QUERY_BUDGET_ALLOWANCE,
+    'banktransactionschedulers:update': 20 + QUERY_BUDGET_ALLOWANCE,
+    'banktransactionschedulers:delete': 17 + QUERY_BUDGET_ALLOWANCE,
+
+    'banktransactionanalytics:ratio': 11 + QUERY_BUDGET_ALLOWANCE,
+    'banktransactionanalytics:ratiosummary': 12 + QUERY_BUDGET_ALLOWANCE,
+    'banktransactionanalytics:trendtime': 8 + QUERY_BUDGET_ALLOWANCE,
+    'banktransactionanalytics:trendtimeseries': 5 + QUERY_BUDGET_ALLOWANCE,
+    'banktransactionanalytics:trendtimesummary': 9 + QUERY_BUDGET_ALLOWANCE,
+}
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class query_budget(ContextDecorator):
+    """
+    Context manager or decorator asserting that each request served meanwhile
+    executes at most the number of queries budgeted for its URL name.
+
+    Requests of URL names without a budget are ignored, unless a default
+    budget is given. Numbers of queries executed by each request are kept as
+    (url_name, count) in the ``counts`` attribute.
+    """
+
+    def __init__(self, budgets=None, default=None, using=DEFAULT_DB_ALIAS):
+        self.budgets = QUERY_BUDGETS if budgets is None else budgets
+        self.default = default
+        self.using = using
+        self.counts = []
+
+    @property
+    def connection(self):
+        return connections[self.using]
+
+    def __enter__(self):
+        self.counts = []
+        self.url_name = None
+        self.force_debug_cursor = self.connection.force_debug_cursor
+        self.connection.force_debug_cursor = True
+
+        request_started.connect(self.request_started)
+        request_finished.connect(self.request_finished)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        request_started.disconnect(self.request_started)
+        request_finished.disconnect(self.request_finished)
+        self.connection.force_debug_cursor = self.force_debug_cursor
+
+    def request_started(self, sender, environ=None, **kwargs):
+        try:
+            self.url_name = resolve(environ['PATH_INFO']).view_name
+        except Resolver404:
+            self.url_name = None
+        self.start = len(self.connection.queries_log)
+
+    def request_finished(self, sender, **kwargs):
+        if self.url_name is None:
+            return
+
+        queries = list(self.connection.queries_log)[self.start:]
+        self.counts.append((self.url_name, len(queries)))
+
+        budget = self.budgets.get(self.url_name, self.default)
+        if budget is not None and len(queries) > budget:
+            raise QueryBudgetExceeded(
+                "{url_name} executed {count} queries, budget is {budget}:\n"
+                "{queries}".format(
+                    url_name=self.url_name,
+                    count=len(queries),
+                    budget=budget,
+                    queries='\n'.join(query['sql'] for query in queries),
+                )
+            )
+
+
+class QueryBudgetTestMixin(object):
+    """
+    Test case mixin to assert that a request executes the same number of
+    queries, within its budget, whatever the number of rows.
+    """
+
+    def assertConstantQueries(self, request, grow):
+        """
+        Execute the request given, grow the data then execute it again. Each
+        callable is called without argument and request must return a
+        response.
+
+        A first request is done beforehand, and again once data grown, so
+        that session and caches populated on the first hit don't count.
+        """
+        request()
+        with query_budget() as budget:
+            response = request()
+            self.assertLess(response.status_code, 400)
+            grow()
+            request()
+            response = request()
+            self.assertLess(response.status_code, 400)
+
+        url_name, before = budget.counts[-3]
+        url_name, after = budget.counts[-1]
+        self.assertEqual(
+            before, after,
+            "{url_name} executed {before} queries, then {after} once data "
+            "grown.".format(url_name=url_name, before=before, after=after),
+        )
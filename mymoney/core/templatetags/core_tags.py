@@ -61,6 +61,10 @@ def menu_action_links(request):
                 'href': reverse('banktransactions:create', kwargs=resolver.kwargs),
                 'text': _('Add bank transaction'),
             })
+            links.append({
+                'href': reverse('banktransactions:import', kwargs=resolver.kwargs),
+                'text': _('Import statement'),
+            })
         if request.user.has_perm('bankaccounts.delete_bankaccount'):
             links.append({
                 'href': reverse('bankaccounts:delete', kwargs={
@@ -250,7 +254,8 @@ def breadcrumb(request, bankaccount_pk=None):
         })
 
     elif resolver.view_name in ("banktransactions:create",  # pragma: no branch
-                                "banktransactions:update"):
+                                "banktransactions:update",
+                                "banktransactions:import"):
         links.append({
             'href': reverse("banktransactions:list", kwargs={
                 "bankaccount_pk": bankaccount_pk,
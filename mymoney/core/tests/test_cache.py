@@ -0,0 +1,71 @@
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from ..cache import get_or_compute
+
+BankAccount = namedtuple('BankAccount', ['pk', 'data_version'])
+
+
+class Counter(object):
+
+    def __init__(self, payload='payload'):
+        self.payload = payload
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.payload
+
+
+class CacheTestCase(SimpleTestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_get_or_compute(self):
+        compute = Counter()
+        bankaccount = BankAccount(pk=1, data_version=10)
+
+        self.assertEqual(get_or_compute('foo', bankaccount, {'bar': 1}, compute), 'payload')
+        self.assertEqual(get_or_compute('foo', bankaccount, {'bar': 1}, compute), 'payload')
+        self.assertEqual(compute.calls, 1)
+
+        # Each namespace, bank account and filters are cached apart.
+        get_or_compute('baz', bankaccount, {'bar': 1}, compute)
+        get_or_compute('foo', BankAccount(pk=2, data_version=10), {'bar': 1}, compute)
+        get_or_compute('foo', bankaccount, {'bar': 2}, compute)
+        self.assertEqual(compute.calls, 4)
+
+        # Until data of the bank account changes.
+        get_or_compute('foo', BankAccount(pk=1, data_version=11), {'bar': 1}, compute)
+        self.assertEqual(compute.calls, 5)
+
+    def test_max_size(self):
+        bankaccount = BankAccount(pk=1, data_version=10)
+
+        with self.settings(MYMONEY=dict(settings.MYMONEY, ANALYTICS_CACHE_MAX_SIZE=100)):
+            compute = Counter('x' * 1000)
+            get_or_compute('foo', bankaccount, {}, compute)
+            get_or_compute('foo', bankaccount, {}, compute)
+            self.assertEqual(compute.calls, 2)
+
+            compute = Counter('x')
+            get_or_compute('bar', bankaccount, {}, compute)
+            get_or_compute('bar', bankaccount, {}, compute)
+            self.assertEqual(compute.calls, 1)
+
+    @override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'analytics': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    })
+    def test_alias(self):
+        compute = Counter()
+        bankaccount = BankAccount(pk=1, data_version=10)
+
+        with self.settings(MYMONEY=dict(settings.MYMONEY, ANALYTICS_CACHE_ALIAS='analytics')):
+            get_or_compute('foo', bankaccount, {}, compute)
+            get_or_compute('foo', bankaccount, {}, compute)
+        self.assertEqual(compute.calls, 2)
@@ -101,3 +101,64 @@ class DemoTestCase(unittest.TestCase):
             ),
             20,
         )
+
+    def test_generate_bulk(self):
+
+        def generate():
+            out = StringIO()
+            call_command(
+                'demo', username='bulk', interactive=False, stdout=out,
+                accounts=2, transactions_per_account=150, years=2, tags=3,
+                seed=42, batch_size=40,
+            )
+            user = get_user_model().objects.get(username='bulk')
+            bankaccounts = (
+                BankAccount.objects
+                .filter(owners=user, label__startswith='Synthetic')
+                .order_by('pk')
+            )
+            rows = [
+                list(
+                    BankTransaction.objects
+                    .filter(bankaccount=bankaccount)
+                    .order_by('pk')
+                    .values_list('label', 'amount', 'date', 'status')
+                )
+                for bankaccount in bankaccounts
+            ]
+            return out.getvalue(), user, bankaccounts, rows
+
+        output, user, bankaccounts, rows = generate()
+        self.assertIn('300 bank transactions generated in', output)
+        self.assertTrue(output.endswith(
+            'Data have been generated successfully.\n'))
+        # Demo tags plus synthetic ones.
+        self.assertEqual(
+            BankTransactionTag.objects.filter(owner=user).count(), 8)
+
+        self.assertEqual(len(bankaccounts), 2)
+        for bankaccount in bankaccounts:
+            self.assertEqual(
+                BankTransaction.objects.filter(bankaccount=bankaccount).count(),
+                150,
+            )
+            self.assertEqual(
+                bankaccount.balance,
+                bankaccount.balance_initial + sum(
+                    BankTransaction.objects
+                    .filter(bankaccount=bankaccount)
+                    .exclude(status=BankTransaction.STATUS_INACTIVE)
+                    .values_list('amount', flat=True)
+                ),
+            )
+            self.assertTrue(bankaccount.daily_balances.exists())
+
+        # Same seed, same data.
+        user.delete()
+        BankAccount.objects.filter(pk__in=[b.pk for b in bankaccounts]).delete()
+        BankAccount.objects.filter(owners=None).delete()
+        output, user, bankaccounts, rows_again = generate()
+        self.assertEqual(rows, rows_again)
+
+        user.delete()
+        BankAccount.objects.filter(owners=None).delete()
@@ -1,10 +1,17 @@
+import base64
+import json
 import unittest
 from datetime import date
 
 from django.test import SimpleTestCase
 
+from mymoney.apps.bankaccounts.factories import BankAccountFactory
+from mymoney.apps.banktransactions.factories import BankTransactionFactory
+from mymoney.apps.banktransactions.models import BankTransaction
+
 from ..paginators import (
-    DatePaginator, EmptyPage, InvalidDateRanges, UnknownGranularity,
+    DatePaginator, EmptyPage, InvalidCursor, InvalidDateRanges,
+    KeysetPaginator, UnknownGranularity,
 )
 from ..utils.dates import GRANULARITY_MONTH, GRANULARITY_WEEK
 
@@ -259,3 +266,96 @@ class WeeklyDatePageTestCase(SimpleTestCase):
                 paginator.page(date(2015, 8, 2)).previous_date(),
                 date(2015, 7, 26),
             )
+
+
+class KeysetPaginatorTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.bankaccount = BankAccountFactory()
+        cls.banktransactions = [
+            BankTransactionFactory(bankaccount=cls.bankaccount, date=day)
+            for day in (
+                date(2015, 7, 3),
+                date(2015, 7, 1),
+                date(2015, 7, 2),
+                date(2015, 7, 2),
+                date(2015, 7, 1),
+            )
+        ]
+        bts = cls.banktransactions
+        # Expected ordering: -date, -id.
+        cls.expected = [bts[0], bts[3], bts[2], bts[4], bts[1]]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.bankaccount.delete()
+
+    def get_paginator(self, per_page=2):
+        return KeysetPaginator(
+            BankTransaction.objects.filter(bankaccount=self.bankaccount),
+            per_page,
+        )
+
+    def test_count(self):
+        self.assertEqual(self.get_paginator().count, 5)
+
+    def test_next(self):
+
+        paginator = self.get_paginator()
+
+        page = paginator.page()
+        self.assertListEqual(list(page), self.expected[:2])
+        self.assertFalse(page.has_previous())
+        self.assertTrue(page.has_next())
+
+        page = paginator.page(page.next_cursor())
+        self.assertListEqual(list(page), self.expected[2:4])
+        self.assertTrue(page.has_previous())
+        self.assertTrue(page.has_next())
+
+        page = paginator.page(page.next_cursor())
+        self.assertListEqual(list(page), self.expected[4:])
+        self.assertTrue(page.has_previous())
+        self.assertFalse(page.has_next())
+
+    def test_previous(self):
+
+        paginator = self.get_paginator()
+
+        page = paginator.page(
+            paginator.encode_cursor(paginator.CURSOR_NEXT, self.expected[2]),
+        )
+        self.assertListEqual(list(page), self.expected[3:5])
+
+        page = paginator.page(page.previous_cursor())
+        self.assertListEqual(list(page), self.expected[1:3])
+        self.assertTrue(page.has_previous())
+        self.assertTrue(page.has_next())
+
+        # Not enough rows before, so start back from the first page.
+        page = paginator.page(page.previous_cursor())
+        self.assertListEqual(list(page), self.expected[:2])
+        self.assertFalse(page.has_previous())
+
+    def test_out_of_ranges(self):
+
+        paginator = self.get_paginator()
+        page = paginator.page(
+            paginator.encode_cursor(paginator.CURSOR_NEXT, self.expected[-1]),
+        )
+        self.assertListEqual(list(page), self.expected[:2])
+
+    def test_invalid_cursor(self):
+
+        paginator = self.get_paginator()
+
+        for cursor in ('foo', '!!', 'WyJ4IiwgIjEiXQ', 'WyJuIiwgImZvbyIsICIxIl0'):
+            with self.assertRaises(InvalidCursor):
+                paginator.page(cursor)
+
+        # Values which are not strings.
+        for values in (['n', 1, 2], ['n', None, '1'], ['n', ['2015-06-01'], '1']):
+            cursor = base64.urlsafe_b64encode(json.dumps(values).encode('utf-8'))
+            with self.assertRaises(InvalidCursor):
+                paginator.page(cursor.decode('ascii'))
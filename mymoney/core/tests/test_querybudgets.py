@@ -0,0 +1,84 @@
+import unittest
+
+from django.test import TestCase, modify_settings
+from django.urls import RegexURLResolver, get_resolver, reverse
+
+from mymoney.apps.bankaccounts.factories import BankAccountFactory
+
+from ..factories import UserFactory
+from ..querybudgets import QUERY_BUDGETS, QueryBudgetExceeded, query_budget
+
+
+def get_url_names(patterns, namespace=None):
+    for pattern in patterns:
+        if isinstance(pattern, RegexURLResolver):
+            yield from get_url_names(
+                pattern.url_patterns, pattern.namespace or namespace,
+            )
+        elif pattern.name:
+            if namespace:
+                yield '{}:{}'.format(namespace, pattern.name)
+            else:
+                yield pattern.name
+
+
+class BudgetsTestCase(unittest.TestCase):
+
+    def test_declared(self):
+        url_names = set(
+            url_name for url_name in get_url_names(get_resolver().url_patterns)
+            if url_name.split(':')[0] not in ('admin', 'djdt')
+        )
+        self.assertEqual(url_names - set(QUERY_BUDGETS), set())
+        self.assertEqual(set(QUERY_BUDGETS) - url_names, set())
+
+
+@modify_settings(MIDDLEWARE={
+    'remove': ['mymoney.core.middleware.AnonymousRedirectMiddleware'],
+})
+class QueryBudgetTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = UserFactory(username='owner')
+        cls.bankaccount = BankAccountFactory(owners=[cls.owner])
+
+    def setUp(self):
+        self.client.force_login(self.owner)
+        self.url = reverse('banktransactions:list', kwargs={
+            'bankaccount_pk': self.bankaccount.pk,
+        })
+
+    def test_within_budget(self):
+        with query_budget() as budget:
+            self.client.get(self.url)
+            self.client.get('/unknown/')
+        self.assertEqual(len(budget.counts), 1)
+        url_name, count = budget.counts[0]
+        self.assertEqual(url_name, 'banktransactions:list')
+        self.assertLessEqual(count, QUERY_BUDGETS['banktransactions:list'])
+
+    def test_exceeded(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            with query_budget({'banktransactions:list': 1}):
+                self.client.get(self.url)
+
+    def test_default(self):
+        with query_budget({}):
+            self.client.get(self.url)
+
+        with self.assertRaises(QueryBudgetExceeded):
+            with query_budget({}, default=1):
+                self.client.get(self.url)
+
+    def test_decorator(self):
+
+        @query_budget({'banktransactions:list': 1})
+        def request():
+            self.client.get(self.url)
+
+        with self.assertRaises(QueryBudgetExceeded):
+            request()
+
+        # Signals are disconnected once done.
+        self.client.get(self.url)
@@ -144,6 +144,14 @@ class TemplateTagsWebTestCase(WebTest):
         response = self.app.get(url, user='superowner')
         response.click(href=href)
         response = self.app.get(url, user='owner')
+        with self.assertRaises(IndexError):
+            response.click(href=href)
+        href = reverse('banktransactions:import', kwargs={
+            'bankaccount_pk': self.bankaccount.pk
+        })
+        response = self.app.get(url, user='superowner')
+        response.click(href=href)
+        response = self.app.get(url, user='owner')
         with self.assertRaises(IndexError):
             response.click(href=href)
         href = reverse('bankaccounts:delete', kwargs={
@@ -4,7 +4,7 @@ from django.test import SimpleTestCase
 
 from mymoney.core.utils.dates import (
     GRANULARITY_MONTH, GRANULARITY_WEEK, get_date_ranges, get_datetime_ranges,
-    get_weekday,
+    get_weekday, split_whole_months,
 )
 
 
@@ -111,3 +111,41 @@ class DatetimeRangesTestCase(SimpleTestCase):
         )
         self.assertEqual(s, datetime.datetime(2016, 2, 1, 0, 0, 0, 0))
         self.assertEqual(e, datetime.datetime(2016, 2, 29, 23, 59, 59, 0))
+
+
+class SplitWholeMonthsTestCase(SimpleTestCase):
+
+    def test_whole_months(self):
+        self.assertEqual(
+            split_whole_months(datetime.date(2015, 5, 1), datetime.date(2015, 7, 31)),
+            ((datetime.date(2015, 5, 1), datetime.date(2015, 7, 1)), []),
+        )
+
+    def test_edges(self):
+        self.assertEqual(
+            split_whole_months(datetime.date(2015, 4, 20), datetime.date(2015, 8, 10)),
+            (
+                (datetime.date(2015, 5, 1), datetime.date(2015, 7, 1)),
+                [
+                    (datetime.date(2015, 4, 20), datetime.date(2015, 4, 30)),
+                    (datetime.date(2015, 8, 1), datetime.date(2015, 8, 10)),
+                ],
+            ),
+        )
+        self.assertEqual(
+            split_whole_months(datetime.date(2015, 2, 1), datetime.date(2015, 3, 30)),
+            (
+                (datetime.date(2015, 2, 1), datetime.date(2015, 2, 1)),
+                [(datetime.date(2015, 3, 1), datetime.date(2015, 3, 30))],
+            ),
+        )
+
+    def test_no_whole_month(self):
+        self.assertEqual(
+            split_whole_months(datetime.date(2015, 4, 2), datetime.date(2015, 4, 30)),
+            (None, [(datetime.date(2015, 4, 2), datetime.date(2015, 4, 30))]),
+        )
+        self.assertEqual(
+            split_whole_months(datetime.date(2015, 4, 20), datetime.date(2015, 5, 10)),
+            (None, [(datetime.date(2015, 4, 20), datetime.date(2015, 5, 10))]),
+        )
@@ -0,0 +1,24 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from ...utils.db import supports_skip_locked, supports_window_functions
+
+
+class UtilsTestCase(unittest.TestCase):
+
+    def test_supports_window_functions(self):
+
+        self.assertTrue(supports_window_functions(MagicMock(vendor='postgresql')))
+        self.assertFalse(supports_window_functions(MagicMock(vendor='mysql')))
+
+        with patch('sqlite3.sqlite_version_info', (3, 24, 0)):
+            self.assertFalse(supports_window_functions(MagicMock(vendor='sqlite')))
+
+        with patch('sqlite3.sqlite_version_info', (3, 25, 0)):
+            self.assertTrue(supports_window_functions(MagicMock(vendor='sqlite')))
+
+    def test_supports_skip_locked(self):
+
+        self.assertTrue(supports_skip_locked(MagicMock(vendor='postgresql', pg_version=90500)))
+        self.assertFalse(supports_skip_locked(MagicMock(vendor='postgresql', pg_version=90400)))
+        self.assertFalse(supports_skip_locked(MagicMock(vendor='sqlite')))
@@ -1,6 +1,11 @@
+import datetime
+
 from django.test import SimpleTestCase
+from django.utils import formats
 
-from ...utils.l10n import get_language_upper
+from ...utils.l10n import (
+    get_date_formatter, get_language_upper, tokenize_date_format,
+)
 
 
 class UtilsTestCase(SimpleTestCase):
@@ -13,3 +18,38 @@ class UtilsTestCase(SimpleTestCase):
         with self.settings(LANGUAGE_CODE='fr-fr'):
             self.assertEqual(get_language_upper(), 'fr-FR')
             self.assertEqual(get_language_upper('en-us'), 'en-US')
+
+    def test_date_formatter(self):
+
+        dates = [
+            datetime.date(2015, 2, 25) + datetime.timedelta(days=i)
+            for i in range(400)
+        ]
+        for lang in ('en-us', 'fr', 'de'):
+            with self.settings(LANGUAGE_CODE=lang):
+                for format_type in ('SHORT_DATE_FORMAT', 'DATE_FORMAT'):
+                    formatter = get_date_formatter(format_type)
+                    self.assertListEqual(
+                        [formatter(value) for value in dates],
+                        [formats.date_format(value, format_type) for value in dates],
+                    )
+
+        with self.settings(LANGUAGE_CODE='en-us', USE_L10N=False,
+                           SHORT_DATE_FORMAT=r'D \t\h\e jS'):
+            self.assertEqual(
+                get_date_formatter('SHORT_DATE_FORMAT')(datetime.date(2015, 2, 25)),
+                'Wed the 25th',
+            )
+
+    def test_tokenize_date_format(self):
+
+        self.assertListEqual(tokenize_date_format(r'd/m/Y'), [
+            ('d', True), ('/', False), ('m', True), ('/', False), ('Y', True),
+        ])
+        self.assertListEqual(tokenize_date_format(r'j \d\e F'), [
+            ('j', True), (' de ', False), ('F', True),
+        ])
+        # Escaped backslashes are kept as is.
+        self.assertListEqual(tokenize_date_format(r'\\Y'), [
+            ('\\', False), ('Y', True),
+        ])
@@ -68,3 +68,33 @@ def get_date_ranges(base_date, granularity):
     )
 
     return start.date(), end.date()
+
+
+def split_whole_months(date_start, date_end):
+    """
+    Split a date ranges into the whole months it covers and the partial
+    ranges left at its edges.
+
+    :param date_start: first date of the range, included
+    :param date_end: last date of the range, included
+    :return: tuple, the first days of the first and last whole months (None
+        if there is none) and a list of the edges date ranges
+    """
+    first_month = date_start + relativedelta(day=1)
+    if first_month < date_start:
+        first_month += relativedelta(months=1)
+
+    last_month = date_end + relativedelta(day=1)
+    if date_end < last_month + relativedelta(months=1, days=-1):
+        last_month -= relativedelta(months=1)
+
+    if first_month > last_month:
+        return None, [(date_start, date_end)]
+
+    edges = []
+    if date_start < first_month:
+        edges.append((date_start, first_month - relativedelta(days=1)))
+    if last_month + relativedelta(months=1) <= date_end:
+        edges.append((last_month + relativedelta(months=1), date_end))
+
+    return (first_month, last_month), edges
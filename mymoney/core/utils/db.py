@@ -0,0 +1,70 @@
+import sqlite3
+
+
+def supports_window_functions(connection):
+    """
+    Returns whether the database backend given could evaluate window
+    functions like SUM() OVER (...).
+    """
+    if connection.vendor == 'postgresql':
+        return True
+    elif connection.vendor == 'sqlite':
+        # Window functions are only shipped since SQLite 3.25.
+        return sqlite3.sqlite_version_info >= (3, 25, 0)
+    return False
+
+
+def supports_skip_locked(connection):
+    """
+    Returns whether the database backend given could skip rows locked by
+    other transactions with SELECT ... FOR UPDATE SKIP LOCKED.
+    """
+    if connection.vendor == 'postgresql':
+        # SKIP LOCKED is only shipped since PostgreSQL 9.5.
+        return connection.pg_version >= 90500
+    return False
+
+
+class LoadedValuesMixin(object):
+    """
+    Model mixin which remembers the values loaded from the database, so that
+    changes could be deduced on save without fetching the row again.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(LoadedValuesMixin, cls).from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None):
+        super(LoadedValuesMixin, self).refresh_from_db(using=using, fields=fields)
+
+        if fields is None:
+            deferred_fields = self.get_deferred_fields()
+            fields = [
+                field.attname for field in self._meta.concrete_fields
+                if field.attname not in deferred_fields
+            ]
+        self.set_loaded_values(*fields)
+
+    def get_loaded_values(self, *fields):
+        """
+        Returns a tuple of the values loaded for the fields given, or None if
+        one of them is unknown.
+        """
+        loaded_values = getattr(self, '_loaded_values', {})
+        attnames = [self._meta.get_field(field).attname for field in fields]
+
+        if all(attname in loaded_values for attname in attnames):
+            return tuple(loaded_values[attname] for attname in attnames)
+        return None
+
+    def set_loaded_values(self, *fields):
+        """
+        Mark the current values of the fields given as the ones stored.
+        """
+        loaded_values = self.__dict__.setdefault('_loaded_values', {})
+        for field in fields:
+            attname = self._meta.get_field(field).attname
+            loaded_values[attname] = getattr(self, attname)
@@ -1,8 +1,82 @@
+from django.utils.dateformat import DateFormat
+from django.utils.formats import get_format
 from django.utils.translation import get_language
 
+# Format characters of the date template filter.
+DATE_FORMAT_CHARS = set('aAbBcdDeEfFgGhHiIjlLmMnNoOPrsStTUuwWyYzZ')
+
+# Date format characters which only depend on the day, the month or the year.
+DATE_FORMAT_KEYS = {
+    'd': lambda value: value.day,
+    'j': lambda value: value.day,
+    'b': lambda value: value.month,
+    'E': lambda value: value.month,
+    'F': lambda value: value.month,
+    'm': lambda value: value.month,
+    'M': lambda value: value.month,
+    'n': lambda value: value.month,
+    'N': lambda value: value.month,
+    'y': lambda value: value.year,
+    'Y': lambda value: value.year,
+}
+
 
 def get_language_upper(lang=None):
     lang = lang if lang else get_language()
     if lang.find('-') >= 0:
         lang = lang[:2].lower() + '-' + lang[3:].upper()
     return lang
+
+
+def tokenize_date_format(date_format):
+    """
+    Split the date format given into pieces of literal text and format
+    characters, as tuples of (piece, is_char). A backslash escapes the
+    following character.
+    """
+    tokens, literal, chars = [], '', iter(date_format)
+
+    for char in chars:
+        if char == '\\':
+            literal += next(chars, '')
+        elif char in DATE_FORMAT_CHARS:
+            if literal:
+                tokens.append((literal, False))
+                literal = ''
+            tokens.append((char, True))
+        else:
+            literal += char
+
+    if literal:
+        tokens.append((literal, False))
+    return tokens
+
+
+def get_date_formatter(format_type='DATE_FORMAT'):
+    """
+    Returns a function formatting dates as formats.date_format() does, but
+    cheap enough to be applied on thousands of dates. The format is parsed
+    once and pieces which only depend on the day, the month or the year are
+    computed once per value.
+    """
+    pieces, memo = [], {}
+
+    for piece, is_char in tokenize_date_format(get_format(format_type)):
+        if is_char:
+            pieces.append((piece, DATE_FORMAT_KEYS.get(piece, lambda value: value)))
+        else:
+            pieces.append((piece, None))
+
+    def format_piece(value, char, get_key):
+        key = (char, get_key(value))
+        if key not in memo:
+            memo[key] = str(getattr(DateFormat(value), char)())
+        return memo[key]
+
+    def formatter(value):
+        return ''.join(
+            format_piece(value, piece, get_key) if get_key else piece
+            for piece, get_key in pieces
+        )
+
+    return formatter
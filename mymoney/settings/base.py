@@ -112,4 +112,8 @@ MYMONEY = {
     'USE_L10N_DIST': False,
     'BOOTSTRAP_CALENDAR_LANGCODE': '',
     'BOOTSTRAP_DATEPICKER_LANGCODE': '',
+    # Analytics results are cached until bank transactions change.
+    'ANALYTICS_CACHE_ALIAS': 'default',
+    'ANALYTICS_CACHE_TIMEOUT': 60 * 60 * 24,
+    'ANALYTICS_CACHE_MAX_SIZE': 1024 * 1024,
 }
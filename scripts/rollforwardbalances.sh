@@ -0,0 +1,22 @@
+#!/bin/bash
+
+# Should be launched by cron (every nights)
+# How to use : /path/to/scripts/rollforwardbalances.sh /path/to/v_env
+
+if [ "$1" == "" ]
+then
+  echo "ERROR : Virtualenv path is required"
+  exit 1
+else
+  V_ENV_PATH=$1
+fi
+
+source "$V_ENV_PATH"/bin/activate
+
+cd "$(dirname "$0")/.."
+
+python manage.py rollforwardbalances --settings=mymoney.settings.production
+
+deactivate
+
+logger "[MYMONEY] Bank account balances rolled forward."